@@ -1,8 +1,23 @@
 import streamlit as st
 import google.generativeai as genai
-from PIL import Image
-import io
 import os
+import sys
+
+# Make the shared essay_marking package importable under `streamlit run`
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+from essay_marking.cache import DiskCache
+from essay_marking.gemini import stream_transcription
+from essay_marking.images import prepare_image
+from essay_marking.scheduler import RateLimitScheduler, INTERACTIVE
+
+TRANSCRIPTION_CACHE = os.path.join(".cache", "transcriptions.sqlite")
+TRANSCRIBE_PROMPT = "Analyze the attached image and extract all handwritten text. Your primary objective is to accurately identify and transcribe only the content that is not marked for deletion. You must follow this strict rule: if any text, code, or paragraph has a visible line drawn through it, you are to completely and utterly ignore that content. Under no circumstances should any crossed-out material be included in your output. Transcribe the remaining, unmarked handwritten text as perfectly as possible, and present the final result using Markdown."
+# Opt-in: crossed-out writing is painted over locally (essay_marking.strikeout), so the prompt only needs a reminder
+MASK_STRIKEOUTS = False
+MASKED_TRANSCRIBE_PROMPT = ("Extract all handwritten text from this image as accurately as possible and format it as Markdown. "
+                            "Leave out any text that is still visibly crossed out.")
 
 st.set_page_config(page_title="Gemini Handwriting Extractor", layout="centered")
 st.title("🖋️ Automated Essay Grading System")
@@ -14,43 +29,47 @@ except KeyError:
     st.error("Gemini API key not found in secrets. Please add it to `secrets.toml`.")
     st.stop()
 
-# Initialize the generative model
-model = genai.GenerativeModel("gemini-2.5-flash")
+@st.cache_resource
+def get_scheduler():
+    return RateLimitScheduler()
+
+# Initialize the generative model; calls are rate-limited and retried on 429/5xx
+model = get_scheduler().wrap(genai.GenerativeModel("gemini-2.5-flash"), priority=INTERACTIVE)
+
+@st.cache_resource
+def get_transcription_cache():
+    return DiskCache(TRANSCRIPTION_CACHE)
+
+transcription_cache = get_transcription_cache()
+cache_stats = transcription_cache.stats()
+st.sidebar.caption(f"Transcription cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
 
 uploaded_file = st.file_uploader("📷 Upload a handwritten image", type=["jpg", "jpeg", "png"])
 
+mask_strikes = st.checkbox("Mask crossed-out writing before sending", value=MASK_STRIKEOUTS,
+                           help="Masked regions are outlined in red on the image below.")
+
 if uploaded_file:
-    image = Image.open(uploaded_file).convert("RGB")
+    # Decoded, oriented, downscaled (and masked) once; the JPEG bytes are what Gemini receives
+    image, image_bytes = prepare_image(uploaded_file, mask_strikes=mask_strikes)
     st.image(image, caption="Uploaded Image", use_container_width=True)
 
     if st.button("Extract Text"):
         with st.spinner("🧠 Asking Gemini..."):
             try:
-                # Prepare the image and the prompt for the Gemini API
-                img_data = io.BytesIO()
-                image.save(img_data, format="JPEG")
-                img_data.seek(0)
-                
                 # The prompt is combined with the image in the request
                 #prompt = "This answers from students. some words in answers can cut by students and ignore those cut words.Full paragraphs also can be cut by students then also ignore them.Only consider the not cut things by students.Those are handwritten text so that they can be messy unclear and many more corruptions.Extract them as much as perfect way. Extract all handwritten text from this image as accurately as possible and format it as Markdown."
                 #prompt = "Extract all handwritten text from the image. The content is a student's answers, and some parts are marked for removal. Strictly ignore any text or code that has a line drawn through it, as this indicates it has been 'cut' or deleted by the student. Also, disregard any text that is covered by shading or heavy scribbles. Focus exclusively on the content that is clearly not marked for removal. Since the text is handwritten, transcribe it as accurately as possible despite any messiness or corruption. Format the final extracted text using Markdown."
-                prompt = "Analyze the attached image and extract all handwritten text. Your primary objective is to accurately identify and transcribe only the content that is not marked for deletion. You must follow this strict rule: if any text, code, or paragraph has a visible line drawn through it, you are to completely and utterly ignore that content. Under no circumstances should any crossed-out material be included in your output. Transcribe the remaining, unmarked handwritten text as perfectly as possible, and present the final result using Markdown."
-                
-                response = model.generate_content(
-                    [prompt, Image.open(img_data)],
-                    stream=True
-                )
-                response.resolve()  # Wait for the full response
-
-                # Extract the text from the response
-                extracted_text = ""
-                for chunk in response:
-                    if chunk.text:
-                        extracted_text += chunk.text
+                prompt = MASKED_TRANSCRIBE_PROMPT if mask_strikes else TRANSCRIBE_PROMPT
                 
+                # Text is shown as Gemini writes it; repeat uploads and reruns are answered from the on-disk cache
+                st.subheader("📄 Extracted Text:")
+                output = st.empty()
+                with output.container():
+                    extracted_text = st.write_stream(stream_transcription(model, image_bytes, prompt, cache=transcription_cache))
+
                 if extracted_text:
-                    st.subheader("📄 Extracted Text:")
-                    st.text_area("Text Output", extracted_text, height=250)
+                    output.text_area("Text Output", extracted_text, height=250)
                 else:
                     st.warning("Could not extract any text. Please try with a clearer image.")
 
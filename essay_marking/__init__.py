@@ -0,0 +1 @@
+"""Shared building blocks for the essay marking Streamlit apps and batch tools."""
@@ -0,0 +1,5 @@
+import sys
+
+from essay_marking.cli import main
+
+sys.exit(main())
@@ -0,0 +1,63 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+# ===== CONFIGURATION =====
+DEFAULT_MAX_IN_FLIGHT = 8
+DEFAULT_REQUEST_TIMEOUT = 120  # seconds per model call
+
+
+@dataclass
+class BatchResult:
+    index: int
+    item: Any
+    value: Any = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _run_one(worker, index, item, timeout):
+    start = time.perf_counter()
+    try:
+        value = worker(item, timeout=timeout)
+        return BatchResult(index, item, value=value, elapsed=time.perf_counter() - start)
+    except Exception as e:
+        return BatchResult(index, item, error=e, elapsed=time.perf_counter() - start)
+
+
+def run_batch(items, worker, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+              timeout=DEFAULT_REQUEST_TIMEOUT, on_result=None):
+    """
+    Runs `worker(item, timeout=...)` over `items` with at most `max_in_flight`
+    calls outstanding and returns a list of BatchResult in input order.
+
+    The worker is responsible for honouring `timeout` (e.g. by passing it to the
+    API client); exceptions are captured per item and never abort the batch.
+    `on_result(result, done, total)` is called from the calling thread as each
+    result arrives, so it may safely update Streamlit widgets. Workers run in
+    a copy of the caller's context, so their stages land in its trace
+    (essay_marking.tracing).
+    """
+    items = list(items)
+    results = [None] * len(items)
+    if not items:
+        return results
+
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, _run_one, worker, i, item, timeout)
+            for i, item in enumerate(items)
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results[result.index] = result
+            if on_result:
+                on_result(result, done, len(items))
+    return results
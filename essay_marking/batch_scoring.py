@@ -0,0 +1,314 @@
+"""
+Packed structured scoring: the answers of several students to the same
+question go into one request behind a shared marking-scheme prefix.
+
+evaluate_answer sends the whole scheme again for every student. Here each
+request is the scheme prefix followed by up to a pack of anonymised
+answers ("Student S1", "S2", ...), and the model returns one structured
+score per student. Packs are sized from the context window and the output
+limit, so a long scheme or long answers give smaller packs. Where a
+question needs more than one pack, the prefix can be stored once with
+Gemini context caching (GeminiContextCache) and billed at the cached rate
+by every pack.
+
+Students missing from a packed reply, or whose entry fails validation,
+are scored on their own with evaluate_answer, as are all the students of
+a pack whose request fails outright. Packed scores are cached under their
+own template (PACKED_TEMPLATE) in the evaluation cache; a score there from
+a single evaluation is reused too.
+
+    results = score_cohort(model, [(scheme_md, answer_md), ...], cache=cache,
+                           context_cache=GeminiContextCache("gemini-2.5-flash", wrap=scheduler.wrap))
+
+    python -m essay_marking.benchmarks.batch_scoring
+"""
+import datetime
+import json
+import re
+
+from essay_marking.batch import BatchResult, run_batch, DEFAULT_MAX_IN_FLIGHT, DEFAULT_REQUEST_TIMEOUT
+from essay_marking.evaluation import evaluate_answer, evaluation_key
+from essay_marking.scheduler import estimate_tokens
+from essay_marking.scoring import DEFAULT_RETRIES, SCORE_SCHEMA, MalformedEvaluation, parse_evaluation
+from essay_marking.tracing import count_usage, stage, trace
+
+
+# ===== CONFIGURATION =====
+PROMPT_VERSION = 1  # bump when build_packed_prefix/build_packed_answers change, so cached scores are not reused
+PACKED_TEMPLATE = f"packed-v{PROMPT_VERSION}"
+CONTEXT_TOKENS = 1_048_576  # gemini-2.5-flash input window
+CONTEXT_BUDGET = 0.25  # share of the input window one packed request may use
+# Output one packed reply may need; well under the model's 65k limit, and at a
+# few hundred tokens/s it finishes inside DEFAULT_REQUEST_TIMEOUT
+PACK_OUTPUT_TOKENS = 8192
+SCORE_OVERHEAD_TOKENS = 200  # JSON keys, verdicts and comments on top of the copied scheme points
+MAX_PACK = 16  # students per request, whatever the budgets allow
+CONTEXT_CACHE_TTL = datetime.timedelta(minutes=15)
+
+# Gemini response_schema for a packed reply: one SCORE_SCHEMA object per student, tagged with its label
+PACKED_SCORE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "students": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"student": {"type": "STRING"}, **SCORE_SCHEMA["properties"]},
+                "required": ["student"] + SCORE_SCHEMA["required"],
+            },
+        },
+    },
+    "required": ["students"],
+}
+PACKED_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": PACKED_SCORE_SCHEMA}
+
+
+# ===== PACKED PROMPT =====
+def build_packed_prefix(scheme_md):
+    """Everything but the answers; identical for every pack of a question, so it can be context-cached."""
+    return f"""
+        You are an academic evaluator. Below are two sections:
+        1. **Marking Scheme** – contains expected answer points for an essay, each followed by the mark allocation (e.g., [4 Marks]).
+        2. **Student Answers** – the responses of several students to the same question, each under its own "Student S<n>" heading.
+
+        Evaluate each student's response on its own against **each marking point**, using the mark allocation provided.
+        For each point, set "verdict" to:
+
+        - "full" – fully covered, award **full marks**
+        - "partial" – partially covered, award **half marks**
+        - "none" – not covered, award **zero marks**
+
+        Reply with JSON only, in this shape, with one entry per student:
+
+        {{
+          "students": [
+            {{"student": "S1",
+              "points": [
+                {{"point": "<copied from marking scheme>", "allocated": X, "verdict": "full" | "partial" | "none",
+                  "awarded": X | X/2 | 0, "comment": "<why it was awarded that way>"}}
+              ],
+              "total_allocated": XX,
+              "total_awarded": XX}}
+          ]
+        }}
+
+        Include every point mentioned in the marking scheme for every student.
+
+        ---
+
+        ### 📚 Marking Scheme:
+        {scheme_md}
+        """
+
+
+def build_packed_answers(answers):
+    return "".join(f"""
+        ---
+
+        ### ✍️ Student S{i}:
+        {answer_md}
+        """ for i, answer_md in enumerate(answers, start=1))
+
+
+def parse_packed(text, count):
+    """
+    One parsed score or MalformedEvaluation per student of a packed reply,
+    in pack order. Raises MalformedEvaluation when the reply as a whole is
+    unusable.
+    """
+    try:
+        data = json.loads(text)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise MalformedEvaluation(f"Response is not JSON: {e}") from e
+    if not isinstance(data, dict) or not isinstance(data.get("students"), list):
+        raise MalformedEvaluation("Response has no 'students' list")
+    entries = {}
+    for entry in data["students"]:
+        label = re.sub(r"\D", "", str(entry.get("student", ""))) if isinstance(entry, dict) else ""
+        if label:
+            entries.setdefault(int(label), entry)
+    scores = []
+    for i in range(1, count + 1):
+        if i not in entries:
+            scores.append(MalformedEvaluation(f"Student S{i} is missing from the response"))
+            continue
+        try:
+            scores.append(parse_evaluation(json.dumps(entries[i])))
+        except MalformedEvaluation as e:
+            scores.append(e)
+    return scores
+
+
+# ===== PACKING =====
+def pack_answers(scheme_md, answers, context_tokens=CONTEXT_TOKENS, output_tokens=PACK_OUTPUT_TOKENS,
+                 max_pack=MAX_PACK):
+    """
+    Splits answer indices into packs, in order, such that the prefix and a
+    pack's answers fit CONTEXT_BUDGET of the input window and its scores
+    (each about as long as the scheme) fit `output_tokens`.
+    An answer too long for any pack still gets a pack of its own.
+    """
+    room = context_tokens * CONTEXT_BUDGET - estimate_tokens(build_packed_prefix(scheme_md))
+    per_score = estimate_tokens(scheme_md) + SCORE_OVERHEAD_TOKENS
+    limit = max(1, min(max_pack, output_tokens // per_score))
+    packs, pack, used = [], [], 0
+    for i, answer_md in enumerate(answers):
+        tokens = estimate_tokens(build_packed_answers([answer_md]))
+        if pack and (len(pack) == limit or used + tokens > room):
+            packs.append(pack)
+            pack, used = [], 0
+        pack.append(i)
+        used += tokens
+    if pack:
+        packs.append(pack)
+    return packs
+
+
+# ===== CONTEXT CACHING =====
+class GeminiContextCache:
+    """
+    Creates a google.generativeai CachedContent per scheme prefix and hands
+    out models bound to it. `model_for` returns None where caching is not
+    available (older SDK, prefix below the model's minimum cache size, ...),
+    and the caller then sends the prefix inline. `wrap` is applied to each
+    model, e.g. RateLimitScheduler.wrap. Call `release` once the packs are
+    done so the caches stop being billed before their TTL.
+    """
+
+    def __init__(self, model_name, wrap=None, ttl=CONTEXT_CACHE_TTL):
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+        self.wrap = wrap
+        self.ttl = ttl
+        self._caches = []
+
+    def model_for(self, prefix):
+        try:
+            import google.generativeai as genai
+
+            cached = genai.caching.CachedContent.create(model=self.model_name, contents=[prefix], ttl=self.ttl)
+        except Exception:
+            return None
+        self._caches.append(cached)
+        model = genai.GenerativeModel.from_cached_content(cached_content=cached)
+        return self.wrap(model) if self.wrap else model
+
+    def release(self):
+        while self._caches:
+            try:
+                self._caches.pop().delete()
+            except Exception:
+                pass  # expires with its TTL anyway
+
+
+# ===== EVALUATION (NO UI) =====
+def score_pack(model, scheme_md, answers, timeout=None, retries=DEFAULT_RETRIES, prefix_model=None):
+    """
+    Scores several answers to one question in one request and returns a
+    parsed score or MalformedEvaluation per answer (see parse_packed).
+    With a `prefix_model` (GeminiContextCache.model_for) only the answers
+    are sent. A reply that is unusable as a whole is requested again up to
+    `retries` times; network errors are raised straight away.
+    """
+    prefix, body = build_packed_prefix(scheme_md), build_packed_answers(answers)
+    target, contents = (prefix_model, body) if prefix_model is not None else (model, prefix + body)
+    request_options = {"timeout": timeout} if timeout else None
+    for attempt in range(retries + 1):
+        with stage("gemini_score_pack"):
+            response = target.generate_content(contents, generation_config=PACKED_GENERATION_CONFIG,
+                                               request_options=request_options)
+            text = response.text
+        count_usage(response)
+        try:
+            return parse_packed(text, len(answers))
+        except MalformedEvaluation:
+            if attempt == retries:
+                raise
+
+
+def score_cohort(model, pairs, cache=None, context_cache=None, max_pack=MAX_PACK,
+                 max_in_flight=DEFAULT_MAX_IN_FLIGHT, timeout=DEFAULT_REQUEST_TIMEOUT, on_result=None):
+    """
+    Structured scores for (scheme_md, answer_md) pairs, with the answers to
+    the same scheme packed into shared-prefix requests that run concurrently.
+
+    Returns a BatchResult per pair in input order; `on_result(result, done,
+    total)` is called from the calling thread as each pair is settled, as
+    with run_batch. Pairs found in `cache` are not sent, and new scores are
+    stored there. With a `context_cache`, schemes that need more than one
+    pack have their prefix cached.
+    """
+    pairs = list(pairs)
+    results = [None] * len(pairs)
+    done = 0
+    model_name = getattr(model, "model_name", "")
+
+    def settle(result):
+        nonlocal done
+        results[result.index] = result
+        done += 1
+        if on_result:
+            on_result(result, done, len(pairs))
+
+    def cached_score(scheme_md, answer_md):
+        for template in (PACKED_TEMPLATE, None):
+            cached = cache.get(evaluation_key(scheme_md, answer_md, model_name, structured=True, template=template))
+            if cached is not None:
+                return cached
+        return None
+
+    groups = {}
+    for i, (scheme_md, answer_md) in enumerate(pairs):
+        cached = cached_score(scheme_md, answer_md) if cache else None
+        if cached is not None:
+            settle(BatchResult(i, pairs[i], value=json.loads(cached)))
+        else:
+            groups.setdefault(scheme_md, []).append(i)
+
+    jobs = []
+    try:
+        for scheme_md, indices in groups.items():
+            packs = pack_answers(scheme_md, [pairs[i][1] for i in indices], max_pack=max_pack)
+            prefix_model = None
+            if context_cache is not None and len(packs) > 1:
+                prefix_model = context_cache.model_for(build_packed_prefix(scheme_md))
+            jobs += [(scheme_md, [indices[j] for j in pack], prefix_model) for pack in packs]
+
+        def worker(job, timeout):
+            """[(score or exception, packed)] per student of the pack."""
+            scheme_md, indices, prefix_model = job
+            with trace("evaluate_pack", students=len(indices), context_cached=prefix_model is not None):
+                try:
+                    scores = score_pack(model, scheme_md, [pairs[i][1] for i in indices], timeout=timeout,
+                                        prefix_model=prefix_model)
+                except Exception as e:
+                    scores = [e] * len(indices)
+                outcomes = []
+                for i, score in zip(indices, scores):
+                    if not isinstance(score, Exception):
+                        outcomes.append((score, True))
+                        continue
+                    # Students the packed reply got wrong, or all of a failed pack, are scored on their own
+                    try:
+                        outcomes.append((evaluate_answer(model, scheme_md, pairs[i][1], structured=True,
+                                                         timeout=timeout, cache=cache), False))
+                    except Exception as e:
+                        outcomes.append((e, False))
+                return outcomes
+
+        def on_pack(result, _done, _total):
+            for n, i in enumerate(result.item[1]):
+                value, packed = result.value[n] if result.ok else (result.error, False)
+                if isinstance(value, Exception):
+                    settle(BatchResult(i, pairs[i], error=value, elapsed=result.elapsed))
+                    continue
+                settle(BatchResult(i, pairs[i], value=value, elapsed=result.elapsed))
+                # Single evaluations were cached by evaluate_answer under their own template
+                if packed and cache is not None:
+                    cache.put(evaluation_key(*pairs[i], model_name, structured=True, template=PACKED_TEMPLATE),
+                              json.dumps(value))
+
+        run_batch(jobs, worker, max_in_flight=max_in_flight, timeout=timeout, on_result=on_pack)
+    finally:
+        if context_cache is not None:
+            context_cache.release()
+    return results
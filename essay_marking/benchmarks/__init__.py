@@ -0,0 +1 @@
+"""Offline benchmarks; run e.g. `python -m essay_marking.benchmarks.batch`."""
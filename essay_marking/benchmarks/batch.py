@@ -0,0 +1,35 @@
+import argparse
+import time
+
+from PIL import Image
+
+from essay_marking.batch import run_batch
+from essay_marking.fake_gemini import FakeGenerativeModel
+from essay_marking.gemini import transcribe_image
+
+CANNED = "Reg Number: $ EG / 2020 / 0001\n\nQ1\n\nint i = 0;\nwhile (i < 100) { i++; }\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential vs concurrent transcription against a fake Gemini client.")
+    parser.add_argument("--scripts", type=int, default=40)
+    parser.add_argument("--delay", type=float, default=0.25, help="Simulated seconds per API call")
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    args = parser.parse_args()
+
+    image = Image.new("RGB", (1240, 1754), "white")
+    images = [image] * args.scripts
+
+    for label, limit in (("sequential", 1), (f"concurrent x{args.max_in_flight}", args.max_in_flight)):
+        model = FakeGenerativeModel([CANNED], delay=args.delay)
+        worker = lambda img, timeout: transcribe_image(model, img, "Extract text.", timeout=timeout)
+        start = time.perf_counter()
+        results = run_batch(images, worker, max_in_flight=limit)
+        elapsed = time.perf_counter() - start
+        failed = sum(not r.ok for r in results)
+        print(f"{label:>16}: {elapsed:6.2f}s  {args.scripts / elapsed:6.1f} scripts/s  "
+              f"peak in-flight={model.max_in_flight}  failed={failed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import json
+import re
+import time
+
+from essay_marking.batch import run_batch
+from essay_marking.batch_scoring import score_cohort
+from essay_marking.evaluation import evaluate_answer
+from essay_marking.fake_gemini import FakeContextCache, FakeGenerativeModel
+
+CACHED_PRICE = 0.25  # Gemini bills context-cached input tokens at a quarter of the normal rate
+POINT = "Explains how the loop condition is checked before each iteration and why i stops at 100"
+ANSWER = "The while loop checks whether i is below 100 before every pass and adds one to i each time. "
+
+
+def make_scheme(points):
+    return "\n".join(f"{n}. {POINT} (variant {n}). [2 Marks]" for n in range(1, points + 1))
+
+
+def respond(parts):
+    """Fake reply to a single or packed structured prompt: every scheme point fully covered."""
+    text = "".join(part for part in parts if isinstance(part, str))
+    scheme = text.split("### 📚 Marking Scheme:", 1)[1]
+    points = [{"point": p.strip(), "allocated": float(m), "verdict": "full", "awarded": float(m),
+               "comment": "Covered clearly with a correct explanation of the condition."}
+              for p, m in re.findall(r"\d+\. (.+?)\. \[(\d+) Marks\]", scheme)]
+    score = {"points": points, "total_allocated": sum(p["allocated"] for p in points),
+             "total_awarded": sum(p["awarded"] for p in points)}
+    labels = re.findall(r"### ✍️ Student S(\d+):", text)
+    if not labels:
+        return json.dumps(score)
+    return json.dumps({"students": [{"student": f"S{label}", **score} for label in labels]})
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Requests, input tokens and wall time of scoring a cohort one student per request versus "
+                    "packed shared-scheme requests, with and without context caching, against a fake Gemini client.")
+    parser.add_argument("--students", type=int, default=120)
+    parser.add_argument("--questions", type=int, default=4)
+    parser.add_argument("--points", type=int, default=12, help="Marking points per question scheme")
+    parser.add_argument("--answer-chars", type=int, default=1500)
+    parser.add_argument("--delay", type=float, default=0.3, help="Simulated seconds to the first chunk")
+    parser.add_argument("--chunk-delay", type=float, default=0.0005, help="Simulated seconds per 16 output characters")
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    args = parser.parse_args()
+
+    answer = (ANSWER * (args.answer_chars // len(ANSWER) + 1))[:args.answer_chars]
+    schemes = [make_scheme(args.points) + f"\n\nQuestion {q + 1}" for q in range(args.questions)]
+    # Student-specific answers, so nothing is shared but the scheme
+    pairs = [(scheme, f"Student {s}. {answer}") for scheme in schemes for s in range(args.students)]
+    print(f"📝 {args.students} students x {args.questions} questions, scheme ~{len(schemes[0]) // 4} tokens, "
+          f"answer ~{len(answer) // 4} tokens\n")
+    print(f"{'mode':>24} {'requests':>9} {'input tok':>10} {'cached':>9} {'billed tok':>11} {'s':>7} {'failed':>7}")
+
+    variants = [("one per student", None), ("packed", False), ("packed + context cache", True)]
+    for name, context_caching in variants:
+        model = FakeGenerativeModel([respond], delay=args.delay, chunk_delay=args.chunk_delay)
+        start = time.perf_counter()
+        if context_caching is None:
+            results = run_batch(pairs, lambda pair, timeout: evaluate_answer(model, *pair, structured=True, timeout=timeout),
+                                max_in_flight=args.max_in_flight)
+        else:
+            context_cache = FakeContextCache(model) if context_caching else None
+            results = score_cohort(model, pairs, context_cache=context_cache, max_in_flight=args.max_in_flight)
+        elapsed = time.perf_counter() - start
+        billed = model.prompt_tokens - model.cached_tokens * (1 - CACHED_PRICE)
+        print(f"{name:>24} {model.calls:9d} {model.prompt_tokens:10d} {model.cached_tokens:9d} {billed:11.0f} "
+              f"{elapsed:7.2f} {sum(not r.ok for r in results):7d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import os
+import time
+
+from essay_marking.docling_ocr import DEFAULT_WORKERS, convert_batch, convert_to_markdown, make_converter
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+DEFAULT_DOCUMENTS = [
+    os.path.join(REPO_ROOT, "test_models", "sample_essay.jpg"),
+    os.path.join(REPO_ROOT, "test_models", "sample_essay1.jpg"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Docling per-document latency: new converter per document (as docapp.py did) "
+                    "versus one warm converter, and sequential versus batched conversion.")
+    parser.add_argument("documents", nargs="*", default=DEFAULT_DOCUMENTS)
+    parser.add_argument("--copies", type=int, default=4, help="Times each document is repeated in the batch run")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args()
+
+    documents = []
+    for path in args.documents:
+        with open(path, "rb") as f:
+            documents.append((os.path.basename(path), f.read()))
+
+    cold = []
+    for name, data in documents:
+        start = time.perf_counter()
+        convert_to_markdown(make_converter(), name, data)
+        cold.append(time.perf_counter() - start)
+    print(f"{'cold':>10}: {sum(cold) / len(cold):7.2f}s per document (new converter each time)")
+
+    converter = make_converter()
+    convert_to_markdown(converter, *documents[0])  # load the models once
+    batch = documents * args.copies
+    start = time.perf_counter()
+    for name, data in batch:
+        convert_to_markdown(converter, name, data)
+    sequential = time.perf_counter() - start
+    print(f"{'warm':>10}: {sequential / len(batch):7.2f}s per document ({len(batch)} documents, one at a time)")
+
+    start = time.perf_counter()
+    results = convert_batch(converter, batch, workers=args.workers)
+    batched = time.perf_counter() - start
+    failed = sum(error is not None for _, _, error in results)
+    print(f"{'batched':>10}: {batched / len(batch):7.2f}s per document ({args.workers} workers, {failed} failed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from essay_marking.images import JPEG_QUALITY, MAX_EDGE, encode_jpeg, load_image, prepare_image
+
+SAMPLES = ("test_models/sample_essay.jpg", "test_models/sample_essay1.jpg")
+PHONE_SIZE = (3024, 4032)  # 12 MP portrait photo
+
+
+def old_pipeline(path):
+    """What FinalCodes/app3.py did: decode, re-encode at default quality, decode again for the request."""
+    image = Image.open(path).convert("RGB")
+    img_data = io.BytesIO()
+    image.save(img_data, format="JPEG")
+    Image.open(io.BytesIO(img_data.getvalue())).load()
+    return img_data.getvalue()
+
+
+def phone_photo(path, folder):
+    """A sample upscaled to 12 MP and saved sideways with EXIF orientation 6, like a phone camera does."""
+    image = Image.open(path).convert("RGB").resize(PHONE_SIZE, Image.BICUBIC).transpose(Image.ROTATE_90)
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    out = os.path.join(folder, f"phone_{os.path.basename(path)}")
+    image.save(out, format="JPEG", quality=95, exif=exif)
+    return out
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), value
+
+
+def psnr(a, b):
+    mse = np.mean((np.asarray(a, dtype=np.float32) - np.asarray(b, dtype=np.float32)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Payload size and preparation latency of an upload, old decode/encode/decode path "
+                    "versus essay_marking.images.prepare_image.")
+    parser.add_argument("images", nargs="*", default=list(SAMPLES))
+    parser.add_argument("--max-edge", type=int, default=MAX_EDGE)
+    parser.add_argument("--quality", type=int, default=JPEG_QUALITY)
+    parser.add_argument("--uplink-mbps", type=float, default=10.0, help="Upload bandwidth used to estimate send time")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    send = lambda size: size * 8 / (args.uplink_mbps * 1e6)
+    with tempfile.TemporaryDirectory() as folder:
+        paths = list(args.images) + [phone_photo(path, folder) for path in args.images]
+        for path in paths:
+            source = Image.open(path)
+            print(f"\n{os.path.basename(path)}: {source.size[0]}x{source.size[1]}, {os.path.getsize(path) / 1024:.0f} KB")
+            old_time, old_bytes = best_of(lambda: old_pipeline(path), args.repeat)
+            new_time, (image, new_bytes) = best_of(lambda: prepare_image(path, args.max_edge, args.quality),
+                                                   args.repeat)
+            for label, prep, payload in (("old", old_time, old_bytes), ("normalised", new_time, new_bytes)):
+                print(f"{label:>12}: payload {len(payload) / 1024:7.0f} KB  prepare {prep * 1000:6.1f} ms  "
+                      f"+ send {send(len(payload)) * 1000:6.0f} ms @ {args.uplink_mbps:g} Mbit/s")
+            print(f"{'':>12}  sent {image.size[0]}x{image.size[1]} upright; old/new payload {len(old_bytes) / len(new_bytes):.1f}x")
+
+        # Quality sweep on the downscaled phone photo: payload vs fidelity to a q95 encoding
+        image = load_image(paths[-1], args.max_edge)
+        reference = Image.open(io.BytesIO(encode_jpeg(image, 95)))
+        print(f"\nJPEG quality sweep ({os.path.basename(paths[-1])} at {image.size[0]}x{image.size[1]}):")
+        for quality in (60, 70, 75, 80, 85, 90, 95):
+            payload = encode_jpeg(image, quality)
+            print(f"{quality:>12}: {len(payload) / 1024:6.0f} KB  PSNR vs q95 {psnr(Image.open(io.BytesIO(payload)), reference):5.1f} dB")
+
+
+if __name__ == "__main__":
+    main()
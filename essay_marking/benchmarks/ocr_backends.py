@@ -0,0 +1,129 @@
+"""
+Head-to-head OCR benchmark over a labelled set (a folder with labels.csv:
+filename,text - the layout of Reg_Ditection/custom_data).
+
+Each backend runs in its own fresh process so load time and peak memory
+are its own. Reports throughput, per-batch latency percentiles, peak RSS
+and CER/WER, then picks the fastest backend within the accuracy bar:
+
+    python -m essay_marking.benchmarks.ocr_backends --backends trocr tesseract --max-cer 0.1
+    python -m essay_marking.benchmarks.ocr_backends --config backends.json   # [{"backend": ..., options}]
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import re
+import resource
+import time
+
+from PIL import Image
+
+from essay_marking.metrics import cer, wer
+from essay_marking.ocr_backends import BACKENDS, backend_from_config
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+DEFAULT_DATASET = os.path.join(REPO_ROOT, "test_models", "Reg_Ditection", "custom_data")
+
+
+def load_labelled_set(folder, limit=None):
+    """[(image path, reference text)] from <folder>/labels.csv, images under <folder>/images."""
+    image_dir = os.path.join(folder, "images") if os.path.isdir(os.path.join(folder, "images")) else folder
+    with open(os.path.join(folder, "labels.csv"), newline="", encoding="utf-8") as f:
+        rows = [(os.path.join(image_dir, row["filename"]), row["text"]) for row in csv.DictReader(f)]
+    return rows[:limit] if limit else rows
+
+
+def normalize(text):
+    """Case and whitespace are not errors for marking purposes; markdown emphasis is dropped too."""
+    return re.sub(r"\s+", " ", re.sub(r"[*_#`]", "", text)).strip().lower()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))] if values else 0.0
+
+
+def peak_rss_mb():
+    usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return usage / 1024  # KB on Linux
+
+
+def run_backend(config, rows, batch_size):
+    """Runs in a fresh process: loads the backend, transcribes all rows in batches, returns measurements."""
+    backend = backend_from_config(config)
+    start = time.perf_counter()
+    backend.load()
+    load_time = time.perf_counter() - start
+
+    texts, latencies = [], []
+    start = time.perf_counter()
+    for i in range(0, len(rows), batch_size):
+        images = [Image.open(path).convert("RGB") for path, _ in rows[i:i + batch_size]]
+        batch_start = time.perf_counter()
+        texts.extend(backend.transcribe(images))
+        latencies.append(time.perf_counter() - batch_start)
+    elapsed = time.perf_counter() - start
+
+    references = [normalize(text) for _, text in rows]
+    hypotheses = [normalize(text) for text in texts]
+    return {
+        "backend": config if isinstance(config, str) else config["backend"],
+        "load": load_time,
+        "throughput": len(rows) / elapsed,
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "peak_mb": peak_rss_mb(),
+        "cer": cer(references, hypotheses),
+        "wer": wer(references, hypotheses),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="Folder with labels.csv")
+    parser.add_argument("--backends", nargs="+", default=None, help=f"Backend names ({', '.join(BACKENDS)})")
+    parser.add_argument("--config", help="JSON list of backend configs instead of --backends")
+    parser.add_argument("--limit", type=int, default=None, help="Use only the first N labelled images")
+    parser.add_argument("--batch-size", type=int, default=8, help="Images per transcribe call")
+    parser.add_argument("--max-cer", type=float, default=0.1, help="Accuracy bar for the recommendation")
+    parser.add_argument("--max-wer", type=float, default=None)
+    args = parser.parse_args()
+
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            configs = json.load(f)
+    else:
+        configs = args.backends or ["trocr", "tesseract"]
+    rows = load_labelled_set(args.dataset, args.limit)
+    print(f"📄 {len(rows)} labelled images from {args.dataset}, batches of {args.batch_size}\n")
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    print(f"{'backend':>12} {'load s':>7} {'img/s':>7} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} "
+          f"{'peak MB':>8} {'CER':>6} {'WER':>6}")
+    for config in configs:
+        name = config if isinstance(config, str) else config["backend"]
+        with context.Pool(1) as pool:
+            try:
+                r = pool.apply(run_backend, (config, rows, args.batch_size))
+            except Exception as e:
+                print(f"{name:>12} ❌ {type(e).__name__}: {e}")
+                continue
+        results.append(r)
+        print(f"{name:>12} {r['load']:7.1f} {r['throughput']:7.2f} {r['p50']:7.2f} {r['p95']:7.2f} {r['p99']:7.2f} "
+              f"{r['peak_mb']:8.0f} {r['cer']:6.3f} {r['wer']:6.3f}")
+
+    eligible = [r for r in results if r["cer"] <= args.max_cer and (args.max_wer is None or r["wer"] <= args.max_wer)]
+    if eligible:
+        best = max(eligible, key=lambda r: r["throughput"])
+        print(f"\n✅ Fastest backend within CER <= {args.max_cer}: {best['backend']} ({best['throughput']:.2f} img/s)")
+    else:
+        print(f"\n⚠️ No backend meets CER <= {args.max_cer}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+import multiprocessing
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from essay_marking.preprocess import PreprocessConfig, preprocess, preprocess_batch
+
+SAMPLES = ("test_models/sample_essay.jpg", "test_models/sample_essay1.jpg")
+PHONE_SIZE = (3024, 4032)  # 12 MP portrait photo
+SAME_STAGES = PreprocessConfig(deskew=False, crop=False)  # what app2 does, at native resolution
+
+
+def app2_preprocess(image):
+    """test_models/app2.py before the preprocess module: 2x upscale, blur and threshold on the whole image."""
+    image = np.array(image.convert("L"))
+    image = cv2.resize(image, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
+    image = cv2.GaussianBlur(image, (5, 5), 0)
+    image = cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 11, 12)
+    return Image.fromarray(cv2.bitwise_not(image))
+
+
+def phone_pages(paths, copies, folder):
+    """Samples upscaled to 12 MP, tilted slightly and saved as JPEGs, `copies` of each."""
+    pages = []
+    for path in paths:
+        gray = np.asarray(Image.open(path).convert("L").resize(PHONE_SIZE, Image.BICUBIC))
+        matrix = cv2.getRotationMatrix2D((PHONE_SIZE[0] / 2, PHONE_SIZE[1] / 2), 2.0, 1.0)
+        gray = cv2.warpAffine(gray, matrix, PHONE_SIZE, borderMode=cv2.BORDER_REPLICATE)
+        for i in range(copies):
+            out = os.path.join(folder, f"{i}_{os.path.basename(path)}")
+            Image.fromarray(gray).save(out, quality=90)
+            pages.append(out)
+    return pages
+
+
+def peak_rss_mb():
+    usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return usage / 1024  # KB on Linux
+
+
+def run_variant(name, paths, config, workers):
+    """Runs in a fresh process so peak RSS is the variant's own; returns (seconds, peak MB)."""
+    start = time.perf_counter()
+    if name == "app2":
+        for path in paths:
+            app2_preprocess(Image.open(path))
+    elif workers > 1:
+        preprocess_batch(paths, config, workers=workers)
+    else:
+        for path in paths:
+            preprocess(cv2.imread(path, cv2.IMREAD_GRAYSCALE), config)
+    return time.perf_counter() - start, peak_rss_mb()
+
+
+def agreement(path):
+    """Share of pixels where the native-resolution output matches app2's output scaled back down."""
+    old = np.asarray(app2_preprocess(Image.open(path)))
+    new = preprocess(Image.open(path), SAME_STAGES)
+    old = cv2.resize(old, new.shape[::-1], interpolation=cv2.INTER_AREA) > 127
+    return float(np.mean(old == (new > 127)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Megapixels/second and peak RSS of app2's preprocess_image versus essay_marking.preprocess.")
+    parser.add_argument("images", nargs="*", default=list(SAMPLES))
+    parser.add_argument("--copies", type=int, default=3, help="12 MP pages generated per sample")
+    parser.add_argument("--tile", type=int, default=PreprocessConfig.tile)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    variants = [
+        ("app2", None, 1),
+        ("native, whole image", replace(SAME_STAGES, tile=0), 1),
+        (f"native, {args.tile}px tiles", replace(SAME_STAGES, tile=args.tile), 1),
+        ("all stages", PreprocessConfig(tile=args.tile), 1),
+        (f"all stages, {args.workers} procs", PreprocessConfig(tile=args.tile), args.workers),
+    ]
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as folder:
+        paths = phone_pages(args.images, args.copies, folder)
+        megapixels = len(paths) * PHONE_SIZE[0] * PHONE_SIZE[1] / 1e6
+        print(f"📄 {len(paths)} pages, {megapixels:.0f} MP in total\n")
+        print(f"{'variant':>28} {'s':>7} {'MP/s':>7} {'peak MB':>8}")
+        for name, config, workers in variants:
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                elapsed, peak = pool.submit(run_variant, name.split(",")[0], paths, config, workers).result()
+            print(f"{name:>28} {elapsed:7.2f} {megapixels / elapsed:7.1f} {peak:8.0f}")
+        print(f"\nPixel agreement with app2 (same stages, native resolution): {agreement(paths[0]):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Throughput and accuracy of the local registration-number detector on
+Reg_Ditection/custom_data: images/s at batch size 1 and --batch-size,
+exact-match accuracy, and accuracy/coverage above --min-confidence.
+"""
+import argparse
+import csv
+import os
+import time
+
+from PIL import Image
+
+from essay_marking.reg_detect import DEFAULT_MIN_CONFIDENCE, read_reg_numbers
+from essay_marking.students import normalize_reg_number
+from essay_marking.trocr import DEFAULT_BATCH_SIZE, load_trocr
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+DATA_DIR = os.path.join(REPO_ROOT, "test_models", "Reg_Ditection", "custom_data")
+DEFAULT_MODEL = os.path.join(REPO_ROOT, "test_models", "Reg_Ditection", "trocr-finetuned")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--min-confidence", type=float, default=DEFAULT_MIN_CONFIDENCE)
+    args = parser.parse_args()
+
+    with open(os.path.join(DATA_DIR, "labels.csv"), newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    images = [Image.open(os.path.join(DATA_DIR, "images", row["filename"])).convert("RGB") for row in rows]
+    labels = [normalize_reg_number(row["text"]) for row in rows]
+
+    processor, model = load_trocr(args.model)
+    read_reg_numbers(processor, model, images[:1], batch_size=1)  # warm-up
+
+    for batch_size in (1, args.batch_size):
+        start = time.perf_counter()
+        detections = read_reg_numbers(processor, model, images, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"batch {batch_size:>3}: {len(images) / elapsed:6.1f} images/s  ({elapsed * 1000 / len(images):.1f} ms/image)")
+
+    correct = [d.reg_number == label for d, label in zip(detections, labels)]
+    confident = [d.confidence >= args.min_confidence for d in detections]
+    accepted = sum(confident)
+    print(f"valid format: {sum(d.valid for d in detections)}/{len(images)}")
+    print(f"exact match:  {sum(correct)}/{len(images)} ({sum(correct) / len(images):.1%})")
+    print(f"confidence >= {args.min_confidence}: {accepted}/{len(images)} routed locally, "
+          f"{sum(c for c, ok in zip(correct, confident) if ok)}/{max(accepted, 1)} correct")
+    for row, d, ok in zip(rows, detections, correct):
+        if not ok:
+            print(f"  ✗ {row['filename']}: expected {row['text']!r}, read {d.text!r} ({d.confidence:.2f})")
+
+
+if __name__ == "__main__":
+    main()
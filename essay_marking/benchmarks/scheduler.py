@@ -0,0 +1,61 @@
+import argparse
+import threading
+import time
+
+from PIL import Image
+
+from essay_marking.batch import run_batch
+from essay_marking.fake_gemini import FakeGenerativeModel
+from essay_marking.gemini import transcribe_image
+from essay_marking.scheduler import RateLimitScheduler, INTERACTIVE
+
+CANNED = "Reg Number: $ EG / 2020 / 0001\n\nQ1\n\nint i = 0;\nwhile (i < 100) { i++; }\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Batch transcription against a fake Gemini client with a per-window quota that answers 429.")
+    parser.add_argument("--scripts", type=int, default=100)
+    parser.add_argument("--delay", type=float, default=0.05, help="Simulated seconds per API call")
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--quota", type=int, default=60, help="Requests the fake server accepts per window")
+    parser.add_argument("--window", type=float, default=6.0, help="Quota window in seconds")
+    args = parser.parse_args()
+
+    image = Image.new("RGB", (640, 905), "white")
+    quota_rate = args.quota / args.window * 60  # requests per minute the fake server sustains
+
+    def run(label, scheduler):
+        model = FakeGenerativeModel([CANNED], delay=args.delay, quota_rpm=args.quota, quota_window=args.window)
+        batch_model = scheduler.wrap(model) if scheduler else model
+        worker = lambda img, timeout: transcribe_image(batch_model, img, "Extract text.", timeout=timeout)
+
+        interactive_wait = []
+        if scheduler:
+            # one interactive request arriving halfway through the batch
+            def interactive():
+                time.sleep(args.scripts / quota_rate * 30)
+                start = time.perf_counter()
+                transcribe_image(scheduler.wrap(model, priority=INTERACTIVE), image, "Extract text.")
+                interactive_wait.append(time.perf_counter() - start)
+            thread = threading.Thread(target=interactive)
+            thread.start()
+
+        start = time.perf_counter()
+        results = run_batch([image] * args.scripts, worker, max_in_flight=args.max_in_flight)
+        elapsed = time.perf_counter() - start
+        lost = sum(not r.ok for r in results)
+        print(f"{label:>12}: {elapsed:6.2f}s  lost={lost}/{args.scripts}  429s from server={model.rejected}")
+        if scheduler:
+            thread.join()
+            m = scheduler.metrics()
+            print(f"{'':>12}  retries={m['retries']}  max queue={m['max_queue_depth']}  "
+                  f"wait mean={m['wait_mean']:.2f}s p95={m['wait_p95']:.2f}s max={m['wait_max']:.2f}s  "
+                  f"interactive request={interactive_wait[0]:.2f}s")
+
+    run("direct", None)
+    run("scheduled", RateLimitScheduler(rpm=quota_rate * 0.9, burst=args.max_in_flight, base_delay=0.5))
+
+
+if __name__ == "__main__":
+    main()
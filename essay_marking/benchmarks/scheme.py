@@ -0,0 +1,63 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import fitz  # PyMuPDF
+
+from essay_marking.scheme import (
+    convert_pdf_to_markdown_html,
+    convert_pdf_to_markdown_streaming,
+    split_questions,
+)
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+DEFAULT_PDF = os.path.join(REPO_ROOT, "test_models", "marking.pdf")
+
+
+def build_long_pdf(source, copies, out_path):
+    with fitz.open(source) as src, fitz.open() as doc:
+        for _ in range(copies):
+            doc.insert_pdf(src)
+        doc.save(out_path)
+        return len(doc)
+
+
+def measure(convert, pdf_path, md_path):
+    start = time.perf_counter()
+    markdown = convert(pdf_path, md_path)
+    elapsed = time.perf_counter() - start
+    # Peak is measured in a second, traced run so tracing overhead does not skew timing
+    tracemalloc.start()
+    convert(pdf_path, md_path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return markdown, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whole-document vs streaming marking scheme conversion.")
+    parser.add_argument("--pdf", default=DEFAULT_PDF)
+    parser.add_argument("--copies", type=int, default=40, help="Repeat the PDF to simulate a long scheme")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "scheme.pdf")
+        pages = build_long_pdf(args.pdf, args.copies, pdf_path)
+        print(f"{pages} pages from {os.path.basename(args.pdf)} x{args.copies}")
+
+        splits = {}
+        for label, convert in (("html (current)", convert_pdf_to_markdown_html),
+                               ("streaming", convert_pdf_to_markdown_streaming)):
+            markdown, elapsed, peak = measure(convert, pdf_path, os.path.join(tmp, "scheme.md"))
+            splits[label] = split_questions(markdown)
+            print(f"{label:>15}: {elapsed:6.2f}s  peak {peak / 2**20:7.1f} MiB  "
+                  f"markdown {len(markdown) / 2**10:8.0f} KiB  questions {sorted(splits[label])}")
+
+        same = len({tuple(sorted(s.items())) for s in splits.values()}) == 1
+        print(f"question split identical: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import argparse
+import time
+
+from PIL import Image
+
+from essay_marking.fake_gemini import FakeGenerativeModel
+from essay_marking.gemini import stream_transcription, transcribe_image
+
+LINE = "The loop runs while i is below 100 and increments i by one each time.\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time to first text and total time of a transcription, waiting for the whole "
+                    "response versus streaming its chunks, against a fake Gemini client.")
+    parser.add_argument("--chars", type=int, default=3000, help="Transcript length")
+    parser.add_argument("--delay", type=float, default=0.8, help="Simulated seconds to the first chunk")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="Simulated seconds between chunks")
+    args = parser.parse_args()
+
+    text = (LINE * (args.chars // len(LINE) + 1))[:args.chars]
+    image = Image.new("RGB", (640, 905), "white")
+    model = FakeGenerativeModel([text], delay=args.delay, chunk_delay=args.chunk_delay)
+
+    start = time.perf_counter()
+    whole = transcribe_image(model, image, "Extract text.")
+    waited = time.perf_counter() - start
+    print(f"{'whole':>10}: first text {waited:5.2f}s  complete {waited:5.2f}s")
+
+    start = time.perf_counter()
+    first = None
+    chunks = []
+    for chunk in stream_transcription(model, image, "Extract text."):
+        first = first or time.perf_counter() - start
+        chunks.append(chunk)
+    total = time.perf_counter() - start
+    print(f"{'streamed':>10}: first text {first:5.2f}s  complete {total:5.2f}s  ({len(chunks)} chunks)")
+    assert "".join(chunks) == whole == text
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from essay_marking.images import MAX_EDGE, encode_jpeg
+from essay_marking.strikeout import find_strikeouts, mask_strikeouts
+from essay_marking.trocr import ink_mask, remove_rules, segment_lines
+
+SAMPLES = ("test_models/sample_essay.jpg", "test_models/sample_essay1.jpg")
+INK = (30, 30, 110)
+
+
+def cross_out(image, seed=0, strikes=3, scribbles=1, cancels=1):
+    """
+    Copy of a page with crossed-out writing drawn on it: lines through the
+    middle of words, scribbles blacking words out and one diagonal stroke
+    through a block of lines. Returns (image, [(kind, box)]).
+    """
+    pixels = np.array(image.convert("RGB"))
+    gray = cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+    rng = np.random.default_rng(seed)
+    width = max(2, round(max(image.size) / 600))  # pen width in pixels
+    lines = segment_lines(image)
+    writing = remove_rules(ink_mask(gray))
+    picks = rng.choice(len(lines), min(len(lines), strikes + scribbles + cancels), replace=False)
+    truth = []
+    for n, i in enumerate(picks):
+        x0, y0, x1, y1 = lines[i]
+        height = y1 - y0
+        ink = writing[y0:y1, x0:x1]
+        # Start on a word, then strike halfway between the top and base peaks of ink under the span
+        columns = np.flatnonzero(ink[:, :max(1, x1 - x0 - 3 * height)].any(axis=0))
+        start = x0 + int(rng.choice(columns)) if columns.size else x0
+        end = min(x1, start + int(rng.integers(3, 6) * height // 2))
+        profile = np.count_nonzero(ink[:, start - x0:end - x0], axis=1)
+        core = np.flatnonzero(profile >= profile.max() / 2)
+        middle = y0 + (int(core[0]) + int(core[-1])) // 2
+        if not ink[middle - y0 - height // 4:middle - y0 + height // 4, start - x0:end - x0].any(axis=0).mean() > 0.3:
+            continue  # the span is mostly blank; there is nothing to cross out
+        if n < strikes:
+            tilt = int(rng.integers(-height // 8, height // 8 + 1))
+            cv2.line(pixels, (start, middle), (end, middle + tilt), INK, width)
+            truth.append(("strike", (start, middle - height // 4, end, middle + height // 4)))
+        elif n < strikes + scribbles:
+            # A few back-and-forth passes, enough to black the words out
+            for _ in range(3):
+                points = np.stack([np.linspace(start, end, 40), middle + rng.integers(-height // 3, height // 3, 40)], 1)
+                cv2.polylines(pixels, [points.astype(np.int32)], False, INK, 2 * width)
+            truth.append(("scribble", (start, middle - height // 3, end, middle + height // 3)))
+        else:
+            bottom = min(image.height - 1, y0 + 4 * height)
+            cv2.line(pixels, (x0, bottom), (x1, y0), INK, width)
+            truth.append(("cancel", (x0, y0, x1, bottom)))
+    return Image.fromarray(pixels), truth
+
+
+def page(path, max_edge=MAX_EDGE):
+    """A sample scaled so its long edge is max_edge, the size prepare_image sends for a phone photo."""
+    image = Image.open(path).convert("RGB")
+    scale = max_edge / max(image.size)
+    return image.resize((round(image.width * scale), round(image.height * scale)), Image.BICUBIC)
+
+
+def overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Throughput and hit rate of essay_marking.strikeout on the sample essays, clean and with "
+                    "crossed-out writing drawn on.")
+    parser.add_argument("images", nargs="*", default=list(SAMPLES))
+    parser.add_argument("--pages", type=int, default=20, help="Crossed-out variants per sample")
+    parser.add_argument("--max-edge", type=int, default=MAX_EDGE, help="Long edge the samples are scaled to")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = {path: page(path, args.max_edge) for path in args.images}
+    print(f"{'image':>20} {'size':>10} {'ms/page':>8} {'MP/s':>6} {'found on clean page':>20}")
+    for path, image in pages.items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            found = find_strikeouts(image)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        print(f"{path.split('/')[-1]:>20} {'x'.join(map(str, image.size)):>10} {best * 1000:8.1f} "
+              f"{image.width * image.height / 1e6 / best:6.1f} {len(found):>20}")
+
+    hits, missed, false, plain_bytes, masked_bytes = {}, {}, 0, 0, 0
+    for clean in pages.values():
+        for seed in range(args.pages):
+            image, truth = cross_out(clean, seed)
+            found = find_strikeouts(image)
+            for kind, box in truth:
+                bucket = hits if any(overlaps(box, strike.box) for strike in found) else missed
+                bucket[kind] = bucket.get(kind, 0) + 1
+            false += sum(not any(overlaps(box, strike.box) for _, box in truth) for strike in found)
+            plain_bytes += len(encode_jpeg(image))
+            masked_bytes += len(encode_jpeg(mask_strikeouts(image, found)[0]))
+
+    print(f"\n{'kind':>10} {'found':>6} {'missed':>7}")
+    for kind in ("strike", "scribble", "cancel"):
+        print(f"{kind:>10} {hits.get(kind, 0):6d} {missed.get(kind, 0):7d}")
+    print(f"{'false':>10} {false:6d}")
+    print(f"\nJPEG payload: {plain_bytes / 1024:.0f} KB as written, {masked_bytes / 1024:.0f} KB masked")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import os
+import time
+
+from PIL import Image
+
+from essay_marking.trocr import crop_lines, load_trocr, recognize_lines, segment_lines
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+DEFAULT_MODEL = os.path.join(REPO_ROOT, "test_models", "Reg_Ditection", "trocr-finetuned")
+DEFAULT_IMAGES = [
+    os.path.join(REPO_ROOT, "test_models", "sample_essay.jpg"),
+    os.path.join(REPO_ROOT, "test_models", "evaluvate_with_gimini", "Reg Number_250803_125210.jpg"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whole-page vs per-line vs batched-line TrOCR on CPU.")
+    parser.add_argument("images", nargs="*", default=DEFAULT_IMAGES)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    processor, model = load_trocr(args.model)
+    pages = [Image.open(path).convert("RGB") for path in args.images]
+
+    start = time.perf_counter()
+    crops = [crop for page in pages for crop in crop_lines(page, segment_lines(page))]
+    segment_time = time.perf_counter() - start
+    print(f"{len(pages)} pages -> {len(crops)} lines, segmentation {segment_time * 1000:.0f} ms")
+
+    runs = (
+        ("whole page", lambda: recognize_lines(processor, model, pages, batch_size=1), len(pages)),
+        ("per line", lambda: recognize_lines(processor, model, crops, batch_size=1), len(crops)),
+        (f"batched x{args.batch_size}", lambda: recognize_lines(processor, model, crops, batch_size=args.batch_size), len(crops)),
+    )
+    for label, run, units in runs:
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        unit = "pages" if label == "whole page" else "lines"
+        print(f"{label:>12}: {elapsed:7.2f}s  {units / elapsed:6.2f} {unit}/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Accuracy/latency check for the int8 TrOCR artifact against the fp32 model
+on Reg_Ditection/custom_data/labels.csv. Exits non-zero when the int8 CER is
+worse than fp32 by more than --tolerance or when it is not faster.
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+from PIL import Image
+
+from essay_marking.metrics import cer
+from essay_marking.trocr import QUANTIZED_FILENAME, load_trocr, quantize_trocr, recognize_lines
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+DATA_DIR = os.path.join(REPO_ROOT, "test_models", "Reg_Ditection", "custom_data")
+DEFAULT_MODEL = os.path.join(REPO_ROOT, "test_models", "Reg_Ditection", "trocr-finetuned")
+
+
+def evaluate(processor, model, images, labels):
+    recognize_lines(processor, model, images[:1], batch_size=1)  # warm-up
+    start = time.perf_counter()
+    texts = [recognize_lines(processor, model, [image], batch_size=1)[0] for image in images]
+    per_line = (time.perf_counter() - start) / len(images)
+    return cer(labels, texts), per_line
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Allowed absolute CER increase")
+    args = parser.parse_args()
+
+    with open(os.path.join(DATA_DIR, "labels.csv"), newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    images = [Image.open(os.path.join(DATA_DIR, "images", row["filename"])).convert("RGB") for row in rows]
+    labels = [row["text"] for row in rows]
+
+    if not os.path.exists(os.path.join(args.model, QUANTIZED_FILENAME)):
+        print(f"Quantizing {args.model} ...")
+        quantize_trocr(args.model)
+
+    fp32_cer, fp32_latency = evaluate(*load_trocr(args.model, prefer_quantized=False), images, labels)
+    int8_cer, int8_latency = evaluate(*load_trocr(args.model), images, labels)
+    print(f"fp32: CER {fp32_cer:.4f}  {fp32_latency * 1000:7.1f} ms/line")
+    print(f"int8: CER {int8_cer:.4f}  {int8_latency * 1000:7.1f} ms/line  "
+          f"({fp32_latency / int8_latency:.2f}x faster)")
+
+    ok = int8_cer <= fp32_cer + args.tolerance and int8_latency < fp32_latency
+    print("✅ PASS" if ok else "❌ FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+Headless batch marking: mark scheme -> transcription -> evaluation.
+
+    python -m essay_marking run --scheme marking.pdf --scripts scans/ --out results/
+
+--scripts may hold images and multi-page PDF scans; pages are grouped
+into students by the registration number in their headers (see
+essay_marking.ingest).
+
+Everything is checkpointed under --out, so re-running the same command
+resumes: transcripts already on disk are not re-requested and students
+with a complete result file are not re-evaluated. The SHA-256 of the
+scheme PDF is kept in <out>/marking.sha256; when --scheme is a different
+PDF the scheme is converted again and every student is re-evaluated.
+Every evaluation is
+also cached in <out>/.cache/evaluations.sqlite by scheme section, answer
+section, prompt version and model, so after editing the marking scheme a
+--restart run only asks Gemini about the questions whose scheme changed.
+
+With --structured the model returns validated JSON scores, which are also
+collected in <out>/scores.sqlite and exported to <out>/scores.csv. Adding
+--pack-students marks the answers of many students to the same question in
+one request, sending the scheme once per pack (see essay_marking.batch_scoring).
+
+Stage timings, token counts and payload sizes of every page and answer are
+appended to <out>/traces.jsonl (summarise it with `python -m
+essay_marking.tracing`), and --profile run.prof (or run.html, with
+pyinstrument) profiles the whole run.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+from essay_marking.batch import run_batch, DEFAULT_MAX_IN_FLIGHT, DEFAULT_REQUEST_TIMEOUT
+from essay_marking.batch_scoring import GeminiContextCache, score_cohort
+from essay_marking.cache import DiskCache
+from essay_marking.evaluation import evaluate_answer
+from essay_marking.ingest import assemble_scripts, list_pages, transcribe_pages
+from essay_marking.scheduler import RateLimitScheduler, DEFAULT_RPM, DEFAULT_TPM
+from essay_marking.scores import ScoreStore
+from essay_marking.questions import load_question_schemes, split_answer_by_question
+from essay_marking.scheme import convert_pdf_to_markdown_streaming, split_questions_to_folder
+from essay_marking.tracing import configure, profile, summary, trace
+
+
+# ===== CONFIGURATION =====
+DEFAULT_MODEL = "gemini-2.5-flash"
+TRANSCRIBE_PROMPT = "Extract all handwritten text from this image as accurately as possible and format it as Markdown."
+
+
+# ===== SETUP =====
+def load_api_key(secrets_path):
+    """GEMINI_API_KEY from the environment, else [gemini] API_KEY from a Streamlit secrets.toml."""
+    if os.environ.get("GEMINI_API_KEY"):
+        return os.environ["GEMINI_API_KEY"]
+    if os.path.exists(secrets_path):
+        import tomllib
+
+        with open(secrets_path, "rb") as f:
+            return tomllib.load(f).get("gemini", {}).get("API_KEY")
+    return None
+
+
+def make_model(model_name, api_key):
+    import google.generativeai as genai
+
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name)
+
+
+def write_json(path, data):
+    """Writes via a temp file so an interrupted run never leaves a half-written result."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+# ===== PIPELINE STAGES =====
+def prepare_scheme(scheme_pdf, out_dir, restart=False):
+    """
+    Converts and splits the marking scheme unless <out>/marking.md was made
+    from the same PDF. Returns (marking_md, schemes, changed), where
+    `changed` means results marked against an earlier scheme are stale.
+    """
+    marking_md = os.path.join(out_dir, "marking.md")
+    questions_dir = os.path.join(out_dir, "questions_md")
+    hash_path = os.path.join(out_dir, "marking.sha256")
+    with open(scheme_pdf, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    previous = None
+    if os.path.exists(hash_path):
+        with open(hash_path, "r", encoding="utf-8") as f:
+            previous = f.read().strip()
+    changed = os.path.exists(marking_md) and previous != digest
+    if changed:
+        print(f"♻️ {scheme_pdf} is not the scheme {out_dir} was marked against; converting it and re-marking")
+    if restart or changed or not os.path.exists(marking_md):
+        # Questions dropped from the scheme must not linger in the folder
+        shutil.rmtree(questions_dir, ignore_errors=True)
+        with trace("scheme", source=os.path.basename(scheme_pdf)):
+            convert_pdf_to_markdown_streaming(scheme_pdf, marking_md, image_dir=os.path.join(out_dir, "marking_images"))
+            split_questions_to_folder(marking_md, questions_dir)
+        with open(hash_path, "w", encoding="utf-8") as f:
+            f.write(digest)
+        print(f"✅ Marking scheme converted and split into {questions_dir}")
+    with open(marking_md, "r", encoding="utf-8") as f:
+        return f.read(), load_question_schemes(questions_dir), changed
+
+
+def transcribe_scripts(model, scripts_dir, transcripts_dir, workers, timeout, cache, restart=False,
+                       mask_strikes=False):
+    """
+    Transcribes every image and PDF page without a saved transcript; returns
+    (pages, transcripts) in scan order, with None for pages that failed.
+    """
+    os.makedirs(transcripts_dir, exist_ok=True)
+    pages = list_pages([scripts_dir])
+    transcript_path = lambda page: os.path.join(transcripts_dir, f"{page.key}.md")
+    todo = [page for page in pages if restart or not os.path.exists(transcript_path(page))]
+    print(f"📄 {len(pages)} pages, {len(pages) - len(todo)} already transcribed")
+
+    def on_result(result, done, total):
+        page = todo[result.index]
+        if result.ok and result.value:
+            with open(transcript_path(page), "w", encoding="utf-8") as f:
+                f.write(result.value)
+            print(f"[{done}/{total}] ✅ {page.label}")
+        else:
+            print(f"[{done}/{total}] ❌ {page.label}: {result.error or 'no text extracted'}")
+
+    transcribe_pages(model, todo, TRANSCRIBE_PROMPT, max_in_flight=workers, timeout=timeout, cache=cache,
+                     on_result=on_result, mask_strikes=mask_strikes)
+
+    transcripts = []
+    for page in pages:
+        transcript = None
+        if os.path.exists(transcript_path(page)):
+            with open(transcript_path(page), "r", encoding="utf-8") as f:
+                transcript = f.read()
+        transcripts.append(transcript)
+    return pages, transcripts
+
+
+def evaluate_students(model, students, marking_md, schemes, results_dir, mode, workers, timeout,
+                      restart=False, score_store=None, cache=None, pack=False, context_cache=None):
+    """
+    Evaluates all (student, question) pairs in one concurrent batch and
+    writes results/<reg>.json as soon as a student's last question finishes.
+    With a `score_store` the evaluations are structured scores, which are
+    also saved to the store. Pairs found in `cache` are not sent again.
+    With `pack` as well, answers to the same question are packed into
+    shared-scheme requests (essay_marking.batch_scoring.score_cohort),
+    whose prefix goes into `context_cache` when given.
+    """
+    structured = score_store is not None
+    os.makedirs(results_dir, exist_ok=True)
+    result_path = lambda safe_reg: os.path.join(results_dir, f"{safe_reg}.json")
+
+    jobs, pending, records = [], {}, {}
+    for safe_reg, student in students.items():
+        if not restart and os.path.exists(result_path(safe_reg)):
+            with open(result_path(safe_reg), "r", encoding="utf-8") as f:
+                if json.load(f).get("complete"):
+                    continue
+        sections = split_answer_by_question(student["transcript"], schemes) if mode == "per-question" else {}
+        records[safe_reg] = {
+            "reg_number": student["reg_number"],
+            "source_images": student["pages"],
+            "mode": "per-question" if sections else "full",
+            "questions": {q_id: {"evaluation": None, "error": "Not attempted"} for q_id in schemes if q_id not in sections}
+            if sections else {},
+        }
+        if sections:
+            student_jobs = [(safe_reg, q_id, schemes[q_id], sections[q_id]) for q_id in schemes if q_id in sections]
+        else:
+            student_jobs = [(safe_reg, "ALL", marking_md, student["transcript"])]
+        jobs.extend(student_jobs)
+        pending[safe_reg] = len(student_jobs)
+    print(f"🧮 Evaluating {len(records)} students ({len(jobs)} answers), "
+          f"{len(students) - len(records)} already complete")
+
+    def on_result(result, done, total):
+        safe_reg, q_id = jobs[result.index][:2]
+        record = records[safe_reg]
+        record["questions"][q_id] = {
+            "evaluation": result.value if result.ok else None,
+            "error": None if result.ok else str(result.error),
+        }
+        pending[safe_reg] -= 1
+        if pending[safe_reg] == 0:
+            if score_store:
+                # All of the student's rows at once, so nothing from an earlier marking survives
+                score_store.save_student(record["reg_number"], {q: entry["evaluation"] for q, entry in
+                                                                record["questions"].items() if entry["evaluation"]})
+            record["complete"] = all(
+                q["error"] is None or q["error"] == "Not attempted" for q in record["questions"].values()
+            )
+            write_json(result_path(safe_reg), record)
+            print(f"[{done}/{total}] {'✅' if record['complete'] else '⚠️'} {record['reg_number']}")
+
+    if structured and pack:
+        score_cohort(model, [job[2:] for job in jobs], cache=cache, context_cache=context_cache,
+                     max_in_flight=workers, timeout=timeout, on_result=on_result)
+        return
+
+    def worker(job, timeout):
+        safe_reg, q_id, scheme_md, answer_md = job
+        with trace("evaluate", student=safe_reg, question=q_id):
+            return evaluate_answer(model, scheme_md, answer_md, structured, timeout=timeout, cache=cache)
+
+    run_batch(jobs, worker, max_in_flight=workers, timeout=timeout, on_result=on_result)
+
+
+def print_cohort_summary(score_store):
+    for row in score_store.question_summary():
+        print(f"{row['question']:>5}: {row['students']} students, mean {row['mean_awarded']:g}"
+              f" / {row['allocated']:g} ({row['percent']}%), range {row['min_awarded']:g}-{row['max_awarded']:g}")
+
+
+def print_stage_summary(top=6):
+    timings = summary()
+    for row in timings["stages"][:top]:
+        print(f"{row['stage']:>20}: {row['calls']} calls, {row['seconds']:.1f}s total, "
+              f"p50 {row['p50']:.2f}s, p95 {row['p95']:.2f}s")
+    if timings["counters"]:
+        print("   " + ", ".join(f"{name}: {value:,}" for name, value in sorted(timings["counters"].items())))
+
+
+def run(args):
+    if args.pack_students and not args.structured:
+        print("❌ --pack-students needs --structured (packed replies are JSON scores)")
+        return 1
+    api_key = load_api_key(args.secrets)
+    if not api_key:
+        print(f"❌ No Gemini API key: set GEMINI_API_KEY or add [gemini] API_KEY to {args.secrets}")
+        return 1
+    scheduler = RateLimitScheduler(rpm=args.rpm, tpm=args.tpm)
+    model = scheduler.wrap(make_model(args.model, api_key))
+    os.makedirs(args.out, exist_ok=True)
+    configure(args.trace or os.path.join(args.out, "traces.jsonl"))
+    cache = DiskCache(os.path.join(args.out, ".cache", "transcriptions.sqlite"))
+    evaluation_cache = DiskCache(os.path.join(args.out, ".cache", "evaluations.sqlite"))
+
+    marking_md, schemes, scheme_changed = prepare_scheme(args.scheme, args.out, restart=args.restart)
+    pages, transcripts = transcribe_scripts(model, args.scripts, os.path.join(args.out, "transcripts"),
+                                            args.workers, args.timeout, cache, restart=args.restart,
+                                            mask_strikes=args.mask_strikeouts)
+    students, skipped = assemble_scripts(pages, transcripts)
+    write_json(os.path.join(args.out, "skipped.json"), skipped)
+    print(f"🧩 {len(pages)} pages assembled into {len(students)} student scripts")
+    if skipped:
+        print(f"⚠️ {len(skipped)} pages not assigned to a student: before the first registration number, "
+              f"failed, or after a failed page (see skipped.json)")
+    score_store = ScoreStore(os.path.join(args.out, "scores.sqlite")) if args.structured else None
+    context_cache = GeminiContextCache(args.model, wrap=scheduler.wrap) if args.pack_students else None
+    evaluate_students(model, students, marking_md, schemes, os.path.join(args.out, "results"),
+                      args.mode, args.workers, args.timeout, restart=args.restart or scheme_changed,
+                      score_store=score_store, cache=evaluation_cache, pack=args.pack_students,
+                      context_cache=context_cache)
+    print(f"🗃️ Evaluation cache: {evaluation_cache.hits} reused, {evaluation_cache.misses} sent to Gemini")
+    if score_store:
+        print_cohort_summary(score_store)
+        rows = score_store.export_csv(os.path.join(args.out, "scores.csv"))
+        print(f"📊 {rows} scored points exported to {os.path.join(args.out, 'scores.csv')}")
+    metrics = scheduler.metrics()
+    print(f"⏱️ Gemini: {metrics['completed']} requests, {metrics['retries']} retries "
+          f"({metrics['throttled']} rate-limited), wait p95 {metrics['wait_p95']:.1f}s")
+    print_stage_summary()
+    print(f"🎉 Done. Results in {os.path.join(args.out, 'results')}")
+    return 0
+
+
+def work(args):
+    from essay_marking.worker import start_workers
+
+    api_key = load_api_key(args.secrets)
+    if not api_key:
+        print(f"❌ No Gemini API key: set GEMINI_API_KEY or add [gemini] API_KEY to {args.secrets}")
+        return 1
+    settings = {"api_key": api_key, "model": args.model, "rpm": args.rpm, "tpm": args.tpm,
+                "max_in_flight": args.workers, "timeout": args.timeout, "mask_strikeouts": args.mask_strikeouts,
+                "trace_file": args.trace}
+    processes, stop = start_workers(args.db, settings, processes=args.processes)
+    print(f"👷 {len(processes)} workers polling {args.db} (Ctrl+C to stop)")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop.set()
+        for process in processes:
+            process.join()
+    return 0
+
+
+# ===== CLI =====
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m essay_marking", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Mark a folder of scripts against a marking scheme PDF")
+    run_parser.add_argument("--scheme", required=True, help="Marking scheme PDF")
+    run_parser.add_argument("--scripts", required=True, help="Folder of student script images and multi-page PDF scans")
+    run_parser.add_argument("--out", required=True, help="Output/checkpoint folder")
+    run_parser.add_argument("--mode", choices=["per-question", "full"], default="per-question")
+    run_parser.add_argument("--workers", type=int, default=DEFAULT_MAX_IN_FLIGHT, help="Concurrent Gemini requests")
+    run_parser.add_argument("--timeout", type=int, default=DEFAULT_REQUEST_TIMEOUT, help="Seconds per request")
+    run_parser.add_argument("--rpm", type=float, default=DEFAULT_RPM, help="Gemini requests-per-minute budget")
+    run_parser.add_argument("--tpm", type=float, default=DEFAULT_TPM, help="Gemini tokens-per-minute budget")
+    run_parser.add_argument("--model", default=DEFAULT_MODEL)
+    run_parser.add_argument("--secrets", default=os.path.join(".streamlit", "secrets.toml"))
+    run_parser.add_argument("--structured", action="store_true",
+                            help="Request validated JSON scores and collect them in scores.sqlite")
+    run_parser.add_argument("--pack-students", action="store_true",
+                            help="With --structured, mark many students' answers to a question per request")
+    run_parser.add_argument("--mask-strikeouts", action="store_true",
+                            help="Paint over crossed-out writing locally before pages are sent to Gemini")
+    run_parser.add_argument("--restart", action="store_true", help="Ignore checkpoints and redo everything")
+    run_parser.add_argument("--trace", help="JSONL file for stage timings (default <out>/traces.jsonl)")
+    run_parser.add_argument("--profile", help="Profile the run to this file (.prof for cProfile, .html for pyinstrument)")
+    run_parser.set_defaults(func=run)
+
+    worker_parser = commands.add_parser("worker", help="Run background workers for the Streamlit job queue")
+    worker_parser.add_argument("--db", default="marking_jobs.sqlite", help="Job store shared with the app")
+    worker_parser.add_argument("--processes", type=int, default=2, help="Worker processes (jobs run in parallel)")
+    worker_parser.add_argument("--workers", type=int, default=DEFAULT_MAX_IN_FLIGHT, help="Concurrent Gemini requests per job")
+    worker_parser.add_argument("--timeout", type=int, default=DEFAULT_REQUEST_TIMEOUT, help="Seconds per request")
+    worker_parser.add_argument("--rpm", type=float, default=DEFAULT_RPM, help="Gemini requests-per-minute budget (all processes)")
+    worker_parser.add_argument("--tpm", type=float, default=DEFAULT_TPM, help="Gemini tokens-per-minute budget (all processes)")
+    worker_parser.add_argument("--model", default=DEFAULT_MODEL)
+    worker_parser.add_argument("--secrets", default=os.path.join(".streamlit", "secrets.toml"))
+    worker_parser.add_argument("--mask-strikeouts", action="store_true",
+                               help="Paint over crossed-out writing locally before pages are sent to Gemini")
+    worker_parser.add_argument("--trace", help="JSONL file for stage timings of every job")
+    worker_parser.set_defaults(func=work)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, "profile", None):
+        with profile(args.profile):
+            return args.func(args)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
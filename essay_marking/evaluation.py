@@ -0,0 +1,179 @@
+import json
+
+from essay_marking.batch import run_batch, DEFAULT_MAX_IN_FLIGHT, DEFAULT_REQUEST_TIMEOUT
+from essay_marking.cache import make_key
+from essay_marking.questions import split_answer_by_question
+from essay_marking.scoring import PROMPT_VERSION as SCORE_PROMPT_VERSION
+from essay_marking.scoring import build_structured_prompt, render_score_markdown, score_answer
+from essay_marking.tracing import count, count_usage, stage
+
+
+# ===== CONFIGURATION =====
+PROMPT_VERSION = 1  # bump when build_evaluation_prompt changes, so cached reports are not reused
+
+
+# ===== EVALUATION PROMPT =====
+def build_evaluation_prompt(marking_md, student_md):
+    return f"""
+        You are an academic evaluator. Below are two sections:
+        1. **Marking Scheme** – contains expected answer points for an essay, each followed by the mark allocation (e.g., [4 Marks]).
+        2. **Student Answer** – the student's response to the same question.
+
+        ---
+
+        ### 🎯 TASK:
+        Evaluate the student’s response against **each marking point**, using the mark allocation provided. For each point, identify whether it is:
+
+        - ✅ Fully covered – award **full marks**
+        - ⚠️ Partially covered – award **half marks**
+        - ❌ Not covered – award **zero marks**
+
+        ---
+
+        ### 📝 Evaluation Format (Strictly follow):
+
+        **Point**: *<Copied from marking scheme>*
+        - **Allocated**: [X Marks]
+        - **Evaluation**: ✅ / ⚠️ / ❌
+        - **Awarded**: X / (X/2) / 0
+        - **Comment**: <Why it was awarded that way>
+
+        Do this for every point mentioned in the marking scheme.
+
+        ---
+
+        ### 📊 Final Summary:
+
+        - Total Allocated: XX Marks
+        - ✅ Full Marks Awarded: XX
+        - ⚠️ Half Marks Awarded: XX
+        - ❌ Zero Marks: XX
+        - **Total Awarded**: XX Marks
+
+        ---
+
+        ### 📚 Marking Scheme:
+        {marking_md}
+
+        ---
+
+        ### ✍️ Student Answer:
+        {student_md}
+        """
+
+
+# ===== EVALUATION (NO UI) =====
+def generate_text(model, prompt, timeout=None):
+    """Single non-streaming Gemini call that raises on failure."""
+    request_options = {"timeout": timeout} if timeout else None
+    with stage("gemini_evaluate"):
+        response = model.generate_content(prompt, request_options=request_options)
+        text = response.text
+    count_usage(response)
+    return text
+
+
+def evaluation_key(scheme_md, answer_md, model_name, structured=False, template=None):
+    """
+    Cache key of one answer marked against one scheme (a question's section
+    or the whole marking scheme), so editing one question's scheme only
+    changes the keys of that question. `template` names another prompt that
+    produced the result (e.g. essay_marking.batch_scoring's packed prompt).
+    """
+    if template is None:
+        template = f"structured-v{SCORE_PROMPT_VERSION}" if structured else f"markdown-v{PROMPT_VERSION}"
+    return make_key("evaluation", template, scheme_md, answer_md, model_name)
+
+
+def evaluate_answer(model, scheme_md, answer_md, structured=False, timeout=None, cache=None):
+    """
+    Marks one answer against one scheme and returns the markdown report, or
+    the parsed score (see essay_marking.scoring) when `structured`. Raises
+    on failure. With a `cache` (see essay_marking.cache.DiskCache), results
+    are looked up by scheme, answer, prompt template version and model name
+    first, and only successful evaluations are stored.
+    """
+    key = None
+    if cache is not None:
+        key = evaluation_key(scheme_md, answer_md, getattr(model, "model_name", ""), structured)
+        cached = cache.get(key)
+        if cached is not None:
+            count("evaluation_cache_hits")
+            return json.loads(cached) if structured else cached
+    if structured:
+        value = score_answer(model, build_structured_prompt(scheme_md, answer_md), timeout=timeout)
+    else:
+        value = generate_text(model, build_evaluation_prompt(scheme_md, answer_md), timeout=timeout)
+    if cache is not None and value:
+        cache.put(key, json.dumps(value) if structured else value)
+    return value
+
+
+def evaluate_questions(model, schemes, sections, structured=False, cache=None,
+                       max_in_flight=DEFAULT_MAX_IN_FLIGHT, timeout=DEFAULT_REQUEST_TIMEOUT):
+    """
+    Scores each answered question against its own marking scheme section,
+    with the questions evaluated concurrently.
+
+    `schemes` and `sections` map question ids ("Q1", ...) to markdown.
+    Returns {q_id: BatchResult} in scheme order for the answered questions,
+    holding reports or, when `structured`, parsed scores; questions missing
+    from `sections` are not sent to the model, and cached ones are not sent again.
+    """
+    q_ids = [q_id for q_id in schemes if q_id in sections]
+    results = run_batch(
+        q_ids,
+        lambda q_id, timeout: evaluate_answer(model, schemes[q_id], sections[q_id], structured,
+                                              timeout=timeout, cache=cache),
+        max_in_flight=max_in_flight,
+        timeout=timeout,
+    )
+    return dict(zip(q_ids, results))
+
+
+def evaluate_student(model, marking_md, schemes, student_md, reg_number, per_question=True, structured=False,
+                     score_store=None, cache=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                     timeout=DEFAULT_REQUEST_TIMEOUT):
+    """
+    Evaluates one transcript and returns (report markdown, notes).
+
+    Per question, each answer section is scored against its own scheme in
+    `schemes` and the reports are joined under "## Qn" headings; without
+    question headings (or per_question=False) the whole marking scheme is
+    used. Structured scores are also saved to `score_store` when given,
+    replacing whatever was stored for the student before.
+    Evaluations found in `cache` are reused, so re-marking after a scheme
+    edit only asks the model about the questions whose scheme changed.
+    Failed questions are reported inline and listed in `notes`; a failed
+    whole-scheme evaluation raises.
+    """
+    notes = []
+    sections = split_answer_by_question(student_md, schemes) if per_question and schemes else {}
+    if not sections:
+        if per_question:
+            notes.append("No question headings found in the transcript; evaluated against the full marking scheme.")
+        value = evaluate_answer(model, marking_md, student_md, structured, timeout=timeout, cache=cache)
+        if structured:
+            if score_store:
+                score_store.save_student(reg_number, {"ALL": value})
+            return render_score_markdown(value), notes
+        return value, notes
+
+    results = evaluate_questions(model, schemes, sections, structured, cache=cache,
+                                 max_in_flight=max_in_flight, timeout=timeout)
+    parts, scores = [], {}
+    for q_id in schemes:
+        if q_id not in results:
+            parts.append(f"## {q_id}\n\n❌ Not attempted – no answer found for this question.")
+        elif results[q_id].ok:
+            value = results[q_id].value
+            if structured:
+                scores[q_id] = value
+                value = render_score_markdown(value)
+            parts.append(f"## {q_id}\n\n{value}")
+        else:
+            notes.append(f"Error evaluating {q_id}: {results[q_id].error}")
+            parts.append(f"## {q_id}\n\n⚠️ Evaluation failed: {results[q_id].error}")
+    if structured and score_store:
+        score_store.save_student(reg_number, scores)
+    return "\n\n---\n\n".join(parts), notes
@@ -0,0 +1,154 @@
+import collections
+import itertools
+import threading
+import time
+
+STREAM_CHUNK_CHARS = 16  # characters per chunk of a streamed fake response
+
+
+class FakeQuotaError(Exception):
+    """Shaped like google.api_core.exceptions.ResourceExhausted (HTTP 429)."""
+
+    code = 429
+
+
+class FakeResponse:
+    """Mimics the parts of a google.generativeai response the apps read."""
+
+    def __init__(self, text, chunk_size=None, prompt_tokens=0, chunk_delay=0.0, cached_tokens=0):
+        self.text = text
+        self.chunk_delay = chunk_delay
+        self.usage_metadata = FakeUsage(prompt_tokens, len(text) // 4 + 1, cached_tokens)
+        size = chunk_size or max(len(text), 1)
+        self._chunks = [FakeChunk(text[i:i + size]) for i in range(0, len(text), size)]
+
+    def resolve(self):
+        pass
+
+    def __iter__(self):
+        for i, chunk in enumerate(self._chunks):
+            if i:
+                time.sleep(self.chunk_delay)
+            yield chunk
+
+
+class FakeUsage:
+    def __init__(self, prompt_tokens, output_tokens, cached_tokens=0):
+        self.prompt_token_count = prompt_tokens  # includes cached_content_token_count, as Gemini reports it
+        self.cached_content_token_count = cached_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    Local stand-in for `genai.GenerativeModel` that returns canned responses
+    after a fixed delay. Used to exercise the batch engine without network access.
+
+    `responses` is cycled through in call order; a response that is an exception
+    instance is raised instead of returned, and a callable is called with the
+    request's contents to produce the text. A request whose `timeout` is shorter
+    than `delay` raises TimeoutError, like the real client would. With
+    `quota_rpm` set, calls beyond that many in any `quota_window` seconds
+    raise FakeQuotaError (429) without consuming a response.
+
+    `delay` is the time to the first chunk; a non-streamed call also waits
+    `chunk_delay` per further chunk it would have streamed, while a streamed
+    response spends that time between chunks as it is iterated.
+    """
+
+    def __init__(self, responses, delay=0.5, model_name="fake-gemini", quota_rpm=None, quota_window=60,
+                 chunk_delay=0.0):
+        self.model_name = model_name
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        self.quota_rpm = quota_rpm
+        self.quota_window = quota_window
+        self._recent = collections.deque()
+        self.rejected = 0
+        self._responses = itertools.cycle(responses)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.prompt_tokens = 0  # totals over all calls, from the same rough count as the usage metadata
+        self.cached_tokens = 0
+
+    def generate_content(self, contents, stream=False, generation_config=None, request_options=None,
+                         cached_prefix=None):
+        """`cached_prefix` is set by FakeCachedModel: text the request carries without sending it."""
+        with self._lock:
+            if self.quota_rpm:
+                now = time.monotonic()
+                while self._recent and now - self._recent[0] >= self.quota_window:
+                    self._recent.popleft()
+                if len(self._recent) >= self.quota_rpm:
+                    self.rejected += 1
+                    raise FakeQuotaError("429 Resource has been exhausted (e.g. check quota).")
+                self._recent.append(now)
+            response = next(self._responses)
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            timeout = (request_options or {}).get("timeout")
+            if timeout is not None and timeout < self.delay:
+                time.sleep(timeout)
+                raise TimeoutError(f"Request timed out after {timeout}s")
+            time.sleep(self.delay)
+            if isinstance(response, BaseException):
+                raise response
+            parts = contents if isinstance(contents, list) else [contents]
+            if cached_prefix is not None:
+                parts = [cached_prefix] + parts
+            if callable(response):
+                response = response(parts)
+            prompt_tokens = sum(len(part) // 4 + 1 if isinstance(part, str) else 258 for part in parts)
+            cached_tokens = len(cached_prefix) // 4 + 1 if cached_prefix is not None else 0
+            with self._lock:
+                self.prompt_tokens += prompt_tokens
+                self.cached_tokens += cached_tokens
+            if stream:
+                return FakeResponse(response, chunk_size=STREAM_CHUNK_CHARS, prompt_tokens=prompt_tokens,
+                                    chunk_delay=self.chunk_delay, cached_tokens=cached_tokens)
+            time.sleep(self.chunk_delay * max(0, (len(response) - 1) // STREAM_CHUNK_CHARS))
+            return FakeResponse(response, prompt_tokens=prompt_tokens, cached_tokens=cached_tokens)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class FakeCachedModel:
+    """A FakeGenerativeModel bound to a cached prefix, like `GenerativeModel.from_cached_content`."""
+
+    def __init__(self, model, prefix):
+        self.model = model
+        self.model_name = model.model_name
+        self.prefix = prefix
+
+    def generate_content(self, contents, **kwargs):
+        return self.model.generate_content(contents, cached_prefix=self.prefix, **kwargs)
+
+
+class FakeContextCache:
+    """
+    Stand-in for essay_marking.batch_scoring.GeminiContextCache: requests
+    made through `model_for(prefix)` omit the prefix but are answered as if
+    it had been sent, with its tokens reported as cached.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.created = 0
+
+    def model_for(self, prefix):
+        self.created += 1
+        return FakeCachedModel(self.model, prefix)
+
+    def release(self):
+        pass
@@ -0,0 +1,86 @@
+import time
+
+from essay_marking.cache import make_key
+from essay_marking.images import image_part, prepare_image
+from essay_marking.tracing import count, count_usage, record_stage, stage
+
+
+# ===== IMAGE TO MARKDOWN (NO UI) =====
+def transcription_key(image_bytes, prompt, model_name):
+    return make_key("transcription", image_bytes, prompt, model_name)
+
+
+def _image_bytes(image):
+    """JPEG bytes from essay_marking.images.prepare_image, normalising PIL images and uploads on the fly."""
+    return image if isinstance(image, bytes) else prepare_image(image)[1]
+
+
+def transcribe_image(model, image, prompt, timeout=None, cache=None):
+    """
+    Sends one image to a Gemini model and returns the extracted text.
+    `image` is the JPEG bytes from essay_marking.images.prepare_image, or
+    a PIL image / path / upload that is normalised here.
+
+    Unlike the Streamlit wrappers this raises on failure, so it is safe to call
+    from worker threads. `timeout` (seconds) is forwarded to the client as the
+    per-request deadline. With a `cache` (see essay_marking.cache.DiskCache),
+    results are looked up by the normalised JPEG payload, prompt and model name first.
+    Nothing is displayed while the model writes, so the whole response is
+    requested in one piece; use stream_transcription to show text as it arrives.
+    """
+    image_bytes = _image_bytes(image)
+    key = None
+    if cache is not None:
+        key = transcription_key(image_bytes, prompt, getattr(model, "model_name", ""))
+        cached = cache.get(key)
+        if cached is not None:
+            count("transcription_cache_hits")
+            return cached
+    request_options = {"timeout": timeout} if timeout else None
+    with stage("gemini_transcribe"):
+        response = model.generate_content(
+            [prompt, image_part(image_bytes)],
+            request_options=request_options,
+        )
+        extracted_text = response.text
+    count_usage(response)
+    if not extracted_text:
+        return None
+    if cache is not None:
+        cache.put(key, extracted_text)
+    return extracted_text
+
+
+def stream_transcription(model, image, prompt, timeout=None, cache=None):
+    """
+    Like transcribe_image, but yields the text chunk by chunk as Gemini
+    produces it (e.g. into st.write_stream). A cached transcript is yielded
+    as a single chunk; a fresh one is cached once the stream completes, so
+    a stream abandoned halfway is never stored.
+    """
+    image_bytes = _image_bytes(image)
+    key = None
+    if cache is not None:
+        key = transcription_key(image_bytes, prompt, getattr(model, "model_name", ""))
+        cached = cache.get(key)
+        if cached is not None:
+            count("transcription_cache_hits")
+            yield cached
+            return
+    request_options = {"timeout": timeout} if timeout else None
+    # Timed by hand: the stream is consumed by the caller between yields
+    start = time.perf_counter()
+    response = model.generate_content(
+        [prompt, image_part(image_bytes)],
+        stream=True,
+        request_options=request_options,
+    )
+    parts = []
+    for chunk in response:
+        if chunk.text:
+            parts.append(chunk.text)
+            yield chunk.text
+    record_stage("gemini_transcribe", time.perf_counter() - start)
+    count_usage(response)
+    if parts and cache is not None:
+        cache.put(key, "".join(parts))
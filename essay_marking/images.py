@@ -0,0 +1,73 @@
+"""
+Normalisation of uploaded script images before they are sent to Gemini.
+
+Each upload is decoded once (JPEGs at a reduced scale straight from the
+decoder), turned upright using its EXIF orientation, downscaled so the long
+edge is at most MAX_EDGE and encoded once as JPEG. The encoded bytes are
+sent to the API as they are, and the decoded image is kept for display.
+With mask_strikes, crossed-out writing is painted over before encoding
+(essay_marking.strikeout), so the page sent no longer shows it; the
+display image stays the upload, with the masked regions outlined.
+
+    python -m essay_marking.benchmarks.images
+"""
+import io
+
+from PIL import Image, ImageOps
+
+from essay_marking.tracing import count, stage, timed
+
+
+# ===== CONFIGURATION =====
+MAX_EDGE = 2048  # ~175 DPI across the long edge of an A4 page; plenty for handwriting
+DRAFT_FLOOR = 0.75  # large JPEGs may be decoded at a DCT scale down to this fraction of MAX_EDGE
+JPEG_QUALITY = 80  # see benchmarks/images.py: each step above this costs ~15% payload for ~1 dB
+MIME_TYPE = "image/jpeg"
+
+
+@timed("image_decode")
+def load_image(source, max_edge=MAX_EDGE):
+    """
+    Decodes a path, file-like upload, bytes or PIL image into an upright
+    RGB image whose long edge is at most `max_edge`. Large JPEGs are
+    decoded straight at 1/2, 1/4 or 1/8 scale when that keeps the long edge
+    above DRAFT_FLOOR * max_edge, which skips most of the decode and resize.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    image = source.copy() if isinstance(source, Image.Image) else Image.open(source)
+    if max_edge and max(image.size) > max_edge:
+        if image.format == "JPEG":
+            scale = max_edge * DRAFT_FLOOR / max(image.size)
+            image.draft("RGB", (round(image.width * scale), round(image.height * scale)))
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    # Rotated after downscaling so only the small image is transposed
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return image
+
+
+@timed("image_encode")
+def encode_jpeg(image, quality=JPEG_QUALITY):
+    img_data = io.BytesIO()
+    image.save(img_data, format="JPEG", quality=quality)
+    count("payload_bytes", img_data.tell())
+    return img_data.getvalue()
+
+
+def prepare_image(source, max_edge=MAX_EDGE, quality=JPEG_QUALITY, mask_strikes=False):
+    """(display image, JPEG bytes to send) for an upload; the only decode and encode in a request."""
+    image = load_image(source, max_edge)
+    if mask_strikes:
+        from essay_marking.strikeout import mask_strikeouts, outline_strikeouts
+
+        with stage("strikeout_mask"):
+            masked, strikes = mask_strikeouts(image)
+        return outline_strikeouts(image, strikes), encode_jpeg(masked, quality)
+    return image, encode_jpeg(image, quality)
+
+
+def image_part(image_bytes):
+    """Inline image part for generate_content, sent without another decode/encode round trip."""
+    return {"mime_type": MIME_TYPE, "data": image_bytes}
@@ -0,0 +1,139 @@
+"""
+Multi-page script ingestion: whole exam-hall scans in, one ordered
+transcript per student out.
+
+Sources are scanned PDFs (split into pages with PyMuPDF) and image files,
+taken in name order. All pages are transcribed concurrently, then walked
+in order: a page whose header carries a registration number starts (or
+continues) that student's script, and a page without one continues the
+script before it. A page that could not be transcribed may have been the
+next student's first page, so it ends the script and the pages up to the
+next registration number are reported as unassigned.
+
+    pages = list_pages(["hall_A.pdf", "late_scripts/"])
+    results = transcribe_pages(model, pages, prompt)
+    students, unassigned = assemble_scripts(pages, [r.value if r.ok else None for r in results])
+"""
+import os
+import threading
+from dataclasses import dataclass
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from essay_marking.batch import run_batch, DEFAULT_MAX_IN_FLIGHT, DEFAULT_REQUEST_TIMEOUT
+from essay_marking.gemini import transcribe_image
+from essay_marking.images import JPEG_QUALITY, MAX_EDGE, prepare_image
+from essay_marking.students import find_reg_number
+from essay_marking.tracing import trace
+
+
+# ===== CONFIGURATION =====
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+PDF_EXTENSION = '.pdf'
+MAX_DPI = 200  # scans are rendered at this resolution unless that exceeds MAX_EDGE
+HEADER_LINES = 5  # a page's registration number must appear in its first lines
+
+_render_lock = threading.Lock()  # MuPDF is not thread-safe; pages render one at a time
+
+
+@dataclass
+class Page:
+    source: str  # PDF or image path
+    number: int = 1  # 1-based page number within a PDF
+
+    @property
+    def label(self):
+        name = os.path.basename(self.source)
+        return f"{name} p{self.number}" if self.source.lower().endswith(PDF_EXTENSION) else name
+
+    @property
+    def key(self):
+        """File-name friendly id, stable across runs (used for per-page checkpoints)."""
+        name = os.path.basename(self.source)
+        return f"{name}.p{self.number:03d}" if self.source.lower().endswith(PDF_EXTENSION) else name
+
+
+# ===== PAGES =====
+def list_pages(paths):
+    """Pages of the given PDFs, images and folders of them, in name and page order."""
+    pages = []
+    for path in paths:
+        if os.path.isdir(path):
+            pages.extend(list_pages(sorted(os.path.join(path, f) for f in os.listdir(path)
+                                           if f.lower().endswith(IMAGE_EXTENSIONS + (PDF_EXTENSION,)))))
+        elif path.lower().endswith(PDF_EXTENSION):
+            with fitz.open(path) as doc:
+                pages.extend(Page(path, number) for number in range(1, len(doc) + 1))
+        else:
+            pages.append(Page(path))
+    return pages
+
+
+def page_image_bytes(page, max_edge=MAX_EDGE, quality=JPEG_QUALITY, mask_strikes=False):
+    """
+    JPEG bytes of one page, rendered straight from the PDF within
+    `max_edge`; with mask_strikes, crossed-out writing is painted over.
+    """
+    if not page.source.lower().endswith(PDF_EXTENSION):
+        return prepare_image(page.source, max_edge, quality, mask_strikes)[1]
+    with _render_lock, fitz.open(page.source) as doc:
+        pdf_page = doc[page.number - 1]
+        dpi = min(MAX_DPI, int(max_edge * 72 / max(pdf_page.rect.width, pdf_page.rect.height)))
+        pixmap = pdf_page.get_pixmap(dpi=dpi, alpha=False)
+        if not mask_strikes:
+            return pixmap.tobytes("jpeg", jpg_quality=quality)
+        image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    # Masked outside the lock so other pages can render meanwhile
+    return prepare_image(image, max_edge, quality, mask_strikes)[1]
+
+
+def transcribe_pages(model, pages, prompt, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                     timeout=DEFAULT_REQUEST_TIMEOUT, cache=None, on_result=None, mask_strikes=False):
+    """Transcribes all pages concurrently; returns a BatchResult per page in page order."""
+    def worker(page, timeout):
+        with trace("transcribe", source=page.label):
+            image_bytes = page_image_bytes(page, mask_strikes=mask_strikes)
+            return transcribe_image(model, image_bytes, prompt, timeout=timeout, cache=cache)
+
+    return run_batch(pages, worker, max_in_flight=max_in_flight, timeout=timeout, on_result=on_result)
+
+
+# ===== ASSEMBLY =====
+def header_reg_number(transcript):
+    """(reg_number, safe_reg_number) from the header lines of a page transcript, or (None, None)."""
+    if not transcript:
+        return None, None
+    return find_reg_number("\n".join(transcript.strip().splitlines()[:HEADER_LINES]))
+
+
+def assemble_scripts(pages, transcripts):
+    """
+    Groups page transcripts (None for failed pages) into students.
+
+    Returns ({safe_reg: {"reg_number", "pages": [labels], "transcript"}},
+    [labels of unassigned pages]). Each student's pages keep scan order and
+    are joined with a "<!-- page label -->" marker; a student seen again
+    later in the scan gets the later pages appended. Unassigned pages are
+    those before the first registration number, failed pages and the pages
+    after a failed page up to the next registration number, since whose
+    script they continue is unknown.
+    """
+    students, unassigned = {}, []
+    current = None
+    for page, transcript in zip(pages, transcripts):
+        if not transcript:
+            current = None
+            unassigned.append(page.label)
+            continue
+        reg_number, safe_reg_number = header_reg_number(transcript)
+        if reg_number:
+            current = students.setdefault(safe_reg_number, {"reg_number": reg_number, "pages": [], "parts": []})
+        if current is None:
+            unassigned.append(page.label)
+            continue
+        current["pages"].append(page.label)
+        current["parts"].append(f"<!-- {page.label} -->\n{transcript}")
+    for student in students.values():
+        student["transcript"] = "\n\n".join(student.pop("parts"))
+    return students, unassigned
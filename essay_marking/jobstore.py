@@ -0,0 +1,269 @@
+"""
+SQLite job store shared by Streamlit sessions, the CLI and background
+workers: scripts (source images), one transcript and one evaluation report
+per student, and job status/progress. The database runs in WAL mode so
+readers never block the single writer, and every process or session opens
+its own JobStore on the same file.
+
+Per-question structured scores live in the same file when a ScoreStore is
+opened on it (see essay_marking.scores).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+# ===== CONFIGURATION =====
+DEFAULT_PAGE_SIZE = 25
+BUSY_TIMEOUT_MS = 30000  # wait this long for another process's write lock
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scripts (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL UNIQUE,
+    reg_number TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scripts_reg ON scripts (reg_number);
+
+CREATE TABLE IF NOT EXISTS transcripts (
+    safe_reg TEXT PRIMARY KEY,
+    reg_number TEXT NOT NULL COLLATE NOCASE,
+    text TEXT NOT NULL,
+    source TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transcripts_reg ON transcripts (reg_number);
+
+CREATE TABLE IF NOT EXISTS evaluations (
+    safe_reg TEXT PRIMARY KEY,
+    mode TEXT NOT NULL,
+    report TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+"""
+
+
+def _prefix_pattern(search):
+    """LIKE pattern matching reg numbers that start with `search` literally ("_" and "%" included)."""
+    escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%"
+
+
+class JobStore:
+    """Thread-safe within a process; safe across processes through SQLite locking."""
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "worker" not in columns:  # databases created before the worker queue
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN worker TEXT")
+
+    def _write(self, sql, params=()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params)
+
+    def _one_write(self, sql, params=()):
+        with self._lock, self._conn:
+            rows = self._conn.execute(sql, params).fetchall()
+            return dict(rows[0]) if rows else None
+
+    def _rows(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def _one(self, sql, params=()):
+        rows = self._rows(sql, params)
+        return rows[0] if rows else None
+
+    # ----- scripts and transcripts -----
+    def add_script(self, source, reg_number=None):
+        """Records a source image (path or upload name) and the student it belongs to."""
+        self._write("""
+            INSERT INTO scripts (source, reg_number, created_at) VALUES (?, ?, ?)
+            ON CONFLICT (source) DO UPDATE SET reg_number = COALESCE(excluded.reg_number, reg_number)
+        """, (source, reg_number, time.time()))
+
+    def save_transcript(self, safe_reg, reg_number, text, source=None):
+        self._write("""
+            INSERT INTO transcripts (safe_reg, reg_number, text, source, updated_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (safe_reg) DO UPDATE SET reg_number = excluded.reg_number, text = excluded.text,
+                source = excluded.source, updated_at = excluded.updated_at
+        """, (safe_reg, reg_number, text, source, time.time()))
+        if source:
+            self.add_script(source, reg_number)
+
+    def get_transcript(self, safe_reg):
+        row = self._one("SELECT text FROM transcripts WHERE safe_reg = ?", (safe_reg,))
+        return row["text"] if row else None
+
+    def has_transcript(self, safe_reg):
+        return self._one("SELECT 1 FROM transcripts WHERE safe_reg = ?", (safe_reg,)) is not None
+
+    def count_students(self, search=""):
+        return self._one("SELECT COUNT(*) AS n FROM transcripts WHERE reg_number LIKE ? ESCAPE '\\'",
+                         (_prefix_pattern(search),))["n"]
+
+    def list_students(self, offset=0, limit=DEFAULT_PAGE_SIZE, search="", evaluated_only=False):
+        """
+        One page of students (without transcript text) ordered by reg number;
+        `search` is a reg-number prefix, answered from the reg_number index.
+        """
+        return self._rows(f"""
+            SELECT t.safe_reg, t.reg_number, t.updated_at, e.updated_at AS evaluated_at
+            FROM transcripts t LEFT JOIN evaluations e ON e.safe_reg = t.safe_reg
+            WHERE t.reg_number LIKE ? ESCAPE '\\' {"AND e.safe_reg IS NOT NULL" if evaluated_only else ""}
+            ORDER BY t.reg_number LIMIT ? OFFSET ?
+        """, (_prefix_pattern(search), limit, offset))
+
+    def import_transcripts(self, folder, find_reg_number):
+        """Loads <safe_reg>.md files written by earlier versions; returns how many were new."""
+        if not os.path.isdir(folder):
+            return 0
+        imported = 0
+        for filename in sorted(os.listdir(folder)):
+            if not filename.endswith(".md"):
+                continue
+            with open(os.path.join(folder, filename), "r", encoding="utf-8") as f:
+                text = f.read()
+            # Re-derive the key so legacy near-duplicates ("EG_2020_3905$.md") collapse into one student
+            reg_number, safe_reg = find_reg_number(text)
+            safe_reg = safe_reg or os.path.splitext(filename)[0]
+            if self.has_transcript(safe_reg):
+                continue
+            self.save_transcript(safe_reg, reg_number or safe_reg, text)
+            imported += 1
+        return imported
+
+    # ----- evaluations -----
+    def save_evaluation(self, safe_reg, mode, report):
+        self._write("""
+            INSERT INTO evaluations (safe_reg, mode, report, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (safe_reg) DO UPDATE SET mode = excluded.mode, report = excluded.report,
+                updated_at = excluded.updated_at
+        """, (safe_reg, mode, report, time.time()))
+
+    def get_evaluation(self, safe_reg):
+        return self._one("SELECT * FROM evaluations WHERE safe_reg = ?", (safe_reg,))
+
+    def count_evaluations(self, search=""):
+        return self._one("""
+            SELECT COUNT(*) AS n FROM evaluations e JOIN transcripts t ON t.safe_reg = e.safe_reg
+            WHERE t.reg_number LIKE ? ESCAPE '\\'
+        """, (_prefix_pattern(search),))["n"]
+
+    # ----- jobs -----
+    def claim_job(self, worker):
+        """
+        Atomically moves the next queued job to 'running' and returns it (None
+        when the queue is empty). Owners with fewer running jobs go first, so
+        one marker's batches cannot hold back another's.
+        """
+        now = time.time()
+        row = self._one_write("""
+            UPDATE jobs SET status = 'running', worker = ?, updated_at = ?
+            WHERE id = (
+                SELECT j.id FROM jobs j WHERE j.status = 'queued'
+                ORDER BY (SELECT COUNT(*) FROM jobs r WHERE r.status = 'running' AND r.owner IS j.owner), j.id
+                LIMIT 1
+            )
+            RETURNING *
+        """, (worker, now))
+        return self._decode_job(row)
+
+    def heartbeat(self, worker):
+        """Records that `worker` is alive; workers call this periodically, also while a job runs."""
+        self._write("""
+            INSERT INTO workers (id, heartbeat) VALUES (?, ?)
+            ON CONFLICT (id) DO UPDATE SET heartbeat = excluded.heartbeat
+        """, (worker, time.time()))
+
+    def worker_ids(self):
+        return [row["id"] for row in self._rows("SELECT id FROM workers")]
+
+    def forget_workers(self, workers):
+        """Drops the heartbeats of workers known to be gone, so requeue_stale frees their jobs straight away."""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM workers WHERE id = ?", [(worker,) for worker in workers])
+
+    def requeue_stale(self, max_age):
+        """
+        Puts 'running' jobs back in the queue when their worker has sent no
+        heartbeat for `max_age` seconds (it died). A job still running on a
+        live worker is left alone however long it goes without progress.
+        """
+        with self._lock, self._conn:
+            count = self._conn.execute("""
+                UPDATE jobs SET status = 'queued', worker = NULL
+                WHERE status = 'running' AND NOT EXISTS (
+                    SELECT 1 FROM workers w WHERE w.id = jobs.worker AND w.heartbeat >= ?
+                )
+            """, (time.time() - max_age,)).rowcount
+            self._conn.execute("DELETE FROM workers WHERE heartbeat < ?", (time.time() - max_age,))
+            return count
+
+    def create_job(self, kind, payload, total=0, owner=None):
+        now = time.time()
+        return self._write("""
+            INSERT INTO jobs (kind, payload, total, owner, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)
+        """, (kind, json.dumps(payload), total, owner, now, now)).lastrowid
+
+    def update_job(self, job_id, **fields):
+        """Sets any of status, done, total, result (JSON-encoded here) and error."""
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._write(f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                    (*fields.values(), time.time(), job_id))
+
+    def get_job(self, job_id):
+        return self._decode_job(self._one("SELECT * FROM jobs WHERE id = ?", (job_id,)))
+
+    def list_jobs(self, limit=DEFAULT_PAGE_SIZE, owner=None):
+        rows = self._rows(f"""
+            SELECT * FROM jobs {"WHERE owner = ?" if owner else ""} ORDER BY id DESC LIMIT ?
+        """, (owner, limit) if owner else (limit,))
+        return [self._decode_job(row) for row in rows]
+
+    @staticmethod
+    def _decode_job(row):
+        if row:
+            row["payload"] = json.loads(row["payload"])
+            row["result"] = json.loads(row["result"]) if row["result"] else None
+        return row
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,24 @@
+def edit_distance(a, b):
+    """Levenshtein distance between two sequences (strings or token lists)."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, item_a in enumerate(a, start=1):
+        current = [i]
+        for j, item_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (item_a != item_b)))
+        previous = current
+    return previous[-1]
+
+
+def cer(references, hypotheses):
+    """Character error rate over a corpus: total edits / total reference characters."""
+    edits = sum(edit_distance(r, h) for r, h in zip(references, hypotheses))
+    return edits / max(1, sum(len(r) for r in references))
+
+
+def wer(references, hypotheses):
+    """Word error rate over a corpus: total word edits / total reference words."""
+    edits = sum(edit_distance(r.split(), h.split()) for r, h in zip(references, hypotheses))
+    return edits / max(1, sum(len(r.split()) for r in references))
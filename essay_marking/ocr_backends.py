@@ -0,0 +1,251 @@
+"""
+Interchangeable OCR backends behind one interface.
+
+Every backend turns a list of PIL images into a list of texts in the same
+order, batching internally where the engine allows it. Backends are looked
+up by name in BACKENDS, so a config entry picks the engine:
+
+    backend = backend_from_config({"backend": "trocr", "batch_size": 32})
+    texts = backend.transcribe(images)
+
+Models load lazily on the first transcribe call, so building a backend is
+cheap and load time can be measured separately (see
+essay_marking.benchmarks.ocr_backends).
+"""
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from essay_marking.batch import run_batch, DEFAULT_MAX_IN_FLIGHT, DEFAULT_REQUEST_TIMEOUT
+from essay_marking.trocr import DEFAULT_BATCH_SIZE, crop_lines, segment_lines
+
+
+BACKENDS = {}
+
+
+def register(name):
+    """Class decorator adding a backend to BACKENDS under `name`."""
+    def decorator(cls):
+        cls.name = name
+        BACKENDS[name] = cls
+        return cls
+    return decorator
+
+
+def get_backend(name, **options):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend {name!r}; choose from {', '.join(sorted(BACKENDS))}")
+    return BACKENDS[name](**options)
+
+
+def backend_from_config(config):
+    """Backend from a name or a {"backend": name, **options} dict."""
+    if isinstance(config, str):
+        return get_backend(config)
+    options = dict(config)
+    return get_backend(options.pop("backend"), **options)
+
+
+class OCRBackend:
+    """Base class: `transcribe(images) -> texts`, raising if any image fails."""
+
+    name = None
+
+    def load(self):
+        """Loads models; called by the first transcribe, or up front to time it."""
+
+    def transcribe(self, images):
+        raise NotImplementedError
+
+
+# ===== REMOTE =====
+@register("gemini")
+class GeminiBackend(OCRBackend):
+    """Gemini transcription (FinalCodes/app3.py); images are sent concurrently."""
+
+    def __init__(self, model_name="gemini-2.5-flash", api_key=None, prompt=None, model=None,
+                 max_in_flight=DEFAULT_MAX_IN_FLIGHT, timeout=DEFAULT_REQUEST_TIMEOUT, cache=None):
+        self.model_name = model_name
+        self.api_key = api_key
+        self.prompt = prompt or "Extract all handwritten text from this image as accurately as possible."
+        self.model = model  # e.g. a ScheduledModel or FakeGenerativeModel
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.cache = cache
+
+    def load(self):
+        if self.model is None:
+            import google.generativeai as genai
+
+            if self.api_key:
+                genai.configure(api_key=self.api_key)
+            self.model = genai.GenerativeModel(self.model_name)
+
+    def transcribe(self, images):
+        from essay_marking.gemini import transcribe_image
+
+        self.load()
+        results = run_batch(images, lambda image, timeout: transcribe_image(
+            self.model, image, self.prompt, timeout=timeout, cache=self.cache),
+            max_in_flight=self.max_in_flight, timeout=self.timeout)
+        for result in results:
+            if not result.ok:
+                raise result.error
+        return [result.value or "" for result in results]
+
+
+# ===== LOCAL MODELS =====
+@register("deepseek-vl")
+class DeepSeekVLBackend(OCRBackend):
+    """DeepSeek-VL vision-language model (test_models/app.py)."""
+
+    PROMPT = "<|user|>\nWhat is the handwritten text in this image?\n<|image|>\n<image_placeholder>\n<|endofimage|>\n<|assistant|>"
+
+    def __init__(self, model_name="deepseek-ai/deepseek-vl-7b", batch_size=4, max_new_tokens=256):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_new_tokens = max_new_tokens
+        self.processor = self.model = None
+
+    def load(self):
+        if self.model is None:
+            import torch
+            from transformers import AutoProcessor, AutoModelForVision2Seq
+
+            self.dtype = torch.float16 if torch.cuda.is_available() else torch.float32
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            self.processor = AutoProcessor.from_pretrained(self.model_name)
+            self.model = AutoModelForVision2Seq.from_pretrained(self.model_name, torch_dtype=self.dtype,
+                                                                device_map="auto")
+
+    def transcribe(self, images):
+        import torch
+
+        self.load()
+        texts = []
+        with torch.inference_mode():
+            for start in range(0, len(images), self.batch_size):
+                batch = [image.convert("RGB") for image in images[start:start + self.batch_size]]
+                inputs = self.processor(text=[self.PROMPT] * len(batch), images=batch, padding=True,
+                                        return_tensors="pt").to(self.device, self.dtype)
+                generated_ids = self.model.generate(**inputs, max_new_tokens=self.max_new_tokens)
+                texts.extend(self.processor.batch_decode(generated_ids, skip_special_tokens=True))
+        return texts
+
+
+@register("trocr")
+class TrOCRBackend(OCRBackend):
+    """
+    TrOCR over segmented lines (test_models/main.py). The lines of all
+    images are recognised together, so small pages still fill a batch.
+    """
+
+    def __init__(self, model_dir="microsoft/trocr-base-handwritten", batch_size=DEFAULT_BATCH_SIZE,
+                 prefer_quantized=True):
+        self.model_dir = model_dir
+        self.batch_size = batch_size
+        self.prefer_quantized = prefer_quantized
+        self.processor = self.model = None
+
+    def load(self):
+        if self.model is None:
+            from essay_marking.trocr import load_trocr
+
+            self.processor, self.model = load_trocr(self.model_dir, prefer_quantized=self.prefer_quantized)
+
+    def recognize(self, images):
+        """Recognised lines per image."""
+        from essay_marking.trocr import recognize_lines
+
+        self.load()
+        crops, owners = [], []
+        for i, image in enumerate(images):
+            boxes = segment_lines(image)
+            page_crops = crop_lines(image, boxes) if boxes else [image.convert("RGB")]
+            crops.extend(page_crops)
+            owners.extend([i] * len(page_crops))
+        lines = [[] for _ in images]
+        for owner, text in zip(owners, recognize_lines(self.processor, self.model, crops, batch_size=self.batch_size)):
+            lines[owner].append(text)
+        return lines
+
+    def transcribe(self, images):
+        return ["\n".join(lines) for lines in self.recognize(images)]
+
+
+@register("trocr-t5")
+class TrOCRT5Backend(TrOCRBackend):
+    """TrOCR lines corrected by a T5 grammar model (test_models/app2.py)."""
+
+    def __init__(self, corrector="vennify/t5-base-grammar-correction", max_length=256, **options):
+        super().__init__(**options)
+        self.corrector_name = corrector
+        self.max_length = max_length
+        self.corrector = None
+
+    def load(self):
+        super().load()
+        if self.corrector is None:
+            from transformers import pipeline
+
+            self.corrector = pipeline("text2text-generation", model=self.corrector_name)
+
+    def transcribe(self, images):
+        pages = self.recognize(images)
+        lines = [line for page in pages for line in page]
+        corrected = iter(output["generated_text"] for output in self.corrector(
+            lines, max_length=self.max_length, batch_size=self.batch_size)) if lines else iter(())
+        return ["\n".join(next(corrected) for _ in page) for page in pages]
+
+
+# ===== CLASSIC OCR =====
+@register("tesseract")
+class TesseractBackend(OCRBackend):
+    """Tesseract (essay_grader.py, the notebook) run as parallel `tesseract` processes."""
+
+    def __init__(self, lang="eng", workers=None, timeout=60):
+        self.lang = lang
+        self.workers = workers
+        self.timeout = timeout
+
+    def transcribe(self, images):
+        from essay_marking.pdf_ocr import ocr_image_bytes
+
+        def ocr(image):
+            data = io.BytesIO()
+            image.convert("L").save(data, format="PPM")  # grayscale PGM, read natively by Tesseract
+            return ocr_image_bytes(data.getvalue(), lang=self.lang, timeout=self.timeout)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(ocr, images))
+
+
+@register("docling")
+class DoclingBackend(OCRBackend):
+    """Docling layout + OCR (docapp.py) with one warm converter."""
+
+    def __init__(self, workers=None):
+        from essay_marking.docling_ocr import DEFAULT_WORKERS
+
+        self.workers = workers or DEFAULT_WORKERS
+        self.converter = None
+
+    def load(self):
+        if self.converter is None:
+            from essay_marking.docling_ocr import get_converter
+
+            self.converter = get_converter()
+
+    def transcribe(self, images):
+        from essay_marking.docling_ocr import convert_batch
+
+        self.load()
+        documents = []
+        for i, image in enumerate(images):
+            data = io.BytesIO()
+            image.convert("RGB").save(data, format="PNG")
+            documents.append((f"image{i}.png", data.getvalue()))
+        results = convert_batch(self.converter, documents, workers=self.workers)
+        for name, _, error in results:
+            if error:
+                raise RuntimeError(f"Docling failed on {name}: {error}")
+        return [markdown for _, markdown, _ in results]
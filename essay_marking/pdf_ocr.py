@@ -0,0 +1,137 @@
+"""
+Paged Tesseract OCR for large scanned PDFs.
+
+Pages are rendered one at a time with PyMuPDF inside worker processes and
+piped straight into the `tesseract` binary (stdin -> stdout), so neither PIL
+images for the whole bundle nor temporary JPEGs are ever created. Text is
+written to disk in page order as soon as it is available.
+
+    python -m essay_marking.pdf_ocr FinalSubmission.pdf WrittenAnswers.pdf --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+
+import fitz  # PyMuPDF
+
+
+# ===== CONFIGURATION =====
+DEFAULT_DPI = 200  # same trade-off as the notebook's convert_from_path call
+DEFAULT_TIMEOUT = 60  # seconds of Tesseract time per page
+TESSERACT_CMD = "tesseract"
+
+_worker = {}
+
+
+# ===== PAGE RENDERING AND OCR =====
+def render_page(doc, page_index, dpi=DEFAULT_DPI):
+    """Renders one page to grayscale PGM bytes, which Tesseract reads natively."""
+    pixmap = doc[page_index].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    return pixmap.tobytes("pgm")
+
+
+def ocr_image_bytes(image_bytes, lang="eng", timeout=DEFAULT_TIMEOUT):
+    result = subprocess.run(
+        [TESSERACT_CMD, "stdin", "stdout", "-l", lang],
+        input=image_bytes,
+        capture_output=True,
+        timeout=timeout,
+        check=True,
+    )
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+def _init_worker(pdf_path, dpi, lang, timeout):
+    _worker["doc"] = fitz.open(pdf_path)
+    _worker["options"] = (dpi, lang, timeout)
+
+
+def _ocr_page(page_index):
+    dpi, lang, timeout = _worker["options"]
+    try:
+        text = ocr_image_bytes(render_page(_worker["doc"], page_index, dpi), lang=lang, timeout=timeout)
+        return page_index, text, None
+    except Exception as e:
+        return page_index, None, str(e)
+
+
+def iter_pdf_ocr(pdf_path, workers=None, dpi=DEFAULT_DPI, lang="eng",
+                 timeout=DEFAULT_TIMEOUT, first_page=1, last_page=None):
+    """
+    Yields (page_number, text, error) in page order. At most `workers` pages
+    are rendered at once; completed pages beyond the next one in order are
+    held only as text. Raises ValueError straight away for a first_page
+    below 1, before any output is opened.
+    """
+    if first_page < 1:
+        raise ValueError(f"first_page must be 1 or more, got {first_page}")
+    return _iter_pages(pdf_path, workers, dpi, lang, timeout, first_page, last_page)
+
+
+def _iter_pages(pdf_path, workers, dpi, lang, timeout, first_page, last_page):
+    with fitz.open(pdf_path) as doc:
+        page_count = len(doc)
+    last_page = min(last_page or page_count, page_count)
+    page_indexes = range(first_page - 1, last_page)
+    workers = workers or os.cpu_count() or 1
+
+    with multiprocessing.Pool(workers, initializer=_init_worker,
+                              initargs=(pdf_path, dpi, lang, timeout)) as pool:
+        for page_index, text, error in pool.imap(_ocr_page, page_indexes):
+            yield page_index + 1, text, error
+
+
+def extract_text_with_ocr(pdf_path, output_path, **options):
+    """
+    Streams OCR text for `pdf_path` into `output_path` using the notebook's
+    "=== Page N ===" layout and returns (pages_ok, pages_failed).
+    """
+    ok = failed = 0
+    pages = iter_pdf_ocr(pdf_path, **options)
+    with open(output_path, "w", encoding="utf-8") as f:
+        for page_number, text, error in pages:
+            if error is None:
+                f.write(f"=== Page {page_number} ===\n{text}\n\n")
+                ok += 1
+            else:
+                error_msg = f"⚠️ Error processing page {page_number}: {error}"
+                print(error_msg)
+                f.write(f"=== Page {page_number} ERROR ===\n{error_msg}\n\n")
+                failed += 1
+            f.flush()
+    return ok, failed
+
+
+# ===== CLI =====
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OCR scanned PDFs page by page in constant memory.")
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument("--out-dir", default=None, help="Defaults to each PDF's own folder")
+    parser.add_argument("--workers", type=int, default=None, help="Tesseract processes (default: CPU count)")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI)
+    parser.add_argument("--lang", default="eng")
+    parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT)
+    parser.add_argument("--first-page", type=int, default=1)
+    parser.add_argument("--last-page", type=int, default=None)
+    args = parser.parse_args(argv)
+    if args.first_page < 1:
+        parser.error("--first-page must be 1 or more")
+
+    for pdf_path in args.pdfs:
+        if not os.path.exists(pdf_path):
+            print(f"⚠️ File not found: {pdf_path} - Skipping...")
+            continue
+        stem = os.path.splitext(os.path.basename(pdf_path))[0]
+        out_dir = args.out_dir or os.path.dirname(os.path.abspath(pdf_path))
+        output_path = os.path.join(out_dir, f"OCR_extraction_{stem}.txt")
+        print(f"STARTING PROCESSING: {pdf_path}")
+        ok, failed = extract_text_with_ocr(
+            pdf_path, output_path, workers=args.workers, dpi=args.dpi, lang=args.lang,
+            timeout=args.timeout, first_page=args.first_page, last_page=args.last_page,
+        )
+        print(f"✅ {ok} pages extracted ({failed} failed) to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Scan preprocessing for OCR: deskew, denoise, binarize and crop margins.
+
+app2.preprocess_image upscales 2x before blurring and thresholding, which
+turns a 12 MP phone photo into a 48 MP intermediate. Here the same blur +
+adaptive mean threshold runs at native resolution (kernel sizes halved to
+match), on bounded-size tiles whose halo makes the result identical to a
+whole-image pass. Each thread keeps one pair of buffers for full-size
+tiles and reuses it; the smaller edge tiles get buffers per call. Batches
+are spread over a process pool.
+
+    config = PreprocessConfig(deskew=False)
+    binary = preprocess(image, config)                   # PIL image or array in, uint8 array out
+    results = preprocess_batch(paths, config, workers=4)
+
+    python -m essay_marking.benchmarks.preprocess
+"""
+import os
+import threading
+from dataclasses import dataclass, asdict
+from multiprocessing import Pool
+from typing import Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+# ===== CONFIGURATION =====
+@dataclass
+class PreprocessConfig:
+    deskew: bool = True
+    max_skew: float = 5.0  # degrees searched either way
+    denoise: Optional[str] = "gaussian"  # "gaussian", "median" or None
+    blur_size: int = 3  # app2's 5x5 blur at 2x scale
+    binarize: bool = True
+    block_size: int = 7  # app2's 11px threshold block at 2x scale
+    offset: int = 12  # constant subtracted from the local mean, as in app2
+    crop: bool = True
+    margin: int = 16  # pixels kept around the ink when cropping
+    upscale: float = 1.0  # app2 used 2.0; only useful for engines that do not resize their input
+    tile: int = 1024  # tile edge in pixels; 0 processes the whole image at once
+
+
+SKEW_PREVIEW = 800  # long edge of the downscaled copy used to estimate skew and margins
+SKEW_STEP = 0.25  # degrees between tested angles
+
+
+# ===== STAGES =====
+def to_gray(image):
+    """uint8 grayscale array from a PIL image or an RGB/gray array."""
+    if isinstance(image, Image.Image):
+        return np.asarray(image.convert("L"))
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+
+def _preview(gray):
+    scale = min(1.0, SKEW_PREVIEW / max(gray.shape))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    _, ink = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    return ink, scale
+
+
+def estimate_skew(gray, max_skew=5.0):
+    """
+    Skew angle in degrees: the rotation whose horizontal ink profile is the
+    sharpest (text lines line up with rows), searched on a small preview.
+    """
+    ink, _ = _preview(gray)
+    h, w = ink.shape
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_skew, max_skew + SKEW_STEP / 2, SKEW_STEP):
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        profile = cv2.warpAffine(ink, matrix, (w, h), flags=cv2.INTER_NEAREST).sum(axis=1, dtype=np.float64)
+        score = float(np.var(profile))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def rotate(gray, angle):
+    h, w = gray.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def margin_box(gray, margin=16):
+    """(x0, y0, x1, y1) around the ink, found on a small preview; ignores rows/columns with stray specks."""
+    ink, scale = _preview(gray)
+    h, w = gray.shape
+
+    def span(counts, length):
+        active = np.flatnonzero(counts > max(1, counts.max() * 0.02))
+        if not active.size:
+            return 0, length
+        return (max(0, int(active[0] / scale) - margin), min(length, int((active[-1] + 1) / scale) + margin))
+
+    x0, x1 = span(np.count_nonzero(ink, axis=0), w)
+    y0, y1 = span(np.count_nonzero(ink, axis=1), h)
+    return x0, y0, x1, y1
+
+
+# ===== TILED FILTERING =====
+class _TileBuffers(threading.local):
+    """
+    Scratch arrays for full-size tiles, one pair per thread: Streamlit
+    serves sessions on threads and cv2 releases the GIL, so a shared pair
+    would be written by two pages at once. Only the latest full tile shape
+    is kept; edge tiles, whose shapes vary with every page size, are
+    allocated per call so nothing accumulates in a long-running server.
+    """
+    shape = None
+    pair = None
+
+    def get(self, shape, full_shape):
+        if shape != full_shape:
+            return np.empty(shape, np.uint8), np.empty(shape, np.uint8)
+        if self.shape != shape:
+            self.shape, self.pair = shape, (np.empty(shape, np.uint8), np.empty(shape, np.uint8))
+        return self.pair
+
+
+_buffers = _TileBuffers()
+
+
+def _filter(src, blurred, binary, config):
+    """Denoise and binarize `src` into the given buffers; returns the array holding the result."""
+    out = src
+    if config.denoise == "gaussian":
+        cv2.GaussianBlur(src, (config.blur_size, config.blur_size), 0, dst=blurred)
+        out = blurred
+    elif config.denoise == "median":
+        cv2.medianBlur(src, config.blur_size, dst=blurred)
+        out = blurred
+    if config.binarize:
+        cv2.adaptiveThreshold(out, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY,
+                              config.block_size, config.offset, dst=binary)
+        out = binary
+    return out
+
+
+def filter_tiled(gray, config, out=None):
+    """
+    Denoise + binarize `gray` tile by tile into `out` (allocated when None).
+    Each tile is read with a halo wide enough for both filters, so the
+    output equals a whole-image pass.
+    """
+    h, w = gray.shape
+    out = np.empty_like(gray) if out is None else out
+    tile = config.tile or max(h, w)
+    halo = (config.blur_size // 2 if config.denoise else 0) + (config.block_size // 2 if config.binarize else 0)
+    full_shape = (tile + 2 * halo, tile + 2 * halo)
+    for y in range(0, h, tile):
+        for x in range(0, w, tile):
+            y0, x0 = max(0, y - halo), max(0, x - halo)
+            y1, x1 = min(h, y + tile + halo), min(w, x + tile + halo)
+            src = np.ascontiguousarray(gray[y0:y1, x0:x1])
+            result = _filter(src, *_buffers.get(src.shape, full_shape), config)
+            out[y:y + tile, x:x + tile] = result[y - y0:y - y0 + min(tile, h - y), x - x0:x - x0 + min(tile, w - x)]
+    return out
+
+
+# ===== PIPELINE =====
+def preprocess(image, config=None):
+    """Runs the configured stages on one page; returns a uint8 array (binary when config.binarize)."""
+    config = config or PreprocessConfig()
+    gray = to_gray(image)
+    if config.upscale != 1.0:
+        gray = cv2.resize(gray, None, fx=config.upscale, fy=config.upscale, interpolation=cv2.INTER_CUBIC)
+    if config.deskew:
+        angle = estimate_skew(gray, config.max_skew)
+        if abs(angle) >= SKEW_STEP:
+            gray = rotate(gray, angle)
+    if config.crop:
+        x0, y0, x1, y1 = margin_box(gray, config.margin)
+        gray = gray[y0:y1, x0:x1]
+    return filter_tiled(gray, config)
+
+
+def _load(source):
+    if isinstance(source, str):
+        return cv2.imread(source, cv2.IMREAD_GRAYSCALE)
+    return to_gray(source)
+
+
+def _preprocess_one(job):
+    source, config = job
+    return preprocess(_load(source), PreprocessConfig(**config))
+
+
+def preprocess_batch(sources, config=None, workers=None):
+    """
+    Preprocesses image paths (decoded in the workers) or arrays across a
+    process pool; returns arrays in input order.
+    """
+    config = asdict(config or PreprocessConfig())
+    jobs = [(source, config) for source in sources]
+    workers = min(workers or os.cpu_count() or 1, len(jobs)) or 1
+    if workers == 1:
+        return [_preprocess_one(job) for job in jobs]
+    with Pool(workers) as pool:
+        return pool.map(_preprocess_one, jobs, chunksize=1)
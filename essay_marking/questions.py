@@ -0,0 +1,61 @@
+import os
+import re
+
+from essay_marking.tracing import timed
+
+# Student transcripts mark answers with lines such as "Q3", "Q3.", "**Q3)**" or "Question 3"
+ANSWER_HEADING = re.compile(r"^[\s#*_>-]*Q(?:uestion)?\s*(\d{1,2})\b[.):*_\s]*", re.IGNORECASE | re.MULTILINE)
+
+
+def question_id(number):
+    """The key used for question `number` on both the scheme and the answer side: "01" and "1" are both "Q1"."""
+    return f"Q{int(number)}"
+
+
+def question_sort_key(q_id):
+    return int(re.sub(r"\D", "", q_id) or 0)
+
+
+def load_question_schemes(folder):
+    """
+    Reads the Q<n>.md files written by split_questions_to_folder into
+    {"Q<n>": text}, keyed like split_answer_by_question ("Q01.md" is "Q1").
+    """
+    schemes = {}
+    if not os.path.isdir(folder):
+        return schemes
+    for name in sorted(os.listdir(folder)):
+        match = re.fullmatch(r"Q(\d{1,2})\.md", name, re.IGNORECASE)
+        if match:
+            with open(os.path.join(folder, name), "r", encoding="utf-8") as f:
+                schemes[question_id(match.group(1))] = f.read()
+    return dict(sorted(schemes.items(), key=lambda kv: question_sort_key(kv[0])))
+
+
+@timed("split_answer")
+def split_answer_by_question(student_md, question_ids):
+    """
+    Splits a student transcript into {"Q<n>": answer_text} using its question
+    headings. Text before the first heading (registration number etc.) is
+    dropped, and repeated headings are concatenated in reading order.
+
+    A transcript without headings is attributed to the only question when the
+    scheme has exactly one; otherwise an empty dict is returned so the caller
+    can fall back to whole-scheme evaluation.
+    """
+    matches = list(ANSWER_HEADING.finditer(student_md))
+    if not matches:
+        if len(question_ids) == 1:
+            return {list(question_ids)[0]: student_md.strip()}
+        return {}
+
+    sections = {}
+    for i, match in enumerate(matches):
+        q_id = question_id(match.group(1))
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(student_md)
+        text = student_md[match.end():end].strip()
+        if q_id in sections:
+            sections[q_id] = f"{sections[q_id]}\n\n{text}"
+        else:
+            sections[q_id] = text
+    return {q_id: text for q_id, text in sections.items() if q_id in question_ids and text}
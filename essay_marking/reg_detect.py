@@ -0,0 +1,90 @@
+"""
+Local registration-number detection with the fine-tuned TrOCR model in
+test_models/Reg_Ditection/trocr-finetuned.
+
+The header line of a script page is cropped, read with TrOCR and
+validated against the EG/NNNN/NNNN format, so scripts can be routed,
+deduplicated or skipped before any Gemini request is made.
+
+    python -m essay_marking.benchmarks.reg_detect
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from essay_marking.students import normalize_reg_number
+from essay_marking.trocr import DEFAULT_BATCH_SIZE, segment_lines
+
+
+# ===== CONFIGURATION =====
+HEADER_BAND = 0.15  # top fraction of a page searched for the "Reg Number: $ ..." line
+CROP_ASPECT = 2.5  # images wider than this (w/h) are already header crops
+LABEL_END = 0.17  # the printed "Reg Number :" label ends at this fraction of the page width
+DEFAULT_MIN_CONFIDENCE = 0.8
+MAX_NEW_TOKENS = 24
+
+
+@dataclass
+class RegDetection:
+    reg_number: Optional[str]  # canonical EG/NNNN/NNNN, or None when the text does not validate
+    text: str  # raw model output
+    confidence: float  # geometric mean of the generated tokens' probabilities (0 when invalid)
+
+    @property
+    def valid(self):
+        return self.reg_number is not None
+
+
+# ===== HEADER CROP =====
+def crop_header(image):
+    """
+    Handwritten part of a page's header line. Images that are already wide
+    crops (as in custom_data) are returned unchanged; when no header line
+    is found the top band of the page is returned.
+    """
+    image = image.convert("RGB")
+    if image.width >= CROP_ASPECT * image.height:
+        return image
+    band = image.crop((0, 0, image.width, max(1, int(image.height * HEADER_BAND))))
+    boxes = segment_lines(band)
+    if not boxes:
+        return band
+    # Large handwriting can be split into overlapping line boxes; merge them back
+    x0, y0, x1, y1 = boxes[0]
+    for bx0, by0, bx1, by1 in boxes[1:]:
+        if by0 > y1:
+            break
+        x0, x1, y1 = min(x0, bx0), max(x1, bx1), max(y1, by1)
+    # Skip the printed "Reg Number :" label of the answer-sheet template
+    x0 = min(max(x0, int(image.width * LABEL_END)), x1 - 1)
+    return band.crop((x0, y0, x1, y1))
+
+
+# ===== RECOGNITION =====
+def read_reg_numbers(processor, model, images, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Reads the registration number of each page (or header crop) and returns
+    a RegDetection per image in input order. Confidence is derived from the
+    decoder's token probabilities and is 0 for readings that do not validate.
+    """
+    import torch
+
+    crops = [crop_header(image) for image in images]
+    detections = [None] * len(crops)
+    order = sorted(range(len(crops)), key=lambda i: crops[i].width / max(1, crops[i].height))
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            pixel_values = processor(images=[crops[i] for i in batch], return_tensors="pt").pixel_values
+            output = model.generate(pixel_values, max_new_tokens=MAX_NEW_TOKENS,
+                                    output_scores=True, return_dict_in_generate=True)
+            # Log-probability of each chosen token; padding after EOS scores 0 and is masked out
+            token_scores = model.compute_transition_scores(output.sequences, output.scores, normalize_logits=True)
+            generated = output.sequences[:, 1:]
+            mask = generated != processor.tokenizer.pad_token_id
+            lengths = mask.sum(dim=1).clamp(min=1)
+            confidences = torch.exp((token_scores * mask).sum(dim=1) / lengths).tolist()
+            texts = processor.batch_decode(output.sequences, skip_special_tokens=True)
+            for i, text, confidence in zip(batch, texts, confidences):
+                reg_number = normalize_reg_number(text)
+                detections[i] = RegDetection(reg_number, text, confidence if reg_number else 0.0)
+    return detections
@@ -0,0 +1,203 @@
+"""
+Shared rate-limit scheduler for Gemini calls.
+
+Every request waits for a slot in a requests-per-minute and a
+tokens-per-minute token bucket, interactive requests are admitted ahead of
+queued batch requests, and quota (429) / transient 5xx errors are retried
+with jittered exponential backoff instead of failing the script.
+
+    scheduler = RateLimitScheduler(rpm=60, tpm=1_000_000)
+    batch_model = scheduler.wrap(genai.GenerativeModel("gemini-2.5-flash"))
+    interactive_model = scheduler.wrap(model, priority=INTERACTIVE)
+
+Wrapped models keep the `generate_content` signature, so they can be passed
+anywhere a `genai.GenerativeModel` is expected.
+"""
+import collections
+import heapq
+import itertools
+import random
+import threading
+import time
+
+
+# ===== CONFIGURATION =====
+DEFAULT_RPM = 60
+DEFAULT_TPM = 1_000_000
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0  # seconds, doubled per retry before jitter
+DEFAULT_MAX_DELAY = 60.0
+INTERACTIVE, BATCH = 0, 1  # lower value is admitted first
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+IMAGE_TOKENS = 258  # Gemini's token count for an image part
+CHARS_PER_TOKEN = 4
+
+
+def is_retryable(error):
+    """Quota and transient server errors from google.api_core (which carry an HTTP `code`)."""
+    return getattr(error, "code", None) in RETRYABLE_CODES or isinstance(error, ConnectionError)
+
+
+def estimate_tokens(contents):
+    """Rough input token count for a prompt string or list of text/image parts."""
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    tokens = 0
+    for part in parts:
+        tokens += len(part) // CHARS_PER_TOKEN + 1 if isinstance(part, str) else IMAGE_TOKENS
+    return tokens
+
+
+class TokenBucket:
+    """Refills at `per_minute` units per minute up to `capacity`; the level may go negative after a debit."""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._last) * self.rate)
+        self._last = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount):
+        self._refill()
+        self.level -= amount
+
+    def drain(self):
+        self._refill()
+        self.level = min(self.level, 0.0)
+
+
+class RateLimitScheduler:
+    """Thread-safe; one instance should be shared by every caller using the same API key."""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_retries=DEFAULT_MAX_RETRIES,
+                 base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY, burst=None):
+        # `burst` caps how many requests may go out back to back (default: a full minute's budget)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._requests = TokenBucket(rpm, capacity=burst)
+        self._tokens = TokenBucket(tpm)
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (priority, sequence) tickets
+        self._sequence = itertools.count()
+        self._waits = collections.deque(maxlen=1000)
+        self._counters = collections.Counter()
+        self._max_depth = 0
+        self._in_flight = 0
+
+    # ----- admission -----
+    def _acquire(self, priority, tokens):
+        start = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            self._max_depth = max(self._max_depth, len(self._waiting))
+            self._cond.notify_all()  # a new head may have arrived
+            while True:
+                if self._waiting[0] == ticket:
+                    wait = max(self._requests.wait_time(1), self._tokens.wait_time(tokens))
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._requests.take(1)
+            self._tokens.take(tokens)
+            self._in_flight += 1
+            self._waits.append(time.monotonic() - start)
+            self._cond.notify_all()
+
+    def _release(self, tokens_used=0):
+        with self._cond:
+            self._in_flight -= 1
+            if tokens_used:
+                self._tokens.take(tokens_used)
+
+    def _count(self, name):
+        with self._cond:
+            self._counters[name] += 1
+
+    # ----- calls -----
+    def backoff(self, attempt):
+        """Full jitter: uniform in [0, min(max_delay, base_delay * 2**attempt)]."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn, priority=BATCH, tokens=1, usage=None):
+        """
+        Runs `fn()` once it is admitted, retrying retryable errors up to
+        `max_retries` times. `usage(result)` may return the actual token count
+        so the TPM bucket is charged the difference from the estimate.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._acquire(priority, tokens)
+            tokens_used = 0
+            try:
+                result = fn()
+                if usage:
+                    tokens_used = max(0, (usage(result) or tokens) - tokens)
+                self._count("completed")
+                return result
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    self._count("failed")
+                    raise
+                if getattr(e, "code", None) == 429:
+                    self._count("throttled")
+                    with self._cond:
+                        self._requests.drain()  # slow every caller down, not just this one
+                self._count("retries")
+            finally:
+                self._release(tokens_used)
+            time.sleep(self.backoff(attempt))
+
+    def wrap(self, model, priority=BATCH):
+        return ScheduledModel(model, self, priority)
+
+    # ----- metrics -----
+    def metrics(self):
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                "queue_depth": len(self._waiting),
+                "max_queue_depth": self._max_depth,
+                "in_flight": self._in_flight,
+                "completed": self._counters["completed"],
+                "failed": self._counters["failed"],
+                "retries": self._counters["retries"],
+                "throttled": self._counters["throttled"],
+                "wait_mean": sum(waits) / len(waits) if waits else 0.0,
+                "wait_p95": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                "wait_max": waits[-1] if waits else 0.0,
+            }
+
+
+def _total_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None)
+
+
+class ScheduledModel:
+    """`genai.GenerativeModel` stand-in whose calls go through a RateLimitScheduler."""
+
+    def __init__(self, model, scheduler, priority=BATCH):
+        self.model = model
+        self.model_name = model.model_name
+        self.scheduler = scheduler
+        self.priority = priority
+
+    def generate_content(self, contents, **kwargs):
+        # Streamed responses only report usage once consumed, so they are charged the estimate.
+        usage = None if kwargs.get("stream") else _total_tokens
+        return self.scheduler.call(lambda: self.model.generate_content(contents, **kwargs),
+                                   priority=self.priority, tokens=estimate_tokens(contents), usage=usage)
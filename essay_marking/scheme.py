@@ -0,0 +1,107 @@
+import os
+import re
+
+import fitz  # PyMuPDF
+from markdownify import markdownify as md
+
+from essay_marking.questions import question_id
+from essay_marking.tracing import stage, timed
+
+
+# PyMuPDF's default HTML output inlines every image as a base64 <img>; leave them out
+HTML_FLAGS_NO_IMAGES = fitz.TEXTFLAGS_HTML & ~fitz.TEXT_PRESERVE_IMAGES
+
+
+# ===== PDF TO MARKDOWN CONVERSION =====
+def convert_pdf_to_markdown_html(pdf_path, md_path):
+    """Original whole-document conversion, kept as the benchmark baseline."""
+    html_text = ""
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            html_text += page.get_text("html")
+    markdown = md(html_text)
+    with open(md_path, 'w', encoding='utf-8') as f:
+        f.write(markdown)
+    return markdown
+
+
+def _save_page_images(doc, page, image_dir, md_dir):
+    refs = []
+    for image in page.get_images(full=True):
+        xref = image[0]
+        extracted = doc.extract_image(xref)
+        if not extracted:
+            continue
+        os.makedirs(image_dir, exist_ok=True)
+        path = os.path.join(image_dir, f"page{page.number + 1}_img{xref}.{extracted['ext']}")
+        with open(path, "wb") as f:
+            f.write(extracted["image"])
+        refs.append(f"![]({os.path.relpath(path, md_dir).replace(os.sep, '/')})\n\n")
+    return refs
+
+
+def iter_pdf_markdown_pages(pdf_path, image_dir=None, md_dir="."):
+    """
+    Yields the markdown of one page at a time. Image payloads are never put
+    into the HTML; with `image_dir` they are written there as files and
+    referenced by relative path at the end of their page instead.
+    """
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            with stage("pdf_to_html"):
+                html = page.get_text("html", flags=HTML_FLAGS_NO_IMAGES)
+            with stage("markdownify"):
+                page_md = md(html)
+            if image_dir:
+                page_md += "".join(_save_page_images(doc, page, image_dir, md_dir))
+            yield page_md
+
+
+def convert_pdf_to_markdown_streaming(pdf_path, md_path, image_dir=None):
+    """
+    Page-by-page replacement for convert_pdf_to_markdown_html: only one page's
+    HTML is alive at a time and markdown is written to `md_path` as it is
+    produced. Returns the full (image-free) markdown.
+    """
+    pages = []
+    md_dir = os.path.dirname(os.path.abspath(md_path))
+    with open(md_path, "w", encoding="utf-8") as f:
+        for page_md in iter_pdf_markdown_pages(pdf_path, image_dir=image_dir, md_dir=md_dir):
+            # markdownify strips the blank line that separated pages in the joined HTML
+            if pages:
+                f.write("\n\n")
+            f.write(page_md)
+            pages.append(page_md)
+    return "\n\n".join(pages)
+
+
+# ===== CLEANING AND SPLITTING =====
+@timed()
+def remove_gibberish(text):
+    lines = text.splitlines()
+    cleaned = [
+        line for line in lines
+        if not re.fullmatch(r"[A-Za-z0-9+/=]{30,}", line.strip())
+    ]
+    return "\n".join(cleaned)
+
+
+def split_questions(markdown):
+    """Splits marking scheme markdown on "Q<n>." markers into {"Q<n>": text}."""
+    cleaned_content = remove_gibberish(markdown)
+    questions = re.split(r"\bQ(\d{1,2})\.\s*", cleaned_content, flags=re.IGNORECASE)
+    result = {}
+    for i in range(1, len(questions), 2):
+        result[question_id(questions[i])] = questions[i + 1].strip()
+    return result
+
+
+def split_questions_to_folder(markdown_path, output_folder):
+    with open(markdown_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+    for q_num, q_text in split_questions(content).items():
+        file_name = os.path.join(output_folder, f"{q_num}.md")
+        with open(file_name, "w", encoding="utf-8") as f:
+            f.write(f"### {q_num}\n\n{q_text}")
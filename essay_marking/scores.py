@@ -0,0 +1,101 @@
+"""
+Flat SQLite store of structured scores, one row per marking point, so
+cohort statistics are a single GROUP BY instead of re-parsing reports.
+"""
+import csv
+import sqlite3
+import threading
+import time
+
+from essay_marking.jobstore import BUSY_TIMEOUT_MS
+from essay_marking.questions import question_sort_key
+
+
+# ===== CONFIGURATION =====
+COLUMNS = ("reg_number", "question", "point_index", "point", "allocated", "verdict", "awarded", "comment", "scored_at")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    reg_number TEXT NOT NULL,
+    question TEXT NOT NULL,
+    point_index INTEGER NOT NULL,
+    point TEXT,
+    allocated REAL NOT NULL,
+    verdict TEXT NOT NULL,
+    awarded REAL NOT NULL,
+    comment TEXT,
+    scored_at REAL NOT NULL,
+    PRIMARY KEY (reg_number, question, point_index)
+);
+CREATE INDEX IF NOT EXISTS scores_question ON scores (question);
+"""
+
+
+class ScoreStore:
+    """Thread-safe store of parsed scores (see essay_marking.scoring.parse_evaluation)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # Shares its file with the JobStore that worker processes write to, so wait out their locks the same way
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def save_student(self, reg_number, scores):
+        """
+        Replaces everything stored for one student with `scores`
+        ({question: score}) in one transaction, so a re-marking in another
+        mode ("ALL" versus per question) or with fewer attempted questions
+        leaves no stale rows behind.
+        """
+        now = time.time()
+        rows = [
+            (reg_number, question, i, p["point"], p["allocated"], p["verdict"], p["awarded"], p["comment"], now)
+            for question, score in scores.items()
+            for i, p in enumerate(score["points"])
+        ]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM scores WHERE reg_number = ?", (reg_number,))
+            self._conn.executemany(f"INSERT INTO scores VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def student_totals(self):
+        """[{reg_number, questions, allocated, awarded, percent}] ordered by reg number."""
+        return self._query("""
+            SELECT reg_number, COUNT(DISTINCT question) AS questions,
+                   SUM(allocated) AS allocated, SUM(awarded) AS awarded,
+                   ROUND(100.0 * SUM(awarded) / NULLIF(SUM(allocated), 0), 1) AS percent
+            FROM scores GROUP BY reg_number ORDER BY reg_number
+        """)
+
+    def question_summary(self):
+        """Per-question cohort statistics over the per-student question totals."""
+        rows = self._query("""
+            SELECT question, COUNT(*) AS students, MAX(allocated) AS allocated,
+                   ROUND(AVG(awarded), 2) AS mean_awarded, MIN(awarded) AS min_awarded,
+                   MAX(awarded) AS max_awarded,
+                   ROUND(100.0 * SUM(awarded) / NULLIF(SUM(allocated), 0), 1) AS percent
+            FROM (SELECT reg_number, question, SUM(allocated) AS allocated, SUM(awarded) AS awarded
+                  FROM scores GROUP BY reg_number, question)
+            GROUP BY question
+        """)
+        return sorted(rows, key=lambda row: question_sort_key(row["question"]))
+
+    def export_csv(self, csv_path):
+        """Writes every stored point to `csv_path`; returns the number of rows."""
+        rows = self._query(f"SELECT {', '.join(COLUMNS)} FROM scores ORDER BY reg_number, question, point_index")
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,183 @@
+"""
+Structured scoring: the model returns JSON that follows SCORE_SCHEMA, and
+the marks are validated and totalled locally instead of being read off a
+markdown report.
+"""
+import json
+
+from essay_marking.tracing import count_usage, stage
+
+
+# ===== CONFIGURATION =====
+PROMPT_VERSION = 1  # bump when build_structured_prompt changes, so cached scores are not reused
+DEFAULT_RETRIES = 2  # extra attempts when the model returns malformed JSON
+VERDICTS = ("full", "partial", "none")
+VERDICT_ICONS = {"full": "✅", "partial": "⚠️", "none": "❌"}
+
+# Gemini response_schema (OpenAPI subset) for one evaluation
+SCORE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "points": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "point": {"type": "STRING"},
+                    "allocated": {"type": "NUMBER"},
+                    "verdict": {"type": "STRING", "enum": list(VERDICTS)},
+                    "awarded": {"type": "NUMBER"},
+                    "comment": {"type": "STRING"},
+                },
+                "required": ["point", "allocated", "verdict", "awarded", "comment"],
+            },
+        },
+        "total_allocated": {"type": "NUMBER"},
+        "total_awarded": {"type": "NUMBER"},
+    },
+    "required": ["points", "total_allocated", "total_awarded"],
+}
+GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": SCORE_SCHEMA}
+
+
+class MalformedEvaluation(ValueError):
+    """The model's reply is not valid JSON or does not follow SCORE_SCHEMA."""
+
+
+# ===== STRUCTURED PROMPT =====
+def build_structured_prompt(marking_md, student_md):
+    return f"""
+        You are an academic evaluator. Below are two sections:
+        1. **Marking Scheme** – contains expected answer points for an essay, each followed by the mark allocation (e.g., [4 Marks]).
+        2. **Student Answer** – the student's response to the same question.
+
+        Evaluate the student’s response against **each marking point**, using the mark allocation provided.
+        For each point, set "verdict" to:
+
+        - "full" – fully covered, award **full marks**
+        - "partial" – partially covered, award **half marks**
+        - "none" – not covered, award **zero marks**
+
+        Reply with JSON only, in this shape:
+
+        {{
+          "points": [
+            {{"point": "<copied from marking scheme>", "allocated": X, "verdict": "full" | "partial" | "none",
+              "awarded": X | X/2 | 0, "comment": "<why it was awarded that way>"}}
+          ],
+          "total_allocated": XX,
+          "total_awarded": XX
+        }}
+
+        Include every point mentioned in the marking scheme.
+
+        ---
+
+        ### 📚 Marking Scheme:
+        {marking_md}
+
+        ---
+
+        ### ✍️ Student Answer:
+        {student_md}
+        """
+
+
+# ===== VALIDATION =====
+def expected_award(allocated, verdict):
+    return {"full": allocated, "partial": allocated / 2, "none": 0}[verdict]
+
+
+def _number(value, field, index):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise MalformedEvaluation(f"points[{index}].{field} must be a non-negative number, got {value!r}")
+    return float(value)
+
+
+def parse_evaluation(text):
+    """
+    Parses and validates one structured evaluation. The per-point awards
+    must agree with the verdict; totals are recomputed from the points
+    rather than trusted. Raises MalformedEvaluation otherwise.
+    """
+    try:
+        data = json.loads(text)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise MalformedEvaluation(f"Response is not JSON: {e}") from e
+    if not isinstance(data, dict) or not isinstance(data.get("points"), list) or not data["points"]:
+        raise MalformedEvaluation("Response has no 'points' list")
+
+    points = []
+    for i, item in enumerate(data["points"]):
+        if not isinstance(item, dict):
+            raise MalformedEvaluation(f"points[{i}] is not an object")
+        verdict = str(item.get("verdict", "")).strip().lower()
+        if verdict not in VERDICTS:
+            raise MalformedEvaluation(f"points[{i}].verdict must be one of {VERDICTS}, got {item.get('verdict')!r}")
+        allocated = _number(item.get("allocated"), "allocated", i)
+        awarded = _number(item.get("awarded"), "awarded", i)
+        if abs(awarded - expected_award(allocated, verdict)) > 1e-6:
+            raise MalformedEvaluation(
+                f"points[{i}] awards {awarded:g} of {allocated:g} marks, inconsistent with verdict '{verdict}'"
+            )
+        points.append({
+            "point": str(item.get("point", "")).strip(),
+            "allocated": allocated,
+            "verdict": verdict,
+            "awarded": awarded,
+            "comment": str(item.get("comment", "")).strip(),
+        })
+
+    return {
+        "points": points,
+        "total_allocated": sum(p["allocated"] for p in points),
+        "total_awarded": sum(p["awarded"] for p in points),
+        "counts": {verdict: sum(p["verdict"] == verdict for p in points) for verdict in VERDICTS},
+    }
+
+
+# ===== EVALUATION (NO UI) =====
+def score_answer(model, prompt, timeout=None, retries=DEFAULT_RETRIES):
+    """
+    Requests a structured evaluation and validates it, asking again up to
+    `retries` times when the reply is malformed. Network errors are raised
+    straight away; the last MalformedEvaluation is raised if every attempt fails.
+    """
+    request_options = {"timeout": timeout} if timeout else None
+    for attempt in range(retries + 1):
+        with stage("gemini_score"):
+            response = model.generate_content(prompt, generation_config=GENERATION_CONFIG,
+                                              request_options=request_options)
+            text = response.text
+        count_usage(response)
+        try:
+            return parse_evaluation(text)
+        except MalformedEvaluation:
+            if attempt == retries:
+                raise
+
+
+# ===== RENDERING =====
+def render_score_markdown(score):
+    """Renders a parsed score in the same layout as the markdown evaluation report."""
+    lines = []
+    for p in score["points"]:
+        lines += [
+            f"**Point**: *{p['point']}*",
+            f"- **Allocated**: [{p['allocated']:g} Marks]",
+            f"- **Evaluation**: {VERDICT_ICONS[p['verdict']]}",
+            f"- **Awarded**: {p['awarded']:g}",
+            f"- **Comment**: {p['comment']}",
+            "",
+        ]
+    counts = score["counts"]
+    lines += [
+        "### 📊 Final Summary:",
+        "",
+        f"- Total Allocated: {score['total_allocated']:g} Marks",
+        f"- ✅ Full Marks Awarded: {counts['full']}",
+        f"- ⚠️ Half Marks Awarded: {counts['partial']}",
+        f"- ❌ Zero Marks: {counts['none']}",
+        f"- **Total Awarded**: {score['total_awarded']:g} Marks",
+    ]
+    return "\n".join(lines)
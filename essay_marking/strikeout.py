@@ -0,0 +1,221 @@
+"""
+Local detection of crossed-out handwriting, masked before transcription.
+
+Students cut words with a line through their middle, cancel paragraphs
+with a long diagonal stroke and black out mistakes with scribbles. Finding
+those regions here and painting them over with the paper colour means
+Gemini mostly never sees the deleted text, so the transcription prompt
+shrinks to one sentence about it, and blanked regions make the JPEG
+smaller.
+
+Everything runs on a deskewed grayscale copy whose long edge is at most
+WORK_EDGE, with sizes measured in character heights
+(trocr.clean_components):
+
+- rule: flat runs of ink that together cross RULE_SPAN of the page
+  (ruled paper, answer-box borders).
+- strike: a straight, near-horizontal line at least STRIKE_MIN_LENGTH
+  characters long with writing just above *and* just below it along
+  STRIKE_COVER of its length. An underline has writing only above it,
+  and segments lying on a rule are the rule.
+- cancel: a straight stroke at CANCEL_ANGLES degrees, at least
+  CANCEL_MIN_LENGTH characters long.
+- scribble: a blob where ink covers at least SCRIBBLE_DENSITY of every
+  character-sized window.
+
+Pages whose long edge is below MIN_EDGE, or whose writing is under
+MIN_CHAR_HEIGHT pixels tall, are left alone: at that size pen strokes are
+a few pixels wide and the bars of letters like t, f and H look like
+strikes.
+
+    image, strikes = mask_strikeouts(original)
+    preview = outline_strikeouts(original, strikes)
+
+    python -m essay_marking.benchmarks.strikeout
+"""
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+from essay_marking.preprocess import SKEW_STEP, estimate_skew
+from essay_marking.trocr import clean_components, ink_mask, remove_rules
+
+
+# ===== CONFIGURATION =====
+WORK_EDGE = 1200
+MIN_EDGE = 1000  # smaller pages (e.g. a 492x671 phone upload) are not searched
+MIN_CHAR_HEIGHT = 16  # pixels, measured on the working copy
+RULE_SPAN = 0.4  # fraction of the page width
+RULE_RUN = 40  # shortest flat run counted towards a rule, as a fraction 1/RULE_RUN of the width
+RULE_BAND = 7  # rows a slightly wavy rule may wander over
+RULE_WIDTH = 3  # pixels erased around a rule before looking for writing around strikes
+STRIKE_MIN_LENGTH = 2.0  # character heights
+STRIKE_MAX_SLOPE = 0.3
+STRIKE_REACH = 0.4  # how far above/below a strike writing is looked for, in character heights
+STRIKE_COVER = 0.2
+CANCEL_MIN_LENGTH = 5.0  # character heights
+CANCEL_ANGLES = (20, 70)
+SCRIBBLE_DENSITY = 0.7
+SCRIBBLE_MIN_AREA = 1.0  # square character heights
+MASK_PADDING = 0.3  # character heights added around each masked region
+
+
+@dataclass
+class Strike:
+    kind: str  # "strike", "cancel" or "scribble"
+    box: tuple  # (x0, y0, x1, y1) in the caller's image coordinates
+
+
+def _segments(ink, min_length, max_gap):
+    lines = cv2.HoughLinesP(ink, 1, np.pi / 180, threshold=max(1, int(0.6 * min_length)),
+                            minLineLength=int(min_length), maxLineGap=max(2, int(max_gap)))
+    return lines.reshape(-1, 4).astype(int) if lines is not None else np.empty((0, 4), int)
+
+
+def _sample(x0, y0, x1, y1):
+    """Pixel columns of a segment and the row it passes through in each."""
+    if x1 < x0:
+        x0, y0, x1, y1 = x1, y1, x0, y0
+    xs = np.arange(x0, x1 + 1)
+    return xs, np.round(np.interp(xs, [x0, x1], [y0, y1])).astype(int)
+
+
+def find_rules(ink):
+    """
+    Ruled lines of a levelled page: (mask of their pixels, boolean per row).
+    Flat runs are kept where, within a RULE_BAND-row band, they add up to
+    RULE_SPAN of the page width.
+    """
+    w = ink.shape[1]
+    runs = cv2.morphologyEx(ink, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (max(10, w // RULE_RUN), 1)))
+    band = cv2.dilate(runs, np.ones((RULE_BAND, 1), np.uint8))
+    rows = np.count_nonzero(band, axis=1) >= RULE_SPAN * w
+    rules = runs.copy()
+    rules[~rows] = 0
+    return cv2.dilate(rules, np.ones((RULE_WIDTH, RULE_WIDTH), np.uint8)), rows
+
+
+def find_strikes(ink, writing, rule_rows, char_h):
+    """Near-horizontal segments of `ink` with `writing` (ink without rules) on both sides."""
+    h = ink.shape[0]
+    reach = max(4, int(STRIKE_REACH * char_h))
+    near_rule = cv2.dilate(rule_rows.astype(np.uint8), np.ones((max(3, int(0.2 * char_h)) | 1, 1), np.uint8)).ravel() > 0
+    boxes = []
+    for x0, y0, x1, y1 in _segments(ink, STRIKE_MIN_LENGTH * char_h, 0.1 * char_h):
+        if abs(y1 - y0) > STRIKE_MAX_SLOPE * abs(x1 - x0) or (near_rule[y0] and near_rule[y1]):
+            continue
+        xs, ys = _sample(x0, y0, x1, y1)
+        above = np.zeros(xs.size, bool)
+        below = np.zeros(xs.size, bool)
+        # Starting 3 px out skips the stroke itself
+        for d in range(3, reach):
+            above |= writing[np.clip(ys - d, 0, h - 1), xs] > 0
+            below |= writing[np.clip(ys + d, 0, h - 1), xs] > 0
+        if above.mean() >= STRIKE_COVER and below.mean() >= STRIKE_COVER:
+            boxes.append((min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)))
+    return boxes
+
+
+def find_cancels(writing, char_h):
+    boxes = []
+    for x0, y0, x1, y1 in _segments(writing, CANCEL_MIN_LENGTH * char_h, 0.25 * char_h):
+        angle = abs(np.degrees(np.arctan2(y1 - y0, x1 - x0))) % 180
+        if CANCEL_ANGLES[0] <= min(angle, 180 - angle) <= CANCEL_ANGLES[1]:
+            boxes.append((min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)))
+    return boxes
+
+
+def find_scribbles(gray, ink, rules, char_h):
+    """
+    Blobs of solid ink. The adaptive ink mask keeps only the edges of a
+    blacked-out area, so ink here is anything much darker than the paper
+    around it (a grayscale close wider than a line of writing).
+    """
+    h, w = gray.shape
+    size = max(3, int(char_h))
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * size + 1, 2 * size + 1))
+    dark = cv2.subtract(cv2.morphologyEx(gray, cv2.MORPH_CLOSE, kernel), gray)
+    # Half the contrast of a typical pen stroke
+    threshold = max(1, np.median(dark[ink > 0]) / 2)
+    solid = cv2.subtract(((dark >= threshold) * 255).astype(np.uint8), rules)
+    density = cv2.boxFilter(solid, cv2.CV_32F, (size, size), normalize=True) / 255
+    dense = (density >= SCRIBBLE_DENSITY).astype(np.uint8)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(dense, connectivity=8)
+    boxes = []
+    for x, y, bw, bh, area in stats[1:]:
+        # Blobs on the image border are the desk or shadow around the page
+        if area < SCRIBBLE_MIN_AREA * char_h ** 2 or x == 0 or y == 0 or x + bw == w or y + bh == h:
+            continue
+        # The window centre marks the blob, so grow it back by half a window
+        boxes.append((x - size // 2, y - size // 2, x + bw + size // 2, y + bh + size // 2))
+    return boxes
+
+
+def find_strikeouts(image):
+    """Crossed-out regions of a page (PIL image or array) as Strike records, in that image's coordinates."""
+    gray = np.asarray(image.convert("L")) if isinstance(image, Image.Image) else image
+    if gray.ndim == 3:
+        gray = cv2.cvtColor(gray, cv2.COLOR_RGB2GRAY)
+    height, width = gray.shape
+    if max(height, width) < MIN_EDGE:
+        return []
+    scale = min(1.0, WORK_EDGE / max(height, width))
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    # Level the page so rules and strikes are horizontal; boxes are mapped back afterwards
+    angle = estimate_skew(gray)
+    angle = angle if abs(angle) >= SKEW_STEP else 0.0
+    matrix = cv2.getRotationMatrix2D((gray.shape[1] / 2, gray.shape[0] / 2), angle, 1.0)
+    if angle:
+        gray = cv2.warpAffine(gray, matrix, gray.shape[::-1], flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    back = cv2.invertAffineTransform(matrix) / scale
+
+    ink = ink_mask(gray)
+    # Character height is measured without the rules, which would otherwise join into one huge component
+    _, char_h = clean_components(remove_rules(ink))
+    if not char_h or char_h < MIN_CHAR_HEIGHT:
+        return []
+    rules, rule_rows = find_rules(ink)
+    writing = cv2.subtract(ink, rules)
+
+    found = [("strike", box) for box in find_strikes(ink, writing, rule_rows, char_h)]
+    found += [("cancel", box) for box in find_cancels(writing, char_h)]
+    found += [("scribble", box) for box in find_scribbles(gray, ink, rules, char_h)]
+
+    pad = MASK_PADDING * char_h
+    strikes = []
+    for kind, (x0, y0, x1, y1) in found:
+        corners = np.array([[x0 - pad, y0 - pad, 1], [x1 + pad, y0 - pad, 1],
+                            [x0 - pad, y1 + pad, 1], [x1 + pad, y1 + pad, 1]]) @ back.T
+        (left, top), (right, bottom) = corners.min(axis=0), corners.max(axis=0)
+        strikes.append(Strike(kind, (max(0, int(left)), max(0, int(top)), min(width, int(right)), min(height, int(bottom)))))
+    return strikes
+
+
+def mask_strikeouts(image, strikes=None):
+    """(copy of the PIL image with crossed-out regions painted the paper colour, strikes found)."""
+    strikes = find_strikeouts(image) if strikes is None else strikes
+    if not strikes:
+        return image, strikes
+    pixels = np.array(image.convert("RGB"))
+    gray = cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+    # Paper colour: the median of the brighter half of the page
+    paper = np.median(pixels[gray >= np.median(gray)], axis=0).astype(np.uint8)
+    for strike in strikes:
+        x0, y0, x1, y1 = strike.box
+        pixels[y0:y1, x0:x1] = paper
+    return Image.fromarray(pixels), strikes
+
+
+def outline_strikeouts(image, strikes, colour=(220, 0, 0)):
+    """Copy of the PIL image with each strike's box outlined, so a marker can see what was masked."""
+    if not strikes:
+        return image
+    image = image.convert("RGB")  # also a copy
+    draw = ImageDraw.Draw(image)
+    width = max(2, round(max(image.size) / 500))
+    for strike in strikes:
+        draw.rectangle(strike.box, outline=colour, width=width)
+    return image
@@ -0,0 +1,55 @@
+import os
+import re
+
+from essay_marking.tracing import timed
+
+# Transcripts start with the header line "Reg Number: $ EG / 2020 / 3905"
+REG_NUMBER_PATTERN = re.compile(r"Reg\s*Number:\s*\$([^\n\r]+)", re.IGNORECASE)
+REG_FORMAT = re.compile(r"^EG/\d{4}/\d{4}$")
+# "EG", then two groups of four digit-like characters separated by / (or a misread 1, l, I, |)
+REG_CANDIDATE = re.compile(r"[Ee]\s*[GgC65]\s*[/1lI|]\s*([\dOoIlSBZ]{4})\s*[/1lI|]\s*([\dOoIlSBZ]{4})")
+DIGIT_FIXES = str.maketrans({"O": "0", "o": "0", "I": "1", "l": "1", "S": "5", "B": "8", "Z": "2"})
+
+
+def safe_name(reg_number):
+    """File-system safe form of a registration number (EG/2020/3905 -> EG_2020_3905)."""
+    return reg_number.replace("/", "_").replace("\\", "_")
+
+
+def normalize_reg_number(text):
+    """
+    Canonical "EG/NNNN/NNNN" from a transcript or OCR reading, repairing
+    spacing, stray symbols and common letter/digit confusions; None when
+    no registration number can be recovered.
+    """
+    if not text:
+        return None
+    match = REG_CANDIDATE.search(text)
+    if not match:
+        return None
+    reg_number = f"EG/{match.group(1).translate(DIGIT_FIXES)}/{match.group(2).translate(DIGIT_FIXES)}"
+    return reg_number if REG_FORMAT.match(reg_number) else None
+
+
+@timed("reg_match")
+def find_reg_number(transcript):
+    """
+    Returns (reg_number, safe_reg_number) from a transcript, or (None, None).
+    Numbers in the EG/NNNN/NNNN format are canonicalised so stray symbols
+    ("EG/2020/3905$") do not create a second file for the same student.
+    """
+    match = REG_NUMBER_PATTERN.search(transcript)
+    if not match:
+        reg_number = normalize_reg_number(transcript)
+        return (reg_number, safe_name(reg_number)) if reg_number else (None, None)
+    reg_number = normalize_reg_number(match.group(1)) or match.group(1).replace(" ", "")
+    return reg_number, safe_name(reg_number)
+
+
+def save_transcript(folder, safe_reg_number, transcript):
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    md_path = os.path.join(folder, f"{safe_reg_number}.md")
+    with open(md_path, "w", encoding="utf-8") as f:
+        f.write(transcript)
+    return md_path
@@ -0,0 +1,221 @@
+"""
+Synthetic registration-number crops for TrOCR fine-tuning.
+
+Renders "EG / NNNN / NNNN" strings with varied fonts, sizes and spacing,
+then adds per-column stroke jitter, rotation/shear, ruled paper, blur,
+sensor noise and (sometimes) the blur + adaptive threshold of
+app2.preprocess_image. Samples are written by worker processes straight
+into the tensor cache used by Reg_Ditection/train.py (see trocr_dataset),
+as grayscale uint8 shards that the cache reader normalises on load.
+
+Every shard has its own seed derived from --seed, so the output does not
+depend on the number of workers.
+
+    python -m essay_marking.synth_reg --count 100000 --fonts fonts/ \\
+        --out test_models/Reg_Ditection/custom_data/.tensor_cache
+"""
+import argparse
+import glob
+import hashlib
+import os
+import time
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from essay_marking.trocr_dataset import (DEFAULT_MAX_LENGTH, SHARD_SIZE, load_index, save_index,
+                                         processor_fingerprint)
+
+
+# ===== CONFIGURATION =====
+GENERATOR_VERSION = 1  # bump when the rendering changes so old shards are not reused
+IMAGE_SIZE = 384  # TrOCR input size; crops are resized straight to it like the processor does
+CANVAS_HEIGHT = 72
+FONT_SIZES = (30, 34, 38, 42, 46)
+FONT_EXTENSIONS = (".ttf", ".otf")
+INK_COLOURS = (10, 40, 70, 100)  # grey levels of pen strokes
+SEPARATORS = ("/", " / ", "/ ", " /", "  /  ")
+
+
+def find_fonts(folder):
+    """Font files under `folder` (handwriting fonts give the most realistic samples)."""
+    if not folder:
+        return []
+    return sorted(p for p in glob.glob(os.path.join(folder, "**", "*"), recursive=True)
+                  if p.lower().endswith(FONT_EXTENSIONS))
+
+
+def random_reg_number(rng):
+    """(label, rendered text): the label uses the labels.csv spelling, the rendering varies the spacing."""
+    first, second = (f"{n:04d}" for n in rng.integers(0, 10000, size=2))
+    label = f"EG / {first} / {second}"
+    separator = SEPARATORS[rng.integers(len(SEPARATORS))]
+    return label, f"EG{separator}{first}{separator}{second}"
+
+
+# ===== RENDERING =====
+class Renderer:
+    """Renders samples with a per-process font cache; all randomness comes from the passed generator."""
+
+    def __init__(self, font_paths):
+        self.font_paths = list(font_paths) or [None]  # None: Pillow's built-in font
+        self._fonts = {}
+
+    def font(self, path, size):
+        if (path, size) not in self._fonts:
+            self._fonts[path, size] = ImageFont.truetype(path, size) if path else ImageFont.load_default(size)
+        return self._fonts[path, size]
+
+    def render(self, rng, text):
+        font = self.font(self.font_paths[rng.integers(len(self.font_paths))],
+                         FONT_SIZES[rng.integers(len(FONT_SIZES))])
+        width = int(font.getlength(text)) + 40
+        canvas = Image.new("L", (width, CANVAS_HEIGHT), 0)
+        ImageDraw.Draw(canvas).text((20, CANVAS_HEIGHT // 2), text, fill=255, font=font, anchor="lm",
+                                    stroke_width=int(rng.integers(0, 2)), stroke_fill=255)
+        ink = np.asarray(canvas, dtype=np.float32) / 255
+
+        # Stroke jitter: smooth random vertical displacement along the line
+        knots = rng.normal(0, 1.5, size=max(2, width // 40))
+        shift = np.interp(np.arange(width), np.linspace(0, width - 1, knots.size), knots).astype(np.float32)
+        map_x = np.tile(np.arange(width, dtype=np.float32), (CANVAS_HEIGHT, 1))
+        map_y = np.arange(CANVAS_HEIGHT, dtype=np.float32)[:, None] + shift[None, :]
+        ink = cv2.remap(ink, map_x, map_y, cv2.INTER_LINEAR, borderValue=0)
+
+        # Rotation and shear
+        angle, shear = rng.uniform(-4, 4), rng.uniform(-0.25, 0.25)
+        matrix = cv2.getRotationMatrix2D((width / 2, CANVAS_HEIGHT / 2), angle, 1.0)
+        matrix[0, 1] += shear
+        matrix[0, 2] -= shear * CANVAS_HEIGHT / 2
+        ink = cv2.warpAffine(ink, matrix, (width, CANVAS_HEIGHT), flags=cv2.INTER_LINEAR, borderValue=0)
+
+        # Paper: background level, optional ruled lines, pen colour
+        paper = np.full_like(ink, rng.uniform(200, 250))
+        if rng.random() < 0.6:
+            spacing = int(rng.integers(28, 48))
+            for y in range(int(rng.integers(0, spacing)), CANVAS_HEIGHT, spacing):
+                paper[y:y + 2] -= rng.uniform(20, 60)
+        image = paper * (1 - ink) + INK_COLOURS[rng.integers(len(INK_COLOURS))] * ink
+
+        image = cv2.GaussianBlur(image, (0, 0), rng.uniform(0.3, 1.6))
+        image += rng.normal(0, rng.uniform(2, 10), size=image.shape).astype(np.float32)
+        image = np.clip(image, 0, 255).astype(np.uint8)
+        if rng.random() < 0.3:
+            # Same binarisation as app2.preprocess_image
+            image = cv2.adaptiveThreshold(cv2.GaussianBlur(image, (5, 5), 0), 255, cv2.ADAPTIVE_THRESH_MEAN_C,
+                                          cv2.THRESH_BINARY, 11, 12)
+        return cv2.resize(image, (IMAGE_SIZE, IMAGE_SIZE), interpolation=cv2.INTER_LINEAR)
+
+
+def generate_samples(count, seed, font_paths=()):
+    """[(label, uint8 image)] for one seed; handy for previews and tests."""
+    rng = np.random.default_rng(seed)
+    renderer = Renderer(font_paths)
+    samples = []
+    for _ in range(count):
+        label, text = random_reg_number(rng)
+        samples.append((label, renderer.render(rng, text)))
+    return samples
+
+
+# ===== SHARD WRITING =====
+_renderer = None
+_tokenizer = None
+
+
+def _init_worker(font_paths, processor_source):
+    global _renderer, _tokenizer
+    from transformers import AutoTokenizer
+
+    _renderer = Renderer(font_paths)
+    _tokenizer = AutoTokenizer.from_pretrained(processor_source)
+
+
+def _write_shard(job):
+    cache_dir, name, seed, count, max_length = job
+    rng = np.random.default_rng(seed)
+    pixels = np.lib.format.open_memmap(os.path.join(cache_dir, f"{name}.pixels.npy"), mode="w+",
+                                       dtype=np.uint8, shape=(count, IMAGE_SIZE, IMAGE_SIZE))
+    labels = []
+    for i in range(count):
+        label, text = random_reg_number(rng)
+        pixels[i] = _renderer.render(rng, text)
+        labels.append(label)
+    label_ids = _tokenizer(labels, padding="max_length", truncation=True, max_length=max_length).input_ids
+    np.save(os.path.join(cache_dir, f"{name}.labels.npy"), np.asarray(label_ids, dtype=np.int32))
+    pixels.flush()
+    return name, count
+
+
+def build_synthetic_shards(count, processor_source, cache_root, font_paths=(), seed=0, workers=None,
+                           shard_size=SHARD_SIZE, max_length=DEFAULT_MAX_LENGTH):
+    """
+    Writes `count` synthetic samples into the tensor cache for `processor_source`
+    and returns an index ({"dir", "rows"}) that can be appended to the one from
+    build_tensor_cache. Shards already generated with the same settings are reused.
+    """
+    from transformers import TrOCRProcessor
+
+    processor = TrOCRProcessor.from_pretrained(processor_source)
+    config = processor.image_processor
+    if list(config.image_mean) != [0.5] * 3 or list(config.image_std) != [0.5] * 3:
+        raise ValueError("Synthetic uint8 shards assume TrOCR's 0.5/0.5 pixel normalisation")
+    cache_dir = os.path.join(cache_root, processor_fingerprint(processor, max_length))
+    os.makedirs(cache_dir, exist_ok=True)
+    index = load_index(cache_dir)
+
+    settings = f"{GENERATOR_VERSION}:{seed}:{shard_size}:{sorted(os.path.basename(p) for p in font_paths)}"
+    prefix = f"synth-{hashlib.sha256(settings.encode('utf-8')).hexdigest()[:8]}"
+    seeds = np.random.SeedSequence(seed).spawn((count + shard_size - 1) // shard_size)
+    jobs = []
+    for n, shard_seed in enumerate(seeds):
+        name = f"{prefix}-{n:05d}"
+        size = min(shard_size, count - n * shard_size)
+        if index["shards"].get(name) != size:
+            jobs.append((cache_dir, name, shard_seed, size, max_length))
+
+    if jobs:
+        start = time.perf_counter()
+        with Pool(min(workers or os.cpu_count() or 1, len(jobs)), initializer=_init_worker,
+                  initargs=(list(font_paths), processor_source)) as pool:
+            for name, size in pool.imap_unordered(_write_shard, jobs):
+                index["shards"][name] = size
+                for row in range(size):
+                    index["rows"][f"{name}:{row}"] = [name, row]
+        generated = sum(job[3] for job in jobs)
+        rate = generated / (time.perf_counter() - start)
+        print(f"✅ {generated} synthetic samples in {len(jobs)} shards ({rate * 3600:,.0f} samples/hour)")
+        save_index(cache_dir, index)
+
+    rows = [[f"{prefix}-{n:05d}", row]
+            for n in range(len(seeds)) for row in range(min(shard_size, count - n * shard_size))]
+    return {"dir": cache_dir, "rows": rows}
+
+
+# ===== CLI =====
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--out", required=True, help="Tensor cache root (TENSOR_CACHE_DIR in train.py)")
+    parser.add_argument("--processor", default="microsoft/trocr-base-handwritten")
+    parser.add_argument("--fonts", help="Folder of .ttf/.otf fonts (default: Pillow's built-in font)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--preview", help="Also write 16 samples as PNG files to this folder")
+    args = parser.parse_args()
+
+    font_paths = find_fonts(args.fonts)
+    print(f"🖋️ {len(font_paths) or 'built-in'} font(s)")
+    if args.preview:
+        os.makedirs(args.preview, exist_ok=True)
+        for i, (label, image) in enumerate(generate_samples(16, args.seed, font_paths)):
+            Image.fromarray(image).save(os.path.join(args.preview, f"{i:02d}_{label.replace(' / ', '_')}.png"))
+    build_synthetic_shards(args.count, args.processor, args.out, font_paths, seed=args.seed,
+                           workers=args.workers, shard_size=args.shard_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+Per-stage latency instrumentation for the marking pipeline.
+
+Stages are timed with `stage(name)` or `@timed(name)`, and `count(name, n)`
+adds to counters such as tokens or payload bytes. Inside `trace(kind,
+**attrs)` they are collected for that unit of work (one script, page or
+evaluation) and written as one JSON line to the file set with `configure`
+when it ends. Worker threads started by essay_marking.batch.run_batch
+report into the trace of the thread that started the batch. Stages may
+nest or overlap across threads, so they do not add up to a trace's
+elapsed time.
+
+Every stage and counter is also added to a process-wide `summary()`.
+`summarize_file` aggregates the latest traces other processes (the
+background workers, the CLI) have written, reading only the end of the
+file, for the Streamlit panel or the command line. A trace file past
+MAX_TRACE_BYTES is moved aside to "<file>.1" (replacing the previous one)
+and a new one started:
+
+    configure(os.path.join(".cache", "traces.jsonl"))
+    with trace("transcribe", source=path):
+        with stage("image_encode"):
+            ...
+        count("payload_bytes", len(image_bytes))
+
+    with profile("run.prof"):  # cProfile; "run.html" uses pyinstrument
+        ...
+
+    python -m essay_marking.tracing .cache/traces.jsonl
+"""
+import argparse
+import collections
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+
+
+# ===== CONFIGURATION =====
+RECENT = 500  # durations kept per stage for the process-wide percentiles
+SUMMARY_TRACES = 1000  # latest traces read by summarize_file
+MAX_TRACE_BYTES = 20 * 1024 * 1024  # trace file size at which it is rotated
+TAIL_BLOCK = 64 * 1024  # bytes read at a time from the end of a trace file
+
+_current = contextvars.ContextVar("essay_marking_trace", default=None)
+_trace_file = None
+_write_lock = threading.Lock()
+
+
+def configure(trace_file):
+    """Sets the JSONL file traces are appended to; None keeps them in memory (summary() only)."""
+    global _trace_file
+    if trace_file:
+        folder = os.path.dirname(os.path.abspath(trace_file))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+    _trace_file = trace_file
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# ===== TRACES =====
+class Trace:
+    """Stage timings and counters of one unit of work; safe to add to from several threads."""
+
+    def __init__(self, kind, attrs):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.attrs = attrs
+        self.started = time.time()
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, seconds):
+        with self._lock:
+            entry = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "max": 0.0})
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+
+    def add_count(self, name, value):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self, elapsed, error=None):
+        with self._lock:
+            return {"id": self.id, "kind": self.kind, "started": self.started, "elapsed": elapsed,
+                    "error": error, "attrs": self.attrs, "stages": dict(self.stages), "counters": dict(self.counters)}
+
+
+class Summary:
+    """Process-wide stage durations (the last RECENT per stage) and counter totals."""
+
+    def __init__(self):
+        self._stages = {}
+        self._counters = collections.Counter()
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, seconds):
+        with self._lock:
+            entry = self._stages.setdefault(name, {"calls": 0, "seconds": 0.0,
+                                                   "recent": collections.deque(maxlen=RECENT)})
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["recent"].append(seconds)
+
+    def add_count(self, name, value):
+        with self._lock:
+            self._counters[name] += value
+
+    def snapshot(self):
+        with self._lock:
+            stages = [{"stage": name, "calls": e["calls"], "seconds": e["seconds"],
+                       "p50": _percentile(e["recent"], 0.5), "p95": _percentile(e["recent"], 0.95)}
+                      for name, e in self._stages.items()]
+            return {"stages": sorted(stages, key=lambda s: -s["seconds"]), "counters": dict(self._counters)}
+
+
+_summary = Summary()
+
+
+def summary():
+    return _summary.snapshot()
+
+
+def record_stage(name, seconds):
+    """Adds a duration measured by the caller, e.g. around a stream that is consumed elsewhere."""
+    _summary.add_stage(name, seconds)
+    current = _current.get()
+    if current is not None:
+        current.add_stage(name, seconds)
+
+
+def count(name, value=1):
+    _summary.add_count(name, value)
+    current = _current.get()
+    if current is not None:
+        current.add_count(name, value)
+
+
+def count_usage(response):
+    """Token counters from a Gemini response's usage metadata, where it has any."""
+    usage = getattr(response, "usage_metadata", None)
+    for name, field in (("prompt_tokens", "prompt_token_count"), ("cached_tokens", "cached_content_token_count"),
+                        ("output_tokens", "candidates_token_count")):
+        value = getattr(usage, field, None)
+        if isinstance(value, int) and value:
+            count(name, value)
+
+
+@contextlib.contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def timed(name=None):
+    """Decorator form of stage(); the stage is named after the function unless `name` is given."""
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextlib.contextmanager
+def trace(kind, **attrs):
+    """
+    Collects the stages and counters of one unit of work and appends them,
+    with its elapsed time and any error, to the trace file when it ends.
+    A nested trace collects its own stages only.
+    """
+    current = Trace(kind, attrs)
+    token = _current.set(current)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        record = current.record(time.perf_counter() - start, error)
+        if _trace_file:
+            _append(_trace_file, json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _append(path, line):
+    with _write_lock:
+        try:
+            if os.path.getsize(path) >= MAX_TRACE_BYTES:
+                os.replace(path, path + ".1")
+        except OSError:
+            pass  # no file yet, or another process rotated it first
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def _tail_lines(path, last):
+    """The last `last` lines of a file, reading backwards from its end in TAIL_BLOCK steps."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position, data = f.tell(), b""
+        while position > 0 and data.count(b"\n") <= last:
+            step = min(TAIL_BLOCK, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    # Unless the whole file was read, the first line is cut off
+    return lines[-last:] if position == 0 else lines[1:][-last:]
+
+
+def summarize_file(path, last=SUMMARY_TRACES):
+    """
+    Aggregates the latest `last` traces of a trace file: per kind (count,
+    errors, p50/p95 elapsed), per stage (traces using it, calls, p50/p95
+    seconds per trace) and counter totals.
+    """
+    if not path or not os.path.exists(path):
+        return {"kinds": [], "stages": [], "counters": {}}
+    lines = _tail_lines(path, last)
+    kinds, stages, counters = {}, {}, collections.Counter()
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue  # a line still being written by another process
+        kind = kinds.setdefault(record["kind"], {"elapsed": [], "errors": 0})
+        kind["elapsed"].append(record["elapsed"])
+        kind["errors"] += record["error"] is not None
+        for name, entry in record["stages"].items():
+            totals = stages.setdefault(name, {"calls": 0, "seconds": []})
+            totals["calls"] += entry["calls"]
+            totals["seconds"].append(entry["seconds"])
+        counters.update(record["counters"])
+    return {
+        "kinds": [{"kind": name, "traces": len(k["elapsed"]), "errors": k["errors"],
+                   "p50": _percentile(k["elapsed"], 0.5), "p95": _percentile(k["elapsed"], 0.95)}
+                  for name, k in kinds.items()],
+        "stages": sorted(({"stage": name, "traces": len(s["seconds"]), "calls": s["calls"], "seconds": sum(s["seconds"]),
+                           "p50": _percentile(s["seconds"], 0.5), "p95": _percentile(s["seconds"], 0.95)}
+                          for name, s in stages.items()), key=lambda s: -s["seconds"]),
+        "counters": dict(counters),
+    }
+
+
+# ===== PROFILING =====
+@contextlib.contextmanager
+def profile(path):
+    """
+    Profiles the block into `path`: a pyinstrument HTML report when it ends
+    in .html (pyinstrument must be installed), cProfile stats otherwise
+    (open with pstats or snakeviz). Only the calling thread is profiled;
+    for work spread over run_batch threads the stage timings are the
+    better guide.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    if path.endswith(".html"):
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+        return
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise a trace file written by essay_marking.tracing.")
+    parser.add_argument("trace_file")
+    parser.add_argument("--last", type=int, default=SUMMARY_TRACES, help="Latest traces to include")
+    args = parser.parse_args()
+
+    result = summarize_file(args.trace_file, args.last)
+    print(f"{'kind':>20} {'traces':>7} {'errors':>7} {'p50 s':>8} {'p95 s':>8}")
+    for row in result["kinds"]:
+        print(f"{row['kind']:>20} {row['traces']:7d} {row['errors']:7d} {row['p50']:8.3f} {row['p95']:8.3f}")
+    print(f"\n{'stage':>20} {'traces':>7} {'calls':>7} {'total s':>9} {'p50 s':>8} {'p95 s':>8}")
+    for row in result["stages"]:
+        print(f"{row['stage']:>20} {row['traces']:7d} {row['calls']:7d} {row['seconds']:9.2f} "
+              f"{row['p50']:8.3f} {row['p95']:8.3f}")
+    if result["counters"]:
+        print("\n" + ", ".join(f"{name}: {value:,}" for name, value in sorted(result["counters"].items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Full-page handwriting recognition with TrOCR.
+
+TrOCR is a single-line model, so a page is first segmented into text lines
+with a horizontal projection profile (after removing ruled lines and page
+borders), and the line crops are recognised in padded batches.
+
+Marking servers have no GPU, so `quantize_trocr` can write a dynamic int8
+copy of a model (Linear layers of encoder and decoder) next to it, which
+`load_trocr` then prefers. The copy records the size and mtime of the fp32
+weights it came from; once those are retrained, load_trocr re-quantizes
+instead of loading the old copy:
+
+    python -m essay_marking.trocr test_models/Reg_Ditection/trocr-finetuned
+"""
+import argparse
+import os
+
+import cv2
+import numpy as np
+
+
+# ===== CONFIGURATION =====
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_MAX_NEW_TOKENS = 64
+QUANTIZED_FILENAME = "trocr-int8.pt"
+WEIGHTS_FILENAMES = ("model.safetensors", "pytorch_model.bin")  # fp32 weights written by save_pretrained
+
+
+# ===== LINE SEGMENTATION =====
+def ink_mask(gray):
+    """Binary ink mask (ink = 255) using the same blur + adaptive threshold as app2.preprocess_image."""
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    return cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
+                                 cv2.THRESH_BINARY_INV, 11, 12)
+
+
+def remove_rules(mask):
+    """Drops long horizontal/vertical strokes (ruled lines, margins, boxes) from an ink mask."""
+    h, w = mask.shape
+    horizontal = cv2.morphologyEx(mask, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (max(20, w // 20), 1)))
+    vertical = cv2.morphologyEx(mask, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(20, h // 20))))
+    # Grow the rules by a pixel so their anti-aliased edges go too
+    rules = cv2.dilate(cv2.bitwise_or(horizontal, vertical), np.ones((3, 3), np.uint8))
+    return cv2.subtract(mask, rules)
+
+
+def clean_components(ink):
+    """
+    Removes specks, rule fragments (flat dashes) and anything touching the
+    left/right image border (photo background, page edges). Returns the
+    cleaned mask and the median height of the remaining components, which
+    approximates the character height.
+    """
+    h, w = ink.shape
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    x, comp_w = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_WIDTH]
+    comp_h, area = stats[:, cv2.CC_STAT_HEIGHT], stats[:, cv2.CC_STAT_AREA]
+    noise = (area < 8) | ((comp_h <= 5) & (comp_w > 2 * comp_h)) | (x == 0) | (x + comp_w == w)
+    noise[0] = False  # background label
+    ink = ink.copy()
+    ink[noise[labels]] = 0
+    heights, weights = comp_h[1:][~noise[1:]], area[1:][~noise[1:]]
+    if not heights.size:
+        return ink, 0.0
+    # Area-weighted median, so whole letters count for more than broken fragments
+    order = np.argsort(heights)
+    cumulative = np.cumsum(weights[order])
+    return ink, float(heights[order][np.searchsorted(cumulative, cumulative[-1] / 2)])
+
+
+def _runs(active):
+    """Start/end indexes of consecutive True runs in a 1-D boolean array."""
+    padded = np.concatenate(([False], active, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return [[int(start), int(end)] for start, end in zip(edges[::2], edges[1::2])]
+
+
+def _valley(profile, start, end):
+    """Emptiest row in [start, end); `start` when the two bands touch."""
+    if end <= start:
+        return start
+    return start + int(np.argmin(profile[start:end]))
+
+
+def _split_band(profile, start, end, char_height):
+    """Recursively splits a band spanning several touching lines at its weakest row."""
+    if end - start < char_height * 2.2:
+        return [[start, end]]
+    margin = int(char_height * 0.8)
+    cut = _valley(profile, start + margin, end - margin)
+    return _split_band(profile, start, cut, char_height) + _split_band(profile, cut, end, char_height)
+
+
+def segment_lines(image, padding=4):
+    """
+    Returns text line boxes (x0, y0, x1, y1) of a page in reading order.
+
+    Ruled lines and noise are removed first. Line cores are the rows whose
+    ink count is well above the inter-line level; cores closer than half a
+    character height are merged, cores taller than two lines are split at
+    their weakest row, and each line extends to the emptiest row between it
+    and its neighbours so ascenders and descenders stay attached.
+    """
+    gray = np.asarray(image.convert("L"))
+    h, w = gray.shape
+    ink, char_height = clean_components(remove_rules(ink_mask(gray)))
+    if char_height == 0:
+        return []
+
+    profile = np.count_nonzero(ink, axis=1)
+    cores = _runs(profile > max(1, 0.15 * np.percentile(profile[profile > 0], 90)))
+    merged = [cores[0]]
+    for start, end in cores[1:]:
+        if start - merged[-1][1] < char_height / 2:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    cores = [
+        piece
+        for start, end in merged if end - start >= char_height / 3
+        for piece in _split_band(profile, start, end, char_height)
+    ]
+
+    boxes = []
+    for i, (start, end) in enumerate(cores):
+        top = 0 if i == 0 else _valley(profile, cores[i - 1][1], start)
+        bottom = h if i == len(cores) - 1 else _valley(profile, end, cores[i + 1][0])
+        # Trim blank space, but never further than a character from the core
+        top, bottom = max(top, start - int(char_height)), min(bottom, end + int(char_height))
+        band = ink[top:bottom]
+        rows = _runs(np.count_nonzero(band, axis=1) > 0)
+        columns = _runs(np.count_nonzero(band, axis=0) > 0)
+        if not rows or not columns:
+            continue
+        y0, y1 = top + rows[0][0], top + rows[-1][1]
+        x0, x1 = columns[0][0], columns[-1][1]
+        boxes.append((max(0, x0 - padding), max(0, y0 - padding),
+                      min(w, x1 + padding), min(h, y1 + padding)))
+    return boxes
+
+
+def crop_lines(image, boxes):
+    image = image.convert("RGB")
+    return [image.crop(box) for box in boxes]
+
+
+# ===== RECOGNITION =====
+def weights_fingerprint(model_dir):
+    """Name, size and mtime of the fp32 weights in `model_dir`; None for a hub id or an empty folder."""
+    for name in WEIGHTS_FILENAMES:
+        path = os.path.join(model_dir, name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            return f"{name}:{stat.st_size}:{stat.st_mtime_ns}"
+    return None
+
+
+def _quantize(model, model_dir):
+    """Dynamic int8 copy of `model`, saved next to its weights with their fingerprint."""
+    import torch
+
+    quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    path = os.path.join(model_dir, QUANTIZED_FILENAME)
+    torch.save({"weights": weights_fingerprint(model_dir), "model": quantized}, path)
+    return quantized, path
+
+
+def load_trocr(model_dir, prefer_quantized=True):
+    """
+    Loads processor and model from `model_dir`, using the int8 artifact
+    written by quantize_trocr when present (and `prefer_quantized`). An
+    artifact quantized from other weights (or written before fingerprints
+    were recorded) is rebuilt from the current ones.
+    """
+    import torch
+    from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+
+    processor = TrOCRProcessor.from_pretrained(model_dir)
+    quantized_path = os.path.join(model_dir, QUANTIZED_FILENAME)
+    model = None
+    if prefer_quantized and os.path.exists(quantized_path):
+        # Quantized modules have no from_pretrained; the file is a pickle we wrote ourselves
+        artifact = torch.load(quantized_path, weights_only=False)
+        if isinstance(artifact, dict) and artifact["weights"] == weights_fingerprint(model_dir):
+            model = artifact["model"]
+    if model is None:
+        model = VisionEncoderDecoderModel.from_pretrained(model_dir)
+        if prefer_quantized and os.path.exists(quantized_path):
+            print(f"⚠️ {quantized_path} was quantized from other weights than {model_dir}'s; re-quantizing")
+            model, _ = _quantize(model, model_dir)
+    model.eval()
+    return processor, model
+
+
+def quantize_trocr(model_dir):
+    """Writes a dynamic int8 copy of the fp32 model in `model_dir` and returns its path."""
+    from transformers import VisionEncoderDecoderModel
+
+    model = VisionEncoderDecoderModel.from_pretrained(model_dir)
+    model.eval()
+    return _quantize(model, model_dir)[1]
+
+
+def recognize_lines(processor, model, crops, batch_size=DEFAULT_BATCH_SIZE,
+                    max_new_tokens=DEFAULT_MAX_NEW_TOKENS):
+    """
+    Recognises line crops in batches and returns texts in input order.
+
+    Crops are grouped by aspect ratio so lines of similar length share a
+    batch and few decoder steps are wasted on already-finished sequences.
+    """
+    import torch
+
+    order = sorted(range(len(crops)), key=lambda i: crops[i].width / max(1, crops[i].height))
+    texts = [""] * len(crops)
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            pixel_values = processor(images=[crops[i] for i in batch], return_tensors="pt").pixel_values
+            generated_ids = model.generate(pixel_values, max_new_tokens=max_new_tokens)
+            for i, text in zip(batch, processor.batch_decode(generated_ids, skip_special_tokens=True)):
+                texts[i] = text
+    return texts
+
+
+def transcribe_page(image, processor, model, batch_size=DEFAULT_BATCH_SIZE):
+    """Segments a full page and returns its text, one recognised line per row."""
+    boxes = segment_lines(image)
+    # A single-line crop (or a page the profile cannot split) goes through whole
+    crops = crop_lines(image, boxes) if boxes else [image.convert("RGB")]
+    return "\n".join(recognize_lines(processor, model, crops, batch_size=batch_size))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write an int8 dynamically quantized copy of a TrOCR model.")
+    parser.add_argument("model_dir")
+    args = parser.parse_args()
+    print(f"✅ Quantized model saved to {quantize_trocr(args.model_dir)}")
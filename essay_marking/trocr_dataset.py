@@ -0,0 +1,210 @@
+"""
+Persistent preprocessed-tensor cache for TrOCR fine-tuning.
+
+Each (image, label) row is run through the TrOCR processor once and stored
+as float16 pixel values and int32 label ids in .npy shards under a folder
+keyed by the processor configuration. Rows are keyed by a hash of the image
+bytes and the label text, so later runs only process new or changed rows.
+Shards are memory-mapped when read, so RAM use does not grow with the
+dataset size.
+
+    index = build_tensor_cache(rows, IMG_DIR, "microsoft/trocr-base-handwritten", CACHE_DIR)
+    dataset = TensorCacheDataset(index)           # map-style, random access
+    stream = streaming_dataset(index, seed=42)    # datasets.IterableDataset, shard by shard
+"""
+import hashlib
+import json
+import os
+import random
+from multiprocessing import Pool
+
+import numpy as np
+from PIL import Image
+
+
+# ===== CONFIGURATION =====
+SHARD_SIZE = 256  # rows per shard (~220 MB of float16 384x384 images)
+DEFAULT_MAX_LENGTH = 32
+INDEX_FILE = "index.json"
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def row_key(image_hash, text):
+    return hashlib.sha256(f"{image_hash}\0{text}".encode("utf-8")).hexdigest()
+
+
+def processor_fingerprint(processor, max_length):
+    """Hash of everything that changes the tensors: image processor config, tokenizer and label length."""
+    config = {
+        "image_processor": json.loads(processor.image_processor.to_json_string()),
+        "tokenizer": processor.tokenizer.name_or_path,
+        "vocab_size": processor.tokenizer.vocab_size,
+        "max_length": max_length,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+# ===== SHARD BUILDING =====
+_processor = None
+
+
+def _init_worker(processor_source):
+    global _processor
+    from transformers import TrOCRProcessor
+
+    _processor = TrOCRProcessor.from_pretrained(processor_source)
+
+
+def _write_shard(job):
+    """Preprocesses one chunk of rows into <cache_dir>/<name>.pixels.npy and .labels.npy."""
+    cache_dir, name, rows, max_length = job
+    pixels = labels = None
+    for i, (image_path, text) in enumerate(rows):
+        image = Image.open(image_path).convert("RGB")
+        pixel_values = _processor.image_processor(images=image, return_tensors="np").pixel_values[0]
+        label_ids = _processor.tokenizer(text, padding="max_length", truncation=True,
+                                         max_length=max_length).input_ids
+        if pixels is None:
+            # Written straight into the memory-mapped file so a shard never has to fit in RAM twice
+            pixels = np.lib.format.open_memmap(os.path.join(cache_dir, f"{name}.pixels.npy"), mode="w+",
+                                               dtype=np.float16, shape=(len(rows),) + pixel_values.shape)
+            labels = np.lib.format.open_memmap(os.path.join(cache_dir, f"{name}.labels.npy"), mode="w+",
+                                               dtype=np.int32, shape=(len(rows), max_length))
+        pixels[i] = pixel_values
+        labels[i] = label_ids
+    pixels.flush()
+    labels.flush()
+    return name, len(rows)
+
+
+def load_index(cache_dir):
+    path = os.path.join(cache_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return {"shards": {}, "rows": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_index(cache_dir, index):
+    path = os.path.join(cache_dir, INDEX_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def build_tensor_cache(rows, image_dir, processor_source, cache_root, max_length=DEFAULT_MAX_LENGTH,
+                       workers=None, shard_size=SHARD_SIZE):
+    """
+    Makes sure every (filename, text) in `rows` is in the cache and returns
+    the index of the requested rows: {"dir", "rows": [[shard, row], ...]}.
+
+    Missing rows are preprocessed in a process pool, one shard per task;
+    `processor_source` is a hub name or local folder loaded by each worker.
+    """
+    from transformers import TrOCRProcessor
+
+    processor = TrOCRProcessor.from_pretrained(processor_source)
+    cache_dir = os.path.join(cache_root, processor_fingerprint(processor, max_length))
+    os.makedirs(cache_dir, exist_ok=True)
+    index = load_index(cache_dir)
+
+    keys, missing = [], {}
+    for filename, text in rows:
+        image_path = os.path.join(image_dir, filename)
+        key = row_key(file_hash(image_path), text)
+        keys.append(key)
+        if key not in index["rows"]:
+            missing.setdefault(key, (image_path, text))
+
+    if missing:
+        missing_keys = list(missing)
+        chunks = [missing_keys[start:start + shard_size] for start in range(0, len(missing_keys), shard_size)]
+        first = len(index["shards"])
+        jobs = [(cache_dir, f"shard-{first + n:05d}", [missing[k] for k in chunk], max_length)
+                for n, chunk in enumerate(chunks)]
+        workers = min(workers or os.cpu_count() or 1, len(jobs))
+        with Pool(workers, initializer=_init_worker, initargs=(processor_source,)) as pool:
+            for (name, count), chunk in zip(pool.imap(_write_shard, jobs), chunks):
+                index["shards"][name] = count
+                for row, key in enumerate(chunk):
+                    index["rows"][key] = [name, row]
+                print(f"✅ {name}: {count} rows")
+        save_index(cache_dir, index)
+
+    return {"dir": cache_dir, "rows": [index["rows"][key] for key in keys]}
+
+
+# ===== READING =====
+class _Shards:
+    """Lazily memory-maps shards; safe to pickle into DataLoader workers."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._open = {}
+
+    def __getitem__(self, name):
+        if name not in self._open:
+            self._open[name] = (
+                np.load(os.path.join(self.cache_dir, f"{name}.pixels.npy"), mmap_mode="r"),
+                np.load(os.path.join(self.cache_dir, f"{name}.labels.npy"), mmap_mode="r"),
+            )
+        return self._open[name]
+
+    def __getstate__(self):
+        return {"cache_dir": self.cache_dir, "_open": {}}
+
+
+def _example(shards, shard, row):
+    pixels, labels = shards[shard]
+    pixel_values = pixels[row]
+    if pixel_values.dtype == np.uint8:
+        # Compact grayscale shards (synth_reg): apply TrOCR's rescale + 0.5/0.5 normalisation here
+        pixel_values = np.repeat((pixel_values.astype(np.float32) / 127.5 - 1.0)[None], 3, axis=0)
+    return {"pixel_values": pixel_values.astype(np.float32), "labels": labels[row].astype(np.int64)}
+
+
+class TensorCacheDataset:
+    """Map-style dataset over a build_tensor_cache index, usable directly as a Trainer train_dataset."""
+
+    def __init__(self, index):
+        self.rows = index["rows"]
+        self.shards = _Shards(index["dir"])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        return _example(self.shards, *self.rows[i])
+
+
+def _iter_shards(cache_dir, groups, seed=None):
+    shards = _Shards(cache_dir)
+    rng = random.Random(seed)
+    for shard, rows in groups:
+        if seed is not None:
+            rows = rng.sample(rows, len(rows))
+        for row in rows:
+            yield _example(shards, shard, row)
+
+
+def streaming_dataset(index, seed=None):
+    """
+    datasets.IterableDataset that reads one shard at a time. With a `seed`
+    the shard order and the rows within each shard are shuffled; shards are
+    split across DataLoader workers.
+    """
+    from datasets import IterableDataset
+
+    groups = {}
+    for shard, row in index["rows"]:
+        groups.setdefault(shard, []).append(row)
+    groups = sorted(groups.items())
+    if seed is not None:
+        random.Random(seed).shuffle(groups)
+    return IterableDataset.from_generator(
+        _iter_shards, gen_kwargs={"cache_dir": index["dir"], "groups": groups, "seed": seed}
+    )
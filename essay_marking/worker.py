@@ -0,0 +1,387 @@
+"""
+Background workers for the job store queue (see essay_marking.jobstore).
+
+The Streamlit app (or any client) submits jobs with `submit`; worker
+processes claim them one at a time, stream progress and partial results
+into the job row, and write transcripts/evaluations to the store. No broker
+is needed: the SQLite file is the queue.
+
+    python -m essay_marking worker --db marking_jobs.sqlite --processes 2
+
+Each job kind has a handler `handler(ctx, job, report)`; `report(done=...,
+total=..., **result)` updates the job row that the UI polls. A job whose
+payload has "profile": True is run under cProfile, into settings["profile_dir"].
+"""
+import multiprocessing
+import os
+import socket
+import threading
+import time
+
+from PIL import Image
+
+from essay_marking.batch import run_batch, DEFAULT_MAX_IN_FLIGHT, DEFAULT_REQUEST_TIMEOUT
+from essay_marking.jobstore import JobStore
+from essay_marking.students import find_reg_number, safe_name, save_transcript
+from essay_marking.tracing import configure, profile, trace
+
+
+# ===== CONFIGURATION =====
+POLL_INTERVAL = 1.0  # seconds between queue checks when idle
+HEARTBEAT_INTERVAL = 30  # seconds between a worker's "still alive" writes, also during long jobs
+STALE_AFTER = 600  # a running job whose worker has been silent this long is assumed orphaned
+LOG_LINES = 50  # most recent progress messages kept in a job's result
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Settings shared by the app and its workers; override per deployment
+DEFAULT_SETTINGS = {
+    "model": "gemini-2.5-flash",
+    "api_key": None,
+    "rpm": None,
+    "tpm": None,
+    "max_in_flight": DEFAULT_MAX_IN_FLIGHT,
+    "timeout": DEFAULT_REQUEST_TIMEOUT,
+    "transcribe_prompt": "Extract all handwritten text from this image as accurately as possible and format it as Markdown.",
+    "mask_strikeouts": False,  # paint over crossed-out writing locally before transcription
+    "transcription_cache": os.path.join(".cache", "transcriptions.sqlite"),
+    "evaluation_cache": os.path.join(".cache", "evaluations.sqlite"),
+    "student_answers_folder": "student_answers_md",
+    "marking_md": "marking.md",
+    "questions_folder": "questions_md",
+    "reg_model_dir": None,
+    "reg_min_confidence": 0.8,
+    "trace_file": None,  # JSONL of per-script stage timings (essay_marking.tracing)
+    "profile_dir": os.path.join(".cache", "profiles"),  # where jobs submitted with "profile": True are profiled to
+}
+
+
+def submit(store, kind, payload, owner=None, total=0):
+    """Queues a job and returns its id."""
+    return store.create_job(kind, payload, total=total, owner=owner)
+
+
+# ===== WORKER CONTEXT =====
+class WorkerContext:
+    """
+    Per-process resources, created lazily so a worker only loads what its jobs
+    need. Handlers first touch them from run_batch threads, so each is built
+    under a lock: one scheduler (this process's RPM/TPM share) and one
+    connection per cache.
+    """
+
+    def __init__(self, settings, store, model=None):
+        self.settings = {**DEFAULT_SETTINGS, **settings}
+        self.store = store
+        self._model = model
+        self._cache = self._evaluation_cache = self._score_store = self._reg_detector = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+
+                from essay_marking.scheduler import RateLimitScheduler, DEFAULT_RPM, DEFAULT_TPM
+
+                genai.configure(api_key=self.settings["api_key"])
+                scheduler = RateLimitScheduler(rpm=self.settings["rpm"] or DEFAULT_RPM,
+                                               tpm=self.settings["tpm"] or DEFAULT_TPM)
+                self._model = scheduler.wrap(genai.GenerativeModel(self.settings["model"]))
+            return self._model
+
+    @property
+    def cache(self):
+        with self._lock:
+            if self._cache is None:
+                from essay_marking.cache import DiskCache
+
+                self._cache = DiskCache(self.settings["transcription_cache"])
+            return self._cache
+
+    @property
+    def evaluation_cache(self):
+        with self._lock:
+            if self._evaluation_cache is None:
+                from essay_marking.cache import DiskCache
+
+                self._evaluation_cache = DiskCache(self.settings["evaluation_cache"])
+            return self._evaluation_cache
+
+    @property
+    def score_store(self):
+        with self._lock:
+            if self._score_store is None:
+                from essay_marking.scores import ScoreStore
+
+                self._score_store = ScoreStore(self.store.path)
+            return self._score_store
+
+    @property
+    def reg_detector(self):
+        with self._lock:
+            if self._reg_detector is None and self.settings["reg_model_dir"]:
+                from essay_marking.trocr import load_trocr
+
+                self._reg_detector = load_trocr(self.settings["reg_model_dir"])
+            return self._reg_detector
+
+
+# ===== HANDLERS =====
+def transcribe_folder(ctx, job, report):
+    """
+    Payload: {"folder", "local_reg": bool, "skip_existing": bool}. Transcribes
+    every image in the folder concurrently and saves each transcript as it
+    arrives; local reg numbers back up the transcript regex and, with
+    skip_existing, students that already have a transcript are skipped.
+    """
+    from essay_marking.gemini import transcribe_image
+    from essay_marking.images import prepare_image
+
+    folder = job["payload"]["folder"]
+    if not os.path.isdir(folder):
+        raise FileNotFoundError(f"The specified folder path does not exist: {folder}")
+    image_paths = [os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.lower().endswith(IMAGE_EXTENSIONS)]
+    if not image_paths:
+        raise FileNotFoundError(f"No image files found in the folder: {folder}")
+
+    log, saved = [], []
+    def note(message):
+        log.append(message)
+        del log[:-LOG_LINES]
+
+    local_regs = {}
+    if job["payload"].get("local_reg"):
+        local_regs = detect_reg_numbers(ctx, image_paths)
+        note(f"🔎 Registration number read locally for {len(local_regs)}/{len(image_paths)} images.")
+        if job["payload"].get("skip_existing"):
+            for path, reg_number in local_regs.items():
+                if ctx.store.has_transcript(safe_name(reg_number)):
+                    note(f"⏭️ {os.path.basename(path)}: {reg_number} already transcribed, skipped.")
+                    image_paths.remove(path)
+    report(total=len(image_paths), log=log, saved=saved)
+
+    def worker(image_path, timeout):
+        with trace("transcribe", source=os.path.basename(image_path)):
+            _, image_bytes = prepare_image(image_path, mask_strikes=ctx.settings["mask_strikeouts"])
+            return transcribe_image(ctx.model, image_bytes, ctx.settings["transcribe_prompt"], timeout=timeout,
+                                    cache=ctx.cache)
+
+    def on_result(result, done, total):
+        filename = os.path.basename(image_paths[result.index])
+        if not result.ok:
+            note(f"❌ An error occurred while processing {filename}: {result.error}")
+        elif result.value:
+            reg_number, safe_reg_number = find_reg_number(result.value)
+            local_reg_number = local_regs.get(image_paths[result.index])
+            if not reg_number and local_reg_number:
+                reg_number, safe_reg_number = local_reg_number, safe_name(local_reg_number)
+            if reg_number:
+                save_transcript(ctx.settings["student_answers_folder"], safe_reg_number, result.value)
+                ctx.store.save_transcript(safe_reg_number, reg_number, result.value, source=image_paths[result.index])
+                saved.append(reg_number)
+                note(f"✅ Extracted text from {filename} for Reg. No. {reg_number} and saved.")
+            else:
+                note(f"⚠️ Could not find a registration number in {filename}. Skipping save.")
+        else:
+            note(f"❌ Failed to extract text from {filename}.")
+        report(done=done, log=log, saved=saved)
+
+    run_batch(image_paths, worker, max_in_flight=ctx.settings["max_in_flight"],
+              timeout=ctx.settings["timeout"], on_result=on_result)
+    return {"log": log, "saved": saved}
+
+
+def detect_reg_numbers(ctx, image_paths):
+    """{image path: confident reg number} from the local TrOCR detector ({} when it is unavailable)."""
+    try:
+        detector = ctx.reg_detector
+    except Exception:
+        detector = None
+    if detector is None:
+        return {}
+    from essay_marking.reg_detect import read_reg_numbers
+
+    images = [Image.open(path).convert("RGB") for path in image_paths]
+    detections = read_reg_numbers(*detector, images)
+    return {path: d.reg_number for path, d in zip(image_paths, detections)
+            if d.valid and d.confidence >= ctx.settings["reg_min_confidence"]}
+
+
+def ingest_scan(ctx, job, report):
+    """
+    Payload: {"paths": [PDF, image or folder, ...]}. Transcribes every page
+    concurrently, groups consecutive pages by the registration number in
+    their headers and saves one ordered transcript per student.
+    """
+    from essay_marking.ingest import assemble_scripts, list_pages, transcribe_pages
+
+    paths = job["payload"]["paths"]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"The specified path does not exist: {', '.join(missing)}")
+    pages = list_pages(paths)
+    if not pages:
+        raise FileNotFoundError(f"No PDF or image pages found in: {', '.join(paths)}")
+
+    log, saved = [], []
+    def note(message):
+        log.append(message)
+        del log[:-LOG_LINES]
+
+    report(total=len(pages), log=log, saved=saved)
+
+    def on_result(result, done, total):
+        if not result.ok:
+            note(f"❌ An error occurred while processing {pages[result.index].label}: {result.error}")
+        report(done=done, log=log, saved=saved)
+
+    results = transcribe_pages(ctx.model, pages, ctx.settings["transcribe_prompt"],
+                               max_in_flight=ctx.settings["max_in_flight"], timeout=ctx.settings["timeout"],
+                               cache=ctx.cache, on_result=on_result, mask_strikes=ctx.settings["mask_strikeouts"])
+    students, unassigned = assemble_scripts(pages, [r.value if r.ok else None for r in results])
+    for safe_reg_number, student in students.items():
+        save_transcript(ctx.settings["student_answers_folder"], safe_reg_number, student["transcript"])
+        ctx.store.save_transcript(safe_reg_number, student["reg_number"], student["transcript"],
+                                  source=student["pages"][0])
+        for label in student["pages"][1:]:
+            ctx.store.add_script(label, student["reg_number"])
+        saved.append(student["reg_number"])
+    note(f"🧩 {len(pages)} pages assembled into {len(students)} student scripts.")
+    if unassigned:
+        note(f"⚠️ Not assigned to a student (no registration number before them, or after a page that "
+             f"could not be transcribed): {', '.join(unassigned)}. Skipping save.")
+    return {"log": log, "saved": saved}
+
+
+def evaluate(ctx, job, report):
+    """Payload: {"safe_reg", "per_question": bool, "structured": bool}. Saves the report as the student's evaluation."""
+    from essay_marking.evaluation import evaluate_student
+    from essay_marking.questions import load_question_schemes
+
+    payload = job["payload"]
+    student_md = ctx.store.get_transcript(payload["safe_reg"])
+    if student_md is None:
+        raise KeyError(f"No transcript for {payload['safe_reg']}")
+    with open(ctx.settings["marking_md"], "r", encoding="utf-8") as f:
+        marking_md = f.read()
+    schemes = load_question_schemes(ctx.settings["questions_folder"]) if payload.get("per_question") else {}
+    report(total=1)
+    mode = "Per question" if payload.get("per_question", True) else "Full marking scheme"
+    with trace("evaluate", student=payload["safe_reg"], mode=mode):
+        evaluation, notes = evaluate_student(
+            ctx.model, marking_md, schemes, student_md, payload["safe_reg"],
+            per_question=payload.get("per_question", True), structured=payload.get("structured", False),
+            score_store=ctx.score_store if payload.get("structured") else None, cache=ctx.evaluation_cache,
+            max_in_flight=ctx.settings["max_in_flight"], timeout=ctx.settings["timeout"],
+        )
+    ctx.store.save_evaluation(payload["safe_reg"], mode, evaluation)
+    report(done=1)
+    return {"log": notes}
+
+
+HANDLERS = {"transcribe_folder": transcribe_folder, "ingest_scan": ingest_scan, "evaluate": evaluate}
+
+
+# ===== WORKER LOOP =====
+def run_job(ctx, job):
+    """Runs one claimed job and records its outcome."""
+    store = ctx.store
+
+    def report(done=None, total=None, **result):
+        fields = {name: value for name, value in (("done", done), ("total", total)) if value is not None}
+        if result:
+            fields["result"] = result
+        store.update_job(job["id"], **fields)
+
+    try:
+        if job["payload"].get("profile") and ctx.settings["profile_dir"]:
+            path = os.path.join(ctx.settings["profile_dir"], f"{job['kind']}-{job['id']}.prof")
+            with profile(path):
+                result = HANDLERS[job["kind"]](ctx, job, report)
+            result = {**result, "log": result.get("log", []) + [f"⏱️ Profile saved to {path}"]}
+        else:
+            result = HANDLERS[job["kind"]](ctx, job, report)
+        store.update_job(job["id"], status="done", result=result)
+    except Exception as e:
+        store.update_job(job["id"], status="failed", error=f"{type(e).__name__}: {e}")
+
+
+def worker_loop(db_path, settings, stop=None, model=None):
+    """Claims and runs jobs until `stop` (a multiprocessing/threading Event) is set."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    store = JobStore(db_path)
+    ctx = WorkerContext(settings, store, model=model)
+    configure(ctx.settings["trace_file"])
+    # A separate thread, so a job that reports no progress for a long time still looks alive
+    stopped = threading.Event()
+    store.heartbeat(worker_id)
+
+    def beat():
+        while not stopped.wait(HEARTBEAT_INTERVAL):
+            store.heartbeat(worker_id)
+            # Every live worker also frees the jobs of workers that died while the server kept running
+            store.requeue_stale(STALE_AFTER)
+
+    threading.Thread(target=beat, daemon=True).start()
+    try:
+        while not (stop and stop.is_set()):
+            job = store.claim_job(worker_id)
+            if job is None:
+                time.sleep(POLL_INTERVAL)
+                continue
+            run_job(ctx, job)
+    finally:
+        stopped.set()
+
+
+def _process_exists(pid):
+    if os.name == "nt":
+        return True  # os.kill would terminate it there; wait for its heartbeat to go stale instead
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # it exists but belongs to another user
+    return True
+
+
+def forget_dead_workers(store):
+    """
+    Forgets this host's workers whose process has exited (e.g. those of a
+    server restarted moments ago, whose heartbeats are still recent) and
+    returns their ids. Workers on other hosts are left to go stale.
+    """
+    host = socket.gethostname()
+    dead = []
+    for worker in store.worker_ids():
+        worker_host, _, pid = worker.rpartition(":")
+        if worker_host == host and pid.isdigit() and not _process_exists(int(pid)):
+            dead.append(worker)
+    store.forget_workers(dead)
+    return dead
+
+
+def start_workers(db_path, settings, processes=2):
+    """
+    Starts `processes` daemon worker processes (spawned, so it is safe from a
+    threaded Streamlit server) after requeueing jobs orphaned by dead workers;
+    the workers keep requeueing orphaned jobs while they run. The RPM/TPM
+    budgets are split between the processes. Returns (processes, stop event).
+    """
+    from essay_marking.scheduler import DEFAULT_RPM, DEFAULT_TPM
+
+    settings = {**settings, "rpm": (settings.get("rpm") or DEFAULT_RPM) / processes,
+                "tpm": (settings.get("tpm") or DEFAULT_TPM) / processes}
+    store = JobStore(db_path)
+    forget_dead_workers(store)
+    store.requeue_stale(STALE_AFTER)
+    store.close()
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    workers = [context.Process(target=worker_loop, args=(db_path, settings, stop), daemon=True)
+               for _ in range(processes)]
+    for process in workers:
+        process.start()
+    return workers, stop
@@ -1,66 +1,92 @@
 # train_trocr.py
 from transformers import TrOCRProcessor, VisionEncoderDecoderModel, Seq2SeqTrainer, Seq2SeqTrainingArguments
-from datasets import Dataset
-from PIL import Image
 import torch
 import pandas as pd
+import math
 import os
+import sys
+
+# Make the shared essay_marking package importable
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+from essay_marking.synth_reg import build_synthetic_shards, find_fonts
+from essay_marking.trocr import QUANTIZED_FILENAME
+from essay_marking.trocr_dataset import build_tensor_cache, streaming_dataset, TensorCacheDataset
 
 # Paths
 DATA_DIR = "custom_data"
 IMG_DIR = os.path.join(DATA_DIR, "images")
 CSV_FILE = os.path.join(DATA_DIR, "labels.csv")
+BASE_MODEL = "microsoft/trocr-base-handwritten"
+
+# Preprocessed tensors are cached here and reused by later runs
+TENSOR_CACHE_DIR = os.path.join(DATA_DIR, ".tensor_cache")
+STREAMING = False  # read shards sequentially instead of random access (for very large label sets)
+SYNTHETIC_SAMPLES = 0  # extra generated "EG / NNNN / NNNN" crops (see essay_marking/synth_reg.py)
+FONTS_DIR = "fonts"  # handwriting fonts for the synthetic crops; Pillow's built-in font if missing
+SYNTHETIC_SEED = 0
+BATCH_SIZE = 2
+EPOCHS = 5
 
 
+# Everything runs under main() so the cache-building worker processes can
+# import this file (spawn start method on Windows) without starting training
+def main():
+    # Load processor and model
+    processor = TrOCRProcessor.from_pretrained(BASE_MODEL)
+    model = VisionEncoderDecoderModel.from_pretrained(BASE_MODEL)
 
-# Load processor and model
-processor = TrOCRProcessor.from_pretrained("microsoft/trocr-base-handwritten")
-model = VisionEncoderDecoderModel.from_pretrained("microsoft/trocr-base-handwritten")
+    # ✅ IMPORTANT: Set decoder_start_token_id
+    model.config.decoder_start_token_id = processor.tokenizer.cls_token_id
+    model.config.pad_token_id = processor.tokenizer.pad_token_id
+    model.config.eos_token_id = processor.tokenizer.sep_token_id
 
-# ✅ IMPORTANT: Set decoder_start_token_id
-model.config.decoder_start_token_id = processor.tokenizer.cls_token_id
-model.config.pad_token_id = processor.tokenizer.pad_token_id
-model.config.eos_token_id = processor.tokenizer.sep_token_id
 
+    # Load CSV
+    df = pd.read_csv(CSV_FILE)
 
-# Load CSV
-df = pd.read_csv(CSV_FILE)
+    # Preprocess new rows (in parallel) into the tensor cache, then read it memory-mapped
+    index = build_tensor_cache(zip(df["filename"], df["text"]), IMG_DIR, BASE_MODEL, TENSOR_CACHE_DIR, max_length=32)
+    if SYNTHETIC_SAMPLES:
+        synthetic = build_synthetic_shards(SYNTHETIC_SAMPLES, BASE_MODEL, TENSOR_CACHE_DIR,
+                                           find_fonts(FONTS_DIR), seed=SYNTHETIC_SEED, max_length=32)
+        index["rows"] += synthetic["rows"]  # same processor, so the same cache folder
+    dataset = streaming_dataset(index, seed=42) if STREAMING else TensorCacheDataset(index)
 
-# Preprocess function
-def preprocess(example):
-    image_path = os.path.join(IMG_DIR, example["filename"])
-    image = Image.open(image_path).convert("RGB")
-    pixel_values = processor(images=image, return_tensors="pt").pixel_values[0]
-    labels = processor.tokenizer(example["text"], padding="max_length", truncation=True, max_length=32).input_ids
-    return {"pixel_values": pixel_values, "labels": labels}
+    # Training arguments
+    training_args = Seq2SeqTrainingArguments(
+        output_dir="./trocr-finetuned",
+        per_device_train_batch_size=BATCH_SIZE,
+        num_train_epochs=EPOCHS,
+        # An iterable dataset has no length, so the Trainer needs the step count
+        max_steps=math.ceil(len(index["rows"]) / BATCH_SIZE) * EPOCHS if STREAMING else -1,
+        learning_rate=5e-5,
+        logging_dir="./logs",
+        save_steps=50,
+        logging_steps=10,
+        fp16=torch.cuda.is_available(),
+    )
 
-# Create dataset
-dataset = Dataset.from_pandas(df)
-dataset = dataset.map(preprocess)
-dataset.set_format(type="torch", columns=["pixel_values", "labels"])
+    # Trainer
+    trainer = Seq2SeqTrainer(
+        model=model,
+        args=training_args,
+        train_dataset=dataset,
+    )
 
-# Training arguments
-training_args = Seq2SeqTrainingArguments(
-    output_dir="./trocr-finetuned",
-    per_device_train_batch_size=2,
-    num_train_epochs=5,
-    learning_rate=5e-5,
-    logging_dir="./logs",
-    save_steps=50,
-    logging_steps=10,
-    fp16=torch.cuda.is_available(),
-)
+    # Train model
+    trainer.train()
 
-# Trainer
-trainer = Seq2SeqTrainer(
-    model=model,
-    args=training_args,
-    train_dataset=dataset,
-)
+    # Save fine-tuned model
+    model.save_pretrained("./trocr-finetuned")
+    processor.save_pretrained("./trocr-finetuned")
+    # The int8 copy was quantized from the previous weights
+    quantized_path = os.path.join("./trocr-finetuned", QUANTIZED_FILENAME)
+    if os.path.exists(quantized_path):
+        os.remove(quantized_path)
+        print(f"🗑️ Removed stale {quantized_path}; re-run `python -m essay_marking.trocr ./trocr-finetuned`")
 
-# Train model
-trainer.train()
 
-# Save fine-tuned model
-model.save_pretrained("./trocr-finetuned")
-processor.save_pretrained("./trocr-finetuned")
+if __name__ == "__main__":
+    main()
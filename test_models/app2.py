@@ -1,10 +1,20 @@
 import streamlit as st
 from PIL import Image
-import cv2
-import numpy as np
+import os
+import sys
 import torch
 from transformers import TrOCRProcessor, VisionEncoderDecoderModel, pipeline
 
+# Make the shared essay_marking package importable under `streamlit run`
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+from essay_marking.preprocess import PreprocessConfig, preprocess
+
+# ===== CONFIGURATION =====
+# TrOCR resizes its input to 384x384, so there is no point upscaling first
+PREPROCESS = PreprocessConfig()
+
 # Setup Streamlit
 st.set_page_config(page_title="🖋️ Handwritten OCR + LLM Correction", layout="centered")
 st.title("🖋️ Handwritten Image to Text Converter with LLM Correction")
@@ -19,14 +29,9 @@ def load_models():
 
 processor, model, corrector = load_models()
 
-# Preprocess image
+# Preprocess image: deskew, denoise, binarize and crop margins at native resolution, tile by tile
 def preprocess_image(image):
-    image = np.array(image.convert("L"))  # Grayscale
-    image = cv2.resize(image, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
-    image = cv2.GaussianBlur(image, (5, 5), 0)
-    image = cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
-                                  cv2.THRESH_BINARY_INV, 11, 12)
-    return Image.fromarray(cv2.bitwise_not(image))
+    return Image.fromarray(preprocess(image, PREPROCESS))
 
 # File upload
 uploaded_file = st.file_uploader("📷 Upload a handwritten image", type=["jpg", "jpeg", "png"])
@@ -96,17 +96,15 @@ if uploaded_file:
                     [prompt, Image.open(img_data)],
                     stream=True
                 )
-                response.resolve()  # Wait for the full response
 
-                # Extract the text from the response
-                extracted_text = ""
-                for chunk in response:
-                    if chunk.text:
-                        extracted_text += chunk.text
-                
+                # Show the text chunk by chunk as Gemini writes it, then swap in the full output
+                st.subheader("📄 Extracted Text:")
+                output = st.empty()
+                with output.container():
+                    extracted_text = st.write_stream(chunk.text for chunk in response if chunk.text)
+
                 if extracted_text:
-                    st.subheader("📄 Extracted Text:")
-                    st.text_area("Text Output", extracted_text, height=250)
+                    output.text_area("Text Output", extracted_text, height=250)
                 else:
                     st.warning("Could not extract any text. Please try with a clearer image.")
 
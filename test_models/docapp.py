@@ -1,8 +1,15 @@
 import streamlit as st
-from docling.document_converter import DocumentConverter
 from PIL import Image
-import tempfile
+import io
 import os
+import sys
+import zipfile
+
+# Make the shared essay_marking package importable under `streamlit run`
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+from essay_marking.docling_ocr import DEFAULT_WORKERS, MAX_WORKERS, convert_batch, convert_to_markdown, get_converter
 
 st.set_page_config(page_title="Docling Handwritten Image to Markdown", layout="centered")
 st.title("📝 Image to Markdown Text using Docling OCR")
@@ -12,44 +19,65 @@ st.write(
     "Docling will attempt to extract the text and convert it into Markdown format."
 )
 
-uploaded_file = st.file_uploader("📷 Upload an image file (jpg, jpeg, png)", type=["jpg", "jpeg", "png"])
-
-if uploaded_file is not None:
-    # Save uploaded file to a temporary file (Docling works with file paths)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp_file:
-        tmp_file.write(uploaded_file.getvalue())
-        tmp_filepath = tmp_file.name
-
-    # Display image
-    image = Image.open(tmp_filepath)
-    st.image(image, caption="Uploaded Image", use_column_width=True)
-
-    if st.button("Extract Text and Convert to Markdown"):
-        with st.spinner("Processing with Docling OCR..."):
-            try:
-                # Initialize Docling document converter
-                converter = DocumentConverter()
-                
-                # Convert the image file to a Docling document object
-                doc = converter.convert(tmp_filepath).document
-                
-                # Export extracted document content to Markdown format
-                markdown_text = doc.export_to_markdown()
-
-                # Display the markdown text in a text area
-                st.subheader("Extracted Markdown Content:")
-                st.text_area("Markdown Text", value=markdown_text, height=300)
-
-                # Provide a download button for markdown file
-                st.download_button(
-                    label="📥 Download as Markdown File",
-                    data=markdown_text,
-                    file_name="extracted_text.md",
-                    mime="text/markdown"
-                )
-
-            except Exception as e:
-                st.error(f"An error occurred during OCR processing: {e}")
-
-    # Clean up temporary file
-    os.unlink(tmp_filepath)
+# One converter per server process: Docling's layout/OCR models load on the
+# first conversion and stay warm for every later click and session.
+converter = get_converter()
+
+tab1, tab2 = st.tabs(["Single File", "Batch"])
+
+with tab1:
+    uploaded_file = st.file_uploader("📷 Upload an image file (jpg, jpeg, png)", type=["jpg", "jpeg", "png"])
+
+    if uploaded_file is not None:
+        # Display image (converted from memory; no temporary file)
+        image = Image.open(io.BytesIO(uploaded_file.getvalue()))
+        st.image(image, caption="Uploaded Image", use_column_width=True)
+
+        if st.button("Extract Text and Convert to Markdown"):
+            with st.spinner("Processing with Docling OCR..."):
+                try:
+                    # Convert the upload and export its content to Markdown format
+                    markdown_text = convert_to_markdown(converter, uploaded_file.name, uploaded_file.getvalue())
+
+                    # Display the markdown text in a text area
+                    st.subheader("Extracted Markdown Content:")
+                    st.text_area("Markdown Text", value=markdown_text, height=300)
+
+                    # Provide a download button for markdown file
+                    st.download_button(
+                        label="📥 Download as Markdown File",
+                        data=markdown_text,
+                        file_name="extracted_text.md",
+                        mime="text/markdown"
+                    )
+
+                except Exception as e:
+                    st.error(f"An error occurred during OCR processing: {e}")
+
+with tab2:
+    uploaded_files = st.file_uploader("📂 Upload images or PDFs", type=["jpg", "jpeg", "png", "pdf"],
+                                      accept_multiple_files=True)
+    workers = st.slider("Documents converted in parallel", 1, MAX_WORKERS, DEFAULT_WORKERS)
+
+    if uploaded_files and st.button(f"Convert {len(uploaded_files)} Files"):
+        with st.spinner(f"Processing {len(uploaded_files)} files with Docling OCR..."):
+            results = convert_batch(converter, [(f.name, f.getvalue()) for f in uploaded_files], workers=workers)
+
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, markdown_text, error in results:
+                if error:
+                    st.error(f"❌ {name}: {error}")
+                    continue
+                zf.writestr(f"{os.path.splitext(name)[0]}.md", markdown_text)
+                with st.expander(f"✅ {name}"):
+                    st.markdown(markdown_text)
+        converted = sum(error is None for _, _, error in results)
+        st.success(f"🎉 Converted {converted}/{len(results)} files.")
+        if converted:
+            st.download_button(
+                label="📥 Download all as Markdown (zip)",
+                data=archive.getvalue(),
+                file_name="extracted_text.zip",
+                mime="application/zip"
+            )
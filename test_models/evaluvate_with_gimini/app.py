@@ -1,18 +1,32 @@
 import streamlit as st
 import google.generativeai as genai
-from PIL import Image
-import io
 import os
-import fitz  # PyMuPDF
-from markdownify import markdownify as md
 import re
+import sys
 import uuid
 
+# Make the shared essay_marking package importable under `streamlit run`
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+from essay_marking.cache import DiskCache
+from essay_marking.gemini import stream_transcription
+from essay_marking.images import prepare_image
+from essay_marking.scheduler import RateLimitScheduler, INTERACTIVE
+from essay_marking.scheme import convert_pdf_to_markdown_streaming, split_questions_to_folder
+
 # ===== CONFIGURATION =====
 MARKING_PDF = "marking.pdf"
 MARKING_MD = "marking.md"
+MARKING_IMAGES_FOLDER = "marking_images"
 QUESTIONS_FOLDER = "questions_md"
 STUDENT_ANSWERS_FOLDER = "student_answers_md"
+TRANSCRIPTION_CACHE = os.path.join(".cache", "transcriptions.sqlite")
+TRANSCRIBE_PROMPT = "This answers from students.Analyze the attached image and extract all handwritten text. Your primary objective is to accurately identify and transcribe only the content that is not marked for deletion. You must follow this strict rule: if any text, code, or paragraph has a visible line drawn through it, you are to completely and utterly ignore that content. Under no circumstances should any crossed-out material be included in your output. Transcribe the remaining, unmarked handwritten text as perfectly as possible, and present the final result using Markdown."
+# Opt-in: crossed-out writing is painted over locally (essay_marking.strikeout), so the prompt only needs a reminder
+MASK_STRIKEOUTS = False
+MASKED_TRANSCRIBE_PROMPT = ("This answers from students. Extract all handwritten text from this image as accurately as possible "
+                            "and format it as Markdown. Leave out any text that is still visibly crossed out.")
 
 # ===== INITIALIZE SESSION STATE =====
 if 'marking_md_content' not in st.session_state:
@@ -30,64 +44,35 @@ except KeyError:
     st.error("Gemini API key not found in secrets. Please add it to `D:\\Essay\\.streamlit\\secrets.toml`.")
     st.stop()
 
-model = genai.GenerativeModel("gemini-2.5-flash")
-
-# ===== PDF TO MARKDOWN CONVERSION =====
-def convert_pdf_to_markdown_html(pdf_path, md_path):
-    html_text = ""
-    with fitz.open(pdf_path) as doc:
-        for page in doc:
-            html_text += page.get_text("html")
-    markdown = md(html_text)
-    with open(md_path, 'w', encoding='utf-8') as f:
-        f.write(markdown)
-    return markdown
-
-def remove_gibberish(text):
-    lines = text.splitlines()
-    cleaned = [
-        line for line in lines
-        if not re.fullmatch(r"[A-Za-z0-9+/=]{30,}", line.strip())
-    ]
-    return "\n".join(cleaned)
-
-def split_questions_to_folder(markdown_path, output_folder):
-    with open(markdown_path, "r", encoding="utf-8") as f:
-        content = f.read()
-    cleaned_content = remove_gibberish(content)
-    questions = re.split(r"\b(Q\d{1,2})\.\s*", cleaned_content, flags=re.IGNORECASE)
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-    for i in range(1, len(questions), 2):
-        q_num = questions[i].strip().upper()
-        q_text = questions[i + 1].strip()
-        file_name = os.path.join(output_folder, f"{q_num}.md")
-        with open(file_name, "w", encoding="utf-8") as f:
-            f.write(f"### {q_num}\n\n{q_text}")
+@st.cache_resource
+def get_scheduler():
+    return RateLimitScheduler()
+
+# Rate-limited and retried on quota (429) / transient server errors
+model = get_scheduler().wrap(genai.GenerativeModel("gemini-2.5-flash"), priority=INTERACTIVE)
+
+# ===== TRANSCRIPTION CACHE =====
+@st.cache_resource
+def get_transcription_cache():
+    return DiskCache(TRANSCRIPTION_CACHE)
+
+transcription_cache = get_transcription_cache()
 
 # ===== IMAGE TO MARKDOWN CONVERSION =====
 
-def image_to_markdown(image):
+def image_to_markdown(image, prompt=TRANSCRIBE_PROMPT):
+    """Streams the transcript into the page as it arrives and returns the full text once complete."""
+    placeholder = st.empty()
     try:
-        img_data = io.BytesIO()
-        image.save(img_data, format="JPEG")
-        img_data.seek(0)
-        prompt = "This answers from students.Analyze the attached image and extract all handwritten text. Your primary objective is to accurately identify and transcribe only the content that is not marked for deletion. You must follow this strict rule: if any text, code, or paragraph has a visible line drawn through it, you are to completely and utterly ignore that content. Under no circumstances should any crossed-out material be included in your output. Transcribe the remaining, unmarked handwritten text as perfectly as possible, and present the final result using Markdown."
                 
         #prompt = "This answers from students. some words in answers can cut by students and ignore those cut words.Full paragraphs also can be cut by students then also ignore them.Only consider the not cut things by students.Those are handwritten text so that they can be messy unclear and many more corruptions.Extract them as much as perfect way. Extract all handwritten text from this image as accurately as possible and format it as Markdown."
-        response = model.generate_content(
-            [prompt, Image.open(img_data)],
-            stream=True
-        )
-        response.resolve()
-        extracted_text = ""
-        for chunk in response:
-            if chunk.text:
-                extracted_text += chunk.text
-        return extracted_text if extracted_text else None
+        with placeholder.container():
+            extracted_md = st.write_stream(stream_transcription(model, image, prompt, cache=transcription_cache))
     except Exception as e:
         st.error(f"Error processing image: {e}")
         return None
+    placeholder.empty()
+    return extracted_md or None
 
 
 
@@ -186,6 +171,12 @@ def evaluate_answer(marking_md, student_md, reg_number):
 st.set_page_config(page_title="Essay Paper Evaluation System", layout="wide")
 st.title("📝 Essay Paper Evaluation System")
 
+cache_stats = transcription_cache.stats()
+st.sidebar.caption(
+    f"Transcription cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+    f"{cache_stats['entries']} entries ({cache_stats['bytes'] / 1024:.0f} KB)"
+)
+
 marking_pdf = st.file_uploader("Upload Marking Scheme PDF", type="pdf")
 
 # Save PDF in session but delay processing
@@ -200,7 +191,7 @@ if st.button("💾 Save Model Answers"):
             f.write(st.session_state.uploaded_marking_pdf.read())
 
         # Process to markdown and split
-        marking_md_content = convert_pdf_to_markdown_html(MARKING_PDF, MARKING_MD)
+        marking_md_content = convert_pdf_to_markdown_streaming(MARKING_PDF, MARKING_MD, image_dir=MARKING_IMAGES_FOLDER)
         split_questions_to_folder(MARKING_MD, QUESTIONS_FOLDER)
         st.session_state.marking_md_content = marking_md_content
 
@@ -225,8 +216,11 @@ if st.button("💾 Save Model Answers"):
 # Section 2: Upload Student Answer Image
 st.header("Upload Student Answer")
 student_image = st.file_uploader("Upload Student Answer Image", type=["jpg", "jpeg", "png"])
+mask_strikes = st.checkbox("Mask crossed-out writing before sending", value=MASK_STRIKEOUTS,
+                           help="Masked regions are outlined in red on the uploaded image.")
 if student_image:
-    image = Image.open(student_image).convert("RGB")
+    # Decoded, oriented and downscaled once; the JPEG bytes are what Gemini receives
+    image, image_bytes = prepare_image(student_image, mask_strikes=mask_strikes)
     
     # Create two columns
     col1, col2 = st.columns(2)
@@ -237,7 +231,8 @@ if student_image:
     with col2:
         if st.button("Extract Text from Image"):
             with st.spinner("Extracting text..."):
-                extracted_md = image_to_markdown(image)
+                extracted_md = image_to_markdown(image_bytes,
+                                                 MASKED_TRANSCRIBE_PROMPT if mask_strikes else TRANSCRIBE_PROMPT)
                 if extracted_md:
                     match = re.search(r"Reg\s*Number:\s*\$([^\n\r]+)", extracted_md, re.IGNORECASE)
                     if match:
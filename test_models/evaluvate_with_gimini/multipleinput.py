@@ -1,26 +1,63 @@
 import streamlit as st
 import google.generativeai as genai
-from PIL import Image
-import io
+import math
 import os
-import fitz  # PyMuPDF
-from markdownify import markdownify as md
-import re
+import sys
 import uuid
 
+# Make the shared essay_marking package importable under `streamlit run`
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+from essay_marking.batch import DEFAULT_MAX_IN_FLIGHT, DEFAULT_REQUEST_TIMEOUT
+from essay_marking.cache import DiskCache
+from essay_marking.gemini import stream_transcription
+from essay_marking.images import prepare_image
+from essay_marking.jobstore import JobStore
+from essay_marking.scheduler import RateLimitScheduler, INTERACTIVE, DEFAULT_RPM, DEFAULT_TPM
+from essay_marking.scores import ScoreStore
+from essay_marking.scheme import convert_pdf_to_markdown_streaming, split_questions_to_folder
+from essay_marking.students import find_reg_number, save_transcript
+from essay_marking.tracing import configure, summarize_file, trace
+from essay_marking.worker import start_workers, submit
+
 # ===== CONFIGURATION =====
 MARKING_PDF = "marking.pdf"
 MARKING_MD = "marking.md"
+MARKING_IMAGES_FOLDER = "marking_images"
 QUESTIONS_FOLDER = "questions_md"
 STUDENT_ANSWERS_FOLDER = "student_answers_md"
+TRANSCRIBE_PROMPT = "Extract all handwritten text from this image as accurately as possible and format it as Markdown."
+MAX_IN_FLIGHT = DEFAULT_MAX_IN_FLIGHT  # concurrent Gemini requests in batch mode
+REQUEST_TIMEOUT = DEFAULT_REQUEST_TIMEOUT  # seconds per Gemini request
+REQUESTS_PER_MINUTE = DEFAULT_RPM  # Gemini quota shared by all requests from this app
+TOKENS_PER_MINUTE = DEFAULT_TPM
+TRANSCRIPTION_CACHE = os.path.join(".cache", "transcriptions.sqlite")
+EVALUATION_CACHE = os.path.join(".cache", "evaluations.sqlite")  # per scheme section + answer; re-marking skips unchanged questions
+REG_MODEL_DIR = os.path.join(REPO_ROOT, "test_models", "Reg_Ditection", "trocr-finetuned")
+REG_MIN_CONFIDENCE = 0.8  # local reg-number readings below this are not trusted
+JOB_STORE = "marking_jobs.sqlite"  # students, transcripts, evaluations and jobs; survives refreshes and restarts
+SCORES_DB = JOB_STORE
+PAGE_SIZE = 25
+WORKER_PROCESSES = 2  # background processes running folder transcription and evaluation jobs
+INTERACTIVE_SHARE = 0.2  # part of the Gemini quota kept for single-image requests made by the app itself
+JOB_POLL_SECONDS = 2
+SCANS_FOLDER = "scans"  # uploaded multi-page PDF scans, read by the workers
+TRACE_FILE = os.path.join(".cache", "traces.jsonl")  # stage timings of the app and the workers, per script/answer
+PROFILE_DIR = os.path.join(".cache", "profiles")  # cProfile output of jobs submitted with "Profile submitted jobs"
+TIMINGS_POLL_SECONDS = 10
 
 # ===== INITIALIZE SESSION STATE =====
+# Students, transcripts and evaluations live in the job store; only the
+# marking scheme text is kept per session (reloaded from MARKING_MD).
+# Jobs are listed per marker, so a refreshed page finds its jobs again.
+if 'marker' not in st.session_state:
+    st.session_state.marker = f"session-{uuid.uuid4().hex[:8]}"
 if 'marking_md_content' not in st.session_state:
     st.session_state.marking_md_content = ""
-if 'student_md_files' not in st.session_state:
-    st.session_state.student_md_files = {}
-if 'evaluation_results' not in st.session_state:
-    st.session_state.evaluation_results = {}
+    if os.path.exists(MARKING_MD):
+        with open(MARKING_MD, "r", encoding="utf-8") as f:
+            st.session_state.marking_md_content = f.read()
 
 # ===== GEMINI API SETUP =====
 try:
@@ -30,184 +67,165 @@ except KeyError:
     st.error("Gemini API key not found in secrets. Please add it to `D:\\Essay\\.streamlit\\secrets.toml`.")
     st.stop()
 
-model = genai.GenerativeModel("gemini-2.5-flash")
-
-# ===== PDF TO MARKDOWN CONVERSION =====
-def convert_pdf_to_markdown_html(pdf_path, md_path):
-    html_text = ""
-    with fitz.open(pdf_path) as doc:
-        for page in doc:
-            html_text += page.get_text("html")
-    markdown = md(html_text)
-    with open(md_path, 'w', encoding='utf-8') as f:
-        f.write(markdown)
-    return markdown
-
-def remove_gibberish(text):
-    lines = text.splitlines()
-    cleaned = [
-        line for line in lines
-        if not re.fullmatch(r"[A-Za-z0-9+/=]{30,}", line.strip())
-    ]
-    return "\n".join(cleaned)
-
-def split_questions_to_folder(markdown_path, output_folder):
-    with open(markdown_path, "r", encoding="utf-8") as f:
-        content = f.read()
-    cleaned_content = remove_gibberish(content)
-    questions = re.split(r"\b(Q\d{1,2})\.\s*", cleaned_content, flags=re.IGNORECASE)
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-    for i in range(1, len(questions), 2):
-        q_num = questions[i].strip().upper()
-        q_text = questions[i + 1].strip()
-        file_name = os.path.join(output_folder, f"{q_num}.md")
-        with open(file_name, "w", encoding="utf-8") as f:
-            f.write(f"### {q_num}\n\n{q_text}")
+# ===== RATE-LIMITED MODEL =====
+# Single-image transcription runs in the app; everything else is queued for
+# the background workers, which get the rest of the quota.
+@st.cache_resource
+def get_scheduler():
+    return RateLimitScheduler(rpm=REQUESTS_PER_MINUTE * INTERACTIVE_SHARE, tpm=TOKENS_PER_MINUTE * INTERACTIVE_SHARE)
+
+scheduler = get_scheduler()
+model = scheduler.wrap(genai.GenerativeModel("gemini-2.5-flash"), priority=INTERACTIVE)
+
+# ===== TRACING =====
+configure(TRACE_FILE)
+
+# ===== TRANSCRIPTION CACHE =====
+@st.cache_resource
+def get_transcription_cache():
+    return DiskCache(TRANSCRIPTION_CACHE)
+
+transcription_cache = get_transcription_cache()
+
+# Filled by the workers; opened here only to show its size
+@st.cache_resource
+def get_evaluation_cache():
+    return DiskCache(EVALUATION_CACHE)
+
+evaluation_cache = get_evaluation_cache()
+
+@st.cache_resource
+def get_score_store():
+    return ScoreStore(SCORES_DB)
+
+score_store = get_score_store()
+
+# ===== JOB STORE =====
+@st.cache_resource
+def get_job_store():
+    store = JobStore(JOB_STORE)
+    store.import_transcripts(STUDENT_ANSWERS_FOLDER, find_reg_number)  # transcripts from earlier versions
+    return store
+
+job_store = get_job_store()
+
+# ===== BACKGROUND WORKERS =====
+@st.cache_resource
+def get_workers():
+    """Starts the worker processes once per server; they poll JOB_STORE for queued jobs."""
+    settings = {
+        "api_key": gemini_api_key,
+        "rpm": REQUESTS_PER_MINUTE * (1 - INTERACTIVE_SHARE),
+        "tpm": TOKENS_PER_MINUTE * (1 - INTERACTIVE_SHARE),
+        "max_in_flight": MAX_IN_FLIGHT,
+        "timeout": REQUEST_TIMEOUT,
+        "transcribe_prompt": TRANSCRIBE_PROMPT,
+        "transcription_cache": TRANSCRIPTION_CACHE,
+        "evaluation_cache": EVALUATION_CACHE,
+        "student_answers_folder": STUDENT_ANSWERS_FOLDER,
+        "marking_md": MARKING_MD,
+        "questions_folder": QUESTIONS_FOLDER,
+        "reg_model_dir": REG_MODEL_DIR,
+        "reg_min_confidence": REG_MIN_CONFIDENCE,
+        "trace_file": TRACE_FILE,
+        "profile_dir": PROFILE_DIR,
+    }
+    return start_workers(JOB_STORE, settings, processes=WORKER_PROCESSES)
+
+get_workers()
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def jobs_panel():
+    """Progress of this marker's recent jobs, refreshed without rerunning the page."""
+    jobs = job_store.list_jobs(limit=5, owner=st.session_state.marker)
+    if not jobs:
+        st.caption("No jobs yet.")
+    for job in jobs:
+        payload, result = job["payload"], job["result"] or {}
+        target = payload.get("folder") or ", ".join(payload.get("paths", [])) or payload.get("safe_reg", "")
+        label = f"#{job['id']} {job['kind']} {target}: {job['status']}"
+        if job["status"] == "failed":
+            st.error(f"{label} – {job['error']}")
+        elif job["total"]:
+            st.progress(job["done"] / job["total"], text=f"{label} ({job['done']}/{job['total']})")
+        else:
+            st.caption(label)
+        if result.get("log"):
+            with st.expander("Log", expanded=job["status"] == "running"):
+                st.text("\n".join(result["log"]))
+
+@st.fragment(run_every=TIMINGS_POLL_SECONDS)
+def timings_panel():
+    """Per-stage latency of the latest traces written by the app and the workers."""
+    timings = summarize_file(TRACE_FILE)
+    if not timings["kinds"]:
+        st.caption("No traces yet.")
+        return
+    st.dataframe(timings["kinds"], hide_index=True, use_container_width=True)
+    st.dataframe(timings["stages"], hide_index=True, use_container_width=True,
+                 column_config={name: st.column_config.NumberColumn(format="%.3f s")
+                                for name in ("seconds", "p50", "p95")})
+    st.caption(", ".join(f"{name}: {value:,}" for name, value in sorted(timings["counters"].items())))
+
+def store_transcript(safe_reg_number, reg_number, extracted_md, source=None):
+    """Saves a transcript to STUDENT_ANSWERS_FOLDER (as before) and to the job store."""
+    save_transcript(STUDENT_ANSWERS_FOLDER, safe_reg_number, extracted_md)
+    job_store.save_transcript(safe_reg_number, reg_number, extracted_md, source=source)
+
+def student_picker(label, key, evaluated_only=False):
+    """Searchable, paginated student selectbox; only one page of ids is loaded."""
+    search_col, page_col = st.columns([3, 1])
+    search = search_col.text_input("Registration number starts with", key=f"{key}_search").strip()
+    total = job_store.count_evaluations(search) if evaluated_only else job_store.count_students(search)
+    pages = max(1, math.ceil(total / PAGE_SIZE))
+    page = page_col.number_input(f"Page (of {pages})", 1, pages, 1, key=f"{key}_page")
+    students = job_store.list_students((page - 1) * PAGE_SIZE, PAGE_SIZE, search, evaluated_only=evaluated_only)
+    names = {s["safe_reg"]: s["reg_number"] + (" ✅" if s["evaluated_at"] else "") for s in students}
+    st.caption(f"{total} students")
+    return st.selectbox(label, list(names), format_func=names.get, key=key)
 
 # ===== IMAGE TO MARKDOWN CONVERSION =====
 
 def image_to_markdown(image):
+    """Streams the transcript into the page as it arrives and returns the full text once complete."""
+    placeholder = st.empty()
     try:
-        img_data = io.BytesIO()
-        image.save(img_data, format="JPEG")
-        img_data.seek(0)
-        prompt = "Extract all handwritten text from this image as accurately as possible and format it as Markdown."
-        response = model.generate_content(
-            [prompt, Image.open(img_data)],
-            stream=True
-        )
-        response.resolve()
-        extracted_text = ""
-        for chunk in response:
-            if chunk.text:
-                extracted_text += chunk.text
-        return extracted_text if extracted_text else None
+        with placeholder.container():
+            extracted_md = st.write_stream(stream_transcription(model, image, TRANSCRIBE_PROMPT,
+                                                                timeout=REQUEST_TIMEOUT, cache=transcription_cache))
     except Exception as e:
         st.error(f"Error processing image: {e}")
         return None
-
-# ===== BATCH PROCESSING FUNCTION =====
-def image_folder_to_markdown(folder_path):
-    """
-    Processes all image files in a given folder, extracts text using Gemini API,
-    and saves the output to a student answers folder.
-    """
-    if not os.path.exists(folder_path):
-        st.error(f"The specified folder path does not exist: {folder_path}")
-        return
-
-    image_files = [f for f in os.listdir(folder_path) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-
-    if not image_files:
-        st.warning(f"No image files found in the folder: {folder_path}")
-        return
-
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-
-    for i, filename in enumerate(image_files):
-        image_path = os.path.join(folder_path, filename)
-        status_text.text(f"Processing image {i+1}/{len(image_files)}: {filename}")
-        
-        try:
-            image = Image.open(image_path).convert("RGB")
-            extracted_md = image_to_markdown(image)
-
-            if extracted_md:
-                # Find registration number from extracted text
-                match = re.search(r"Reg\s*Number:\s*\$([^\n\r]+)", extracted_md, re.IGNORECASE)
-                if match:
-                    reg_number_raw = match.group(1)
-                    reg_number = reg_number_raw.replace(" ", "")
-                    safe_reg_number = reg_number.replace("/", "_").replace("\\", "_")
-
-                    if not os.path.exists(STUDENT_ANSWERS_FOLDER):
-                        os.makedirs(STUDENT_ANSWERS_FOLDER)
-                    
-                    md_path = os.path.join(STUDENT_ANSWERS_FOLDER, f"{safe_reg_number}.md")
-                    with open(md_path, "w", encoding="utf-8") as f:
-                        f.write(extracted_md)
-                    
-                    st.session_state.student_md_files[safe_reg_number] = extracted_md
-                    st.success(f"✅ Extracted text from {filename} for Reg. No. {reg_number} and saved.")
-                else:
-                    st.warning(f"⚠️ Could not find a registration number in {filename}. Skipping save.")
-            else:
-                st.error(f"❌ Failed to extract text from {filename}.")
-        
-        except Exception as e:
-            st.error(f"An error occurred while processing {filename}: {e}")
-
-        # Update progress bar
-        progress = (i + 1) / len(image_files)
-        progress_bar.progress(progress)
-    
-    st.success("🎉 Batch processing complete!")
-    progress_bar.empty()
-    status_text.empty()
-    st.rerun() # Rerun to update the selectbox with new files
-
-
-# ===== EVALUATION FUNCTION =====
-def evaluate_answer(marking_md, student_md, reg_number):
-    try:
-        prompt = f"""
-        You are an academic evaluator. Below are two sections:
-        1. **Marking Scheme** – contains expected answer points for an essay, each followed by the mark allocation (e.g., [4 Marks]).
-        2. **Student Answer** – the student's response to the same question.
-
-        ---
-
-        ### 🎯 TASK:
-        Evaluate the student’s response against **each marking point**, using the mark allocation provided. For each point, identify whether it is:
-
-        - ✅ Fully covered – award **full marks**
-        - ⚠️ Partially covered – award **half marks**
-        - ❌ Not covered – award **zero marks**
-
-        ---
-
-        ### 📝 Evaluation Format (Strictly follow):
-
-        **Point**: *<Copied from marking scheme>*
-        - **Allocated**: [X Marks]
-        - **Evaluation**: ✅ / ⚠️ / ❌
-        - **Awarded**: X / (X/2) / 0
-        - **Comment**: <Why it was awarded that way>
-
-        Do this for every point mentioned in the marking scheme.
-
-        ---
-
-        ### 📊 Final Summary:
-
-        - Total Allocated: XX Marks
-        - ✅ Full Marks Awarded: XX
-        - ⚠️ Half Marks Awarded: XX
-        - ❌ Zero Marks: XX
-        - **Total Awarded**: XX Marks
-
-        ---
-
-        ### 📚 Marking Scheme:
-        {marking_md}
-
-        ---
-
-        ### ✍️ Student Answer:
-        {student_md}
-        """
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        st.error(f"Error evaluating answer: {e}")
-        return None
+    placeholder.empty()
+    return extracted_md or None
 
 # ===== STREAMLIT INTERFACE =====
 st.set_page_config(page_title="Essay Paper Evaluation System", layout="wide")
 st.title("📝 Essay Paper Evaluation System")
 
+cache_stats = transcription_cache.stats()
+st.sidebar.caption(
+    f"Transcription cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+    f"{cache_stats['entries']} entries ({cache_stats['bytes'] / 1024:.0f} KB)"
+)
+evaluation_stats = evaluation_cache.stats()
+st.sidebar.caption(f"Evaluation cache: {evaluation_stats['entries']} evaluations "
+                   f"({evaluation_stats['bytes'] / 1024:.0f} KB)")
+scheduler_stats = scheduler.metrics()
+st.sidebar.caption(
+    f"Gemini scheduler: {scheduler_stats['queue_depth']} queued, {scheduler_stats['in_flight']} in flight, "
+    f"{scheduler_stats['retries']} retries ({scheduler_stats['throttled']} rate-limited), "
+    f"wait p95 {scheduler_stats['wait_p95']:.1f}s"
+)
+st.sidebar.text_input("Marker name", key="marker", help="Jobs submitted under this name are listed below.")
+st.sidebar.checkbox("Profile submitted jobs", key="profile_jobs",
+                    help=f"Runs new jobs under cProfile; the stats are saved to {PROFILE_DIR}.")
+with st.sidebar:
+    st.subheader("Jobs")
+    jobs_panel()
+    with st.expander("⏱️ Pipeline timings"):
+        timings_panel()
+
 # Section 1: Upload Marking Scheme PDF
 st.header("1. Upload Marking Scheme")
 marking_pdf = st.file_uploader("Upload Marking Scheme PDF", type="pdf")
@@ -221,8 +239,9 @@ if st.button("💾 Save Model Answers"):
         with open(MARKING_PDF, "wb") as f:
             f.write(st.session_state.uploaded_marking_pdf.read())
         
-        marking_md_content = convert_pdf_to_markdown_html(MARKING_PDF, MARKING_MD)
-        split_questions_to_folder(MARKING_MD, QUESTIONS_FOLDER)
+        with trace("scheme", source=st.session_state.uploaded_marking_pdf.name):
+            marking_md_content = convert_pdf_to_markdown_streaming(MARKING_PDF, MARKING_MD, image_dir=MARKING_IMAGES_FOLDER)
+            split_questions_to_folder(MARKING_MD, QUESTIONS_FOLDER)
         st.session_state.marking_md_content = marking_md_content
         
         st.success("✅ Model answers saved and split into individual question files.")
@@ -232,13 +251,14 @@ if st.button("💾 Save Model Answers"):
 # Section 2: Upload and Process Student Answers
 st.header("2. Upload and Process Student Answers")
 
-tab1, tab2 = st.tabs(["Upload Single Image", "Process a Folder of Images"])
+tab1, tab2, tab3 = st.tabs(["Upload Single Image", "Process a Folder of Images", "Process Scanned PDFs"])
 
 with tab1:
     st.subheader("Upload a single image of a student's answer")
     student_image = st.file_uploader("Upload Student Answer Image", type=["jpg", "jpeg", "png"])
     if student_image:
-        image = Image.open(student_image).convert("RGB")
+        # Decoded, oriented and downscaled once; the JPEG bytes are what Gemini receives
+        image, image_bytes = prepare_image(student_image)
         col1, col2 = st.columns(2)
         
         with col1:
@@ -246,21 +266,12 @@ with tab1:
         
         with col2:
             if st.button("Extract Text from Single Image"):
-                with st.spinner("Extracting text..."):
-                    extracted_md = image_to_markdown(image)
+                with st.spinner("Extracting text..."), trace("transcribe", source=student_image.name):
+                    extracted_md = image_to_markdown(image_bytes)
                     if extracted_md:
-                        match = re.search(r"Reg\s*Number:\s*\$([^\n\r]+)", extracted_md, re.IGNORECASE)
-                        if match:
-                            reg_number_raw = match.group(1)
-                            reg_number = reg_number_raw.replace(" ", "")
-                            safe_reg_number = reg_number.replace("/", "_").replace("\\", "_")
-                            if not os.path.exists(STUDENT_ANSWERS_FOLDER):
-                                os.makedirs(STUDENT_ANSWERS_FOLDER)
-                            md_path = os.path.join(STUDENT_ANSWERS_FOLDER, f"{safe_reg_number}.md")
-                            with open(md_path, "w", encoding="utf-8") as f:
-                                f.write(extracted_md)
-
-                            st.session_state.student_md_files[safe_reg_number] = extracted_md
+                        reg_number, safe_reg_number = find_reg_number(extracted_md)
+                        if reg_number:
+                            store_transcript(safe_reg_number, reg_number, extracted_md, source=student_image.name)
                             st.markdown(f"### 📄 Extracted Text (Reg: {reg_number})")
                             st.markdown(extracted_md)
                         else:
@@ -268,32 +279,75 @@ with tab1:
 with tab2:
     st.subheader("Process a folder of student answer images")
     image_folder_path = st.text_input("Enter the folder path containing the images:")
+    local_reg = st.checkbox("Read registration numbers locally first (TrOCR)", value=False)
+    skip_existing = st.checkbox("Skip students that already have a transcript", value=False, disabled=not local_reg)
     if st.button("🚀 Process All Images in Folder"):
         if image_folder_path:
-            image_folder_to_markdown(image_folder_path)
+            job_id = submit(job_store, "transcribe_folder",
+                            {"folder": image_folder_path, "local_reg": local_reg, "skip_existing": skip_existing,
+                             "profile": st.session_state.profile_jobs},
+                            owner=st.session_state.marker)
+            st.success(f"✅ Job #{job_id} queued; progress is shown in the sidebar.")
         else:
             st.warning("Please enter a valid folder path.")
 
+with tab3:
+    st.subheader("Process multi-page PDF scans (e.g. a whole exam hall)")
+    st.caption("Pages are grouped into students by the registration number in their headers; "
+               "pages without one continue the script before them.")
+    scan_pdfs = st.file_uploader("Upload scanned PDFs", type="pdf", accept_multiple_files=True)
+    scan_path = st.text_input("...or enter a PDF or folder path on the server:")
+    if st.button("🚀 Process Scans"):
+        paths = [scan_path] if scan_path else []
+        for scan_pdf in scan_pdfs or []:
+            os.makedirs(SCANS_FOLDER, exist_ok=True)
+            saved_path = os.path.join(SCANS_FOLDER, scan_pdf.name)
+            with open(saved_path, "wb") as f:
+                f.write(scan_pdf.getbuffer())
+            paths.append(saved_path)
+        if paths:
+            job_id = submit(job_store, "ingest_scan", {"paths": paths, "profile": st.session_state.profile_jobs},
+                            owner=st.session_state.marker)
+            st.success(f"✅ Job #{job_id} queued; progress is shown in the sidebar.")
+        else:
+            st.warning("Please upload a PDF or enter a path.")
+
 # Section 3: Evaluate Student Answer
 st.header("3. Evaluate Student Answer")
-if st.session_state.marking_md_content and st.session_state.student_md_files:
-    selected_reg = st.selectbox("Select Student Registration Number", list(st.session_state.student_md_files.keys()))
+if st.session_state.marking_md_content and job_store.count_students():
+    selected_reg = student_picker("Select Student Registration Number", "evaluate_select")
+    scoring_mode = st.radio("Scoring mode", ["Per question", "Full marking scheme"], horizontal=True,
+                            help="Per question sends each answer section with only its own scheme from questions_md.")
+    structured = st.checkbox("Structured scores (JSON)", value=True,
+                             help="Validated per-point marks, saved to the score store for cohort statistics.")
+    st.caption("Questions already marked against the same scheme section are reused from the evaluation cache.")
     if selected_reg and st.button("Evaluate Answer"):
-        with st.spinner("Evaluating..."):
-            student_md = st.session_state.student_md_files[selected_reg]
-            evaluation = evaluate_answer(st.session_state.marking_md_content, student_md, selected_reg)
-            if evaluation:
-                st.session_state.evaluation_results[selected_reg] = evaluation
-                st.subheader(f"Evaluation Results (Reg: {selected_reg})")
-                st.markdown(evaluation)
+        job_id = submit(job_store, "evaluate",
+                        {"safe_reg": selected_reg, "per_question": scoring_mode == "Per question",
+                         "structured": structured, "profile": st.session_state.profile_jobs},
+                        owner=st.session_state.marker)
+        st.success(f"✅ Evaluation job #{job_id} queued; the report appears in Section 4 when it is done.")
 elif not st.session_state.marking_md_content:
     st.warning("⚠️ Please upload and save the marking scheme PDF first (Section 1).")
-elif not st.session_state.student_md_files:
+else:
     st.warning("⚠️ Please upload or process student answer images first (Section 2).")
 
 # Section 4: View Previous Evaluations
 st.header("4. View Previous Evaluations")
-if st.session_state.evaluation_results:
-    view_reg = st.selectbox("Select Student to View Evaluation", list(st.session_state.evaluation_results.keys()), key="view_evaluation_select")
+if job_store.count_evaluations():
+    view_reg = student_picker("Select Student to View Evaluation", "view_evaluation_select", evaluated_only=True)
     if view_reg:
-        st.markdown(st.session_state.evaluation_results[view_reg])
\ No newline at end of file
+        evaluation = job_store.get_evaluation(view_reg)
+        st.caption(f"{evaluation['mode']} evaluation")
+        st.markdown(evaluation["report"])
+
+# Section 5: Cohort Statistics
+st.header("5. Cohort Statistics")
+question_summary = score_store.question_summary()
+if question_summary:
+    st.subheader("Per question")
+    st.dataframe(question_summary, use_container_width=True)
+    st.subheader("Per student")
+    st.dataframe(score_store.student_totals(), use_container_width=True)
+else:
+    st.info("No structured scores yet. Evaluate with 'Structured scores (JSON)' enabled.")
@@ -2,6 +2,14 @@ import streamlit as st
 from PIL import Image
 import torch
 from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+import os
+import sys
+
+# Make the shared essay_marking package importable under `streamlit run`
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+from essay_marking.trocr import crop_lines, recognize_lines, segment_lines
 
 # Streamlit UI setup
 st.set_page_config(page_title="📝 Handwritten OCR with TrOCR", layout="centered")
@@ -13,6 +21,7 @@ st.markdown("Extract handwritten text from images using **Microsoft TrOCR**")
 def load_model():
     processor = TrOCRProcessor.from_pretrained("microsoft/trocr-base-handwritten")
     model = VisionEncoderDecoderModel.from_pretrained("microsoft/trocr-base-handwritten")
+    model.eval()
     return processor, model
 
 processor, model = load_model()
@@ -24,11 +33,12 @@ if uploaded_file:
     image = Image.open(uploaded_file).convert("RGB")
     st.image(image, caption="📸 Uploaded Image", use_container_width=True)
 
-    # Run TrOCR
+    # Run TrOCR: it reads one line at a time, so split the page into lines and batch them
     with st.spinner("🔍 Extracting text..."):
-        pixel_values = processor(images=image, return_tensors="pt").pixel_values
-        generated_ids = model.generate(pixel_values)
-        output_text = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
+        boxes = segment_lines(image)
+        crops = crop_lines(image, boxes) if boxes else [image]
+        output_text = "\n".join(recognize_lines(processor, model, crops))
+    st.caption(f"{len(crops)} text line(s) detected")
 
     # Display result
     st.subheader("🧠 Extracted Text:")
@@ -0,0 +1,57 @@
+import streamlit as st
+from PIL import Image
+import os
+import sys
+
+# Make the shared essay_marking package importable under `streamlit run`
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+from essay_marking.ocr_backends import BACKENDS, backend_from_config
+
+# ===== CONFIGURATION =====
+# One entry per selectable engine; options are passed to the backend class
+OCR_BACKENDS = {
+    "gemini": {"backend": "gemini"},
+    "trocr": {"backend": "trocr", "model_dir": "microsoft/trocr-base-handwritten"},
+    "trocr-t5": {"backend": "trocr-t5"},
+    "deepseek-vl": {"backend": "deepseek-vl"},
+    "tesseract": {"backend": "tesseract"},
+    "docling": {"backend": "docling"},
+}
+DEFAULT_BACKEND = "trocr"
+
+st.set_page_config(page_title="📝 Handwritten OCR", layout="centered")
+st.title("🖋️ Handwritten Image to Text Converter")
+
+backend_name = st.sidebar.selectbox("OCR backend", list(OCR_BACKENDS), index=list(OCR_BACKENDS).index(DEFAULT_BACKEND))
+
+# Load each backend's models once per server process
+@st.cache_resource
+def get_backend(name):
+    config = dict(OCR_BACKENDS[name])
+    if config["backend"] == "gemini":
+        config["api_key"] = st.secrets["gemini"]["API_KEY"]
+    backend = backend_from_config(config)
+    backend.load()
+    return backend
+
+uploaded_files = st.file_uploader("Upload handwritten images", type=["jpg", "jpeg", "png"], accept_multiple_files=True)
+
+if uploaded_files:
+    images = [Image.open(f).convert("RGB") for f in uploaded_files]
+    if st.button(f"🔍 Extract Text with {backend_name}"):
+        try:
+            with st.spinner(f"Loading {backend_name}..."):
+                backend = get_backend(backend_name)
+            with st.spinner(f"🔍 Extracting text from {len(images)} image(s)..."):
+                texts = backend.transcribe(images)
+        except Exception as e:
+            st.error(f"An error occurred: {e}")
+            st.stop()
+
+        for uploaded_file, image, text in zip(uploaded_files, images, texts):
+            st.image(image, caption=f"📸 {uploaded_file.name}", use_container_width=True)
+            st.text_area("Result", text, height=200, key=f"result_{uploaded_file.name}")
+
+st.sidebar.caption(f"Available backends: {', '.join(sorted(BACKENDS))}")
@@ -0,0 +1,35 @@
+import json
+
+from essay_marking.batch_scoring import PACKED_TEMPLATE, score_cohort
+from essay_marking.cache import DiskCache
+from essay_marking.evaluation import evaluation_key
+from essay_marking.fake_gemini import FakeGenerativeModel
+
+SCHEME = "1. Explains the loop condition. [2 Marks]"
+SCORE = {"points": [{"point": "Explains the loop condition", "allocated": 2, "verdict": "full", "awarded": 2,
+                     "comment": "Covered."}], "total_allocated": 2, "total_awarded": 2}
+
+
+def packed_fails(parts):
+    """Unusable packed replies; single structured requests get a valid score."""
+    text = "".join(part for part in parts if isinstance(part, str))
+    return "not json" if "Student S1" in text else json.dumps(SCORE)
+
+
+def test_failed_pack_falls_back_to_single_evaluations(tmp_path):
+    model = FakeGenerativeModel([packed_fails], delay=0)
+    pairs = [(SCHEME, f"Answer of student {n}") for n in range(3)]
+    results = score_cohort(model, pairs, cache=DiskCache(str(tmp_path / "cache.sqlite")))
+    assert [r.ok for r in results] == [True, True, True]
+    assert results[0].value["total_awarded"] == 2
+
+
+def test_packed_scores_are_cached_under_their_own_template(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"))
+    reply = json.dumps({"students": [{"student": "S1", **SCORE}, {"student": "S2", **SCORE}]})
+    model = FakeGenerativeModel([reply], delay=0)
+    pairs = [(SCHEME, "First answer"), (SCHEME, "Second answer")]
+    score_cohort(model, pairs, cache=cache)
+    for pair in pairs:
+        assert cache.get(evaluation_key(*pair, model.model_name, structured=True, template=PACKED_TEMPLATE))
+        assert cache.get(evaluation_key(*pair, model.model_name, structured=True)) is None
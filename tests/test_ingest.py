@@ -0,0 +1,14 @@
+import pytest
+
+pytest.importorskip("fitz")
+
+from essay_marking.ingest import Page, assemble_scripts
+
+
+def test_failed_page_breaks_the_script():
+    pages = [Page("hall.pdf", n) for n in range(1, 6)]
+    transcripts = ["Reg Number: $EG/2020/0001\nAnswer 1", "more of answer 1", None,
+                   "continuation of an unknown script", "Reg Number: $EG/2020/0002\nAnswer 2"]
+    students, unassigned = assemble_scripts(pages, transcripts)
+    assert [s["pages"] for s in students.values()] == [["hall.pdf p1", "hall.pdf p2"], ["hall.pdf p5"]]
+    assert unassigned == ["hall.pdf p3", "hall.pdf p4"]
@@ -0,0 +1,32 @@
+import time
+
+from essay_marking.jobstore import JobStore
+
+
+def test_requeue_stale_spares_jobs_of_live_workers(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    live = store.create_job("evaluate", {"safe_reg": "A"})
+    dead = store.create_job("evaluate", {"safe_reg": "B"})
+    store.claim_job("host:1")
+    store.claim_job("host:2")
+    store.heartbeat("host:1")
+    store.heartbeat("host:2")
+    # No progress from either job for an hour; only host:2 has stopped beating
+    store._write("UPDATE jobs SET updated_at = ?", (time.time() - 3600,))
+    store._write("UPDATE workers SET heartbeat = ? WHERE id = 'host:2'", (time.time() - 3600,))
+
+    assert store.requeue_stale(600) == 1
+    assert store.get_job(live)["status"] == "running"
+    assert store.get_job(dead)["status"] == "queued"
+
+
+def test_student_search_treats_wildcards_literally(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    store.save_transcript("EG_2020_1", "EG_2020_1", "a")
+    store.save_transcript("EGX2020_2", "EGX2020_2", "b")
+    store.save_transcript("EG%1", "EG%1", "c")
+
+    assert [s["reg_number"] for s in store.list_students(search="EG_")] == ["EG_2020_1"]
+    assert store.count_students(search="eg_") == 1
+    assert store.count_students(search="EG%") == 1
+    assert store.count_students(search="EG") == 3
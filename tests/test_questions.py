@@ -0,0 +1,11 @@
+from essay_marking.questions import load_question_schemes, split_answer_by_question
+
+
+def test_zero_padded_scheme_files_match_answer_headings(tmp_path):
+    (tmp_path / "Q01.md").write_text("### Q01\n\nDefine entropy.", encoding="utf-8")
+    (tmp_path / "q2.md").write_text("### Q2\n\nState Ohm's law.", encoding="utf-8")
+    schemes = load_question_schemes(str(tmp_path))
+    assert list(schemes) == ["Q1", "Q2"]
+
+    sections = split_answer_by_question("EG/2020/3905\n\nQ1. Disorder.\n\n**Question 02)** V = IR", schemes)
+    assert sections == {"Q1": "Disorder.", "Q2": "V = IR"}
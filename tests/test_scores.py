@@ -0,0 +1,17 @@
+from essay_marking.scores import ScoreStore
+
+
+def score(*marks):
+    points = [{"point": f"P{i}", "allocated": m, "verdict": "full", "awarded": m, "comment": ""}
+              for i, m in enumerate(marks)]
+    return {"points": points, "total_allocated": sum(marks), "total_awarded": sum(marks)}
+
+
+def test_rescoring_in_another_mode_replaces_the_student(tmp_path):
+    store = ScoreStore(str(tmp_path / "scores.sqlite"))
+    store.save_student("R1", {"ALL": score(4, 6)})
+    store.save_student("R1", {"Q1": score(4), "Q2": score(6)})
+    assert store.student_totals() == [{"reg_number": "R1", "questions": 2, "allocated": 10.0, "awarded": 10.0,
+                                       "percent": 100.0}]
+    store.save_student("R1", {"Q1": score(4)})
+    assert [row["question"] for row in store.question_summary()] == ["Q1"]
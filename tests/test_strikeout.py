@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+pytest.importorskip("cv2")
+
+from essay_marking.images import load_image, prepare_image
+from essay_marking.strikeout import find_strikeouts
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SAMPLES = ("test_models/sample_essay.jpg", "test_models/sample_essay1.jpg")
+
+
+@pytest.mark.parametrize("sample", SAMPLES)
+def test_no_strikes_on_clean_sample_at_native_size(sample):
+    # The size prepare_image sends: uploads are never upscaled
+    image = load_image(os.path.join(REPO_ROOT, sample))
+    assert find_strikeouts(image) == []
+
+
+@pytest.mark.parametrize("sample", SAMPLES)
+def test_masking_leaves_clean_sample_unchanged(sample):
+    path = os.path.join(REPO_ROOT, sample)
+    assert prepare_image(path, mask_strikes=True)[1] == prepare_image(path)[1]
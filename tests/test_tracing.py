@@ -0,0 +1,26 @@
+import json
+
+from essay_marking import tracing
+
+
+def test_summarize_file_reads_only_the_latest_traces(tmp_path, monkeypatch):
+    path = str(tmp_path / "traces.jsonl")
+    monkeypatch.setattr(tracing, "TAIL_BLOCK", 100)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(50):
+            f.write(json.dumps({"kind": "k", "attrs": {"i": i}}) + "\n")
+
+    assert [json.loads(line)["attrs"]["i"] for line in tracing._tail_lines(path, 3)] == [47, 48, 49]
+    assert len(tracing._tail_lines(path, 1000)) == 50
+
+
+def test_trace_file_is_rotated_past_max_size(tmp_path, monkeypatch):
+    path = str(tmp_path / "traces.jsonl")
+    monkeypatch.setattr(tracing, "MAX_TRACE_BYTES", 100)
+    for i in range(5):
+        tracing._append(path, json.dumps({"i": i, "pad": "x" * 40}) + "\n")
+
+    with open(path + ".1", encoding="utf-8") as f:
+        assert [json.loads(line)["i"] for line in f] == [2, 3]
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line)["i"] for line in f] == [4]
@@ -0,0 +1,47 @@
+import csv
+import os
+
+import pytest
+
+from essay_marking.metrics import cer, edit_distance, wer
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MODEL_DIR = os.path.join(REPO_ROOT, "test_models", "Reg_Ditection", "trocr-finetuned")
+DATA_DIR = os.path.join(REPO_ROOT, "test_models", "Reg_Ditection", "custom_data")
+CER_TOLERANCE = 0.02  # allowed absolute CER increase of the int8 model, as in benchmarks/trocr_quantized.py
+
+
+def test_edit_distance():
+    assert edit_distance("kitten", "sitting") == 3
+    assert edit_distance("", "abc") == 3
+    assert edit_distance("same", "same") == 0
+
+
+def test_cer_and_wer_on_known_pairs():
+    references = ["EG/2020/3990", "the quick brown fox"]
+    hypotheses = ["EG/2020/399O", "the quick brown box"]
+    assert cer(references, hypotheses) == pytest.approx(2 / 31)
+    assert wer(references, hypotheses) == pytest.approx(2 / 5)
+    assert cer(["abc"], ["abc"]) == 0
+    assert wer(["a b"], [""]) == 1
+
+
+def test_quantized_model_cer_within_tolerance():
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from PIL import Image
+
+    from essay_marking.trocr import QUANTIZED_FILENAME, load_trocr, quantize_trocr, recognize_lines, weights_fingerprint
+
+    if weights_fingerprint(MODEL_DIR) is None:
+        pytest.skip("fp32 TrOCR weights are not checked out")
+    if not os.path.exists(os.path.join(MODEL_DIR, QUANTIZED_FILENAME)):
+        quantize_trocr(MODEL_DIR)
+    with open(os.path.join(DATA_DIR, "labels.csv"), newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    images = [Image.open(os.path.join(DATA_DIR, "images", row["filename"])).convert("RGB") for row in rows]
+    labels = [row["text"] for row in rows]
+
+    fp32_cer = cer(labels, recognize_lines(*load_trocr(MODEL_DIR, prefer_quantized=False), images))
+    int8_cer = cer(labels, recognize_lines(*load_trocr(MODEL_DIR), images))
+    assert int8_cer <= fp32_cer + CER_TOLERANCE
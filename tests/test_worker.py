@@ -0,0 +1,77 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from essay_marking import worker
+from essay_marking.jobstore import JobStore
+
+
+def test_jobs_of_a_dead_worker_with_a_recent_heartbeat_are_requeued(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    dead_worker = f"{socket.gethostname()}:{exited.pid}"
+    live_worker = f"{socket.gethostname()}:{os.getpid()}"
+    orphaned = store.create_job("evaluate", {"safe_reg": "A"})
+    running = store.create_job("evaluate", {"safe_reg": "B"})
+    store.claim_job(dead_worker)
+    store.claim_job(live_worker)
+    # The server restarts seconds after the worker died: both heartbeats are fresh
+    store.heartbeat(dead_worker)
+    store.heartbeat(live_worker)
+
+    assert worker.forget_dead_workers(store) == [dead_worker]
+    assert store.requeue_stale(worker.STALE_AFTER) == 1
+    assert store.get_job(orphaned)["status"] == "queued"
+    assert store.get_job(running)["status"] == "running"
+
+
+def test_worker_loop_requeues_jobs_of_workers_that_die_while_it_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(worker, "HEARTBEAT_INTERVAL", 0.05)
+    monkeypatch.setattr(worker, "POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(worker, "STALE_AFTER", 0.2)
+    monkeypatch.setitem(worker.HANDLERS, "noop", lambda ctx, job, report: {})
+    db_path = str(tmp_path / "jobs.sqlite")
+    store = JobStore(db_path)
+    job_id = store.create_job("noop", {})
+    store.claim_job("elsewhere:1")
+    store.heartbeat("elsewhere:1")
+
+    stop = threading.Event()
+    thread = threading.Thread(target=worker.worker_loop, args=(db_path, {}, stop))
+    thread.start()
+    try:
+        deadline = time.time() + 5
+        while store.get_job(job_id)["status"] != "done" and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        thread.join()
+    assert store.get_job(job_id)["status"] == "done"
+
+
+def test_worker_context_builds_each_resource_once_across_threads(tmp_path, monkeypatch):
+    built = []
+
+    class SlowCache:
+        def __init__(self, path):
+            time.sleep(0.05)
+            built.append(path)
+
+    monkeypatch.setattr("essay_marking.cache.DiskCache", SlowCache)
+    ctx = worker.WorkerContext({"transcription_cache": str(tmp_path / "t.sqlite")}, store=None)
+    start = threading.Barrier(8)
+
+    def touch():
+        start.wait()
+        return ctx.cache
+
+    threads = [threading.Thread(target=touch) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1